@@ -0,0 +1,177 @@
+import calendar
+import datetime
+import db
+from fragment_cache import FragmentCache
+
+# Rollup dimensions: per student, per subject, per student attribute, per weekday and per month
+DIMENSIONS = ('student', 'subject', 'level', 'year', 'exam_board', 'weekday', 'month')
+ORDERS = ('earned', 'hours', 'lessons')
+# Academic years run from the 1st of this month
+ACADEMIC_YEAR_START_MONTH = 9
+# Rollups memoized per database generation
+MAX_CACHED_ROLLUPS = 512
+
+# Results are only ever served for the generation they were computed at, i.e. until the next sync or edit
+cache = FragmentCache(MAX_CACHED_ROLLUPS)
+
+# Totals grouped by one key: (query over whole months of a summary table, query over lessons for partial months)
+_TOTALS_QUERIES = {
+    'student': (
+        '''SELECT student_id, SUM(lesson_count), SUM(hours), SUM(earned) FROM monthly_summary
+           WHERE month >= ? AND month < ? GROUP BY student_id''',
+        '''SELECT IFNULL(student_id, 0), COUNT(*), SUM(duration), SUM(duration * hourly_rate) FROM lessons
+           WHERE date >= ? AND date < ? GROUP BY 1''',
+    ),
+    'weekday': (
+        '''SELECT weekday, SUM(lesson_count), SUM(hours), SUM(earned) FROM weekday_summary
+           WHERE month >= ? AND month < ? GROUP BY weekday''',
+        '''SELECT weekday, COUNT(*), SUM(duration), SUM(duration * hourly_rate) FROM lessons
+           WHERE date >= ? AND date < ? GROUP BY weekday''',
+    ),
+    'month': (
+        '''SELECT month, SUM(lesson_count), SUM(hours), SUM(earned) FROM monthly_summary
+           WHERE month >= ? AND month < ? GROUP BY month''',
+        '''SELECT substr(date, 1, 7), COUNT(*), SUM(duration), SUM(duration * hourly_rate) FROM lessons
+           WHERE date >= ? AND date < ? GROUP BY 1''',
+    ),
+}
+# Lessons tagged with a subject of their own, found through the partial idx_lessons_subject_date
+_TAGGED_QUERY = '''
+    SELECT IFNULL(l.student_id, 0), sub.name, COUNT(*), SUM(l.duration), SUM(l.duration * l.hourly_rate)
+    FROM lessons l
+    JOIN subjects sub ON sub.id = l.subject_id
+    WHERE l.subject_id IS NOT NULL AND l.date >= ? AND l.date < ?
+    GROUP BY 1, 2
+'''
+_STUDENT_COLUMNS = ('name', 'level', 'year', 'exam_board', 'subject', 'active', 'last_lesson_date')
+_NO_PROFILE = (None,) * len(_STUDENT_COLUMNS)
+
+def academic_year(today: datetime.date = None) -> tuple[datetime.date, datetime.date]:
+    """Returns the (start, end) dates of the academic year containing `today`; `end` is exclusive."""
+    today = today or datetime.date.today()
+    year = today.year if today.month >= ACADEMIC_YEAR_START_MONTH else today.year - 1
+    return datetime.date(year, ACADEMIC_YEAR_START_MONTH, 1), datetime.date(year + 1, ACADEMIC_YEAR_START_MONTH, 1)
+
+def _next_month(date: datetime.date) -> datetime.date:
+    return datetime.date(date.year + date.month // 12, date.month % 12 + 1, 1)
+
+def _split(start: datetime.date, end: datetime.date):
+    """Splits [start, end) into the whole months it covers, as a ('YYYY-MM', 'YYYY-MM') range for the
+    summary tables (or None), and the partial months at either end, as date ranges for the lessons table."""
+    first, last = (start if start.day == 1 else _next_month(start)), end.replace(day=1)
+    if first >= last:
+        return None, [(start, end)] if start < end else []
+    partial = []
+    if start < first:
+        partial.append((start, first))
+    if last < end:
+        partial.append((last, end))
+    return (first.isoformat()[:7], last.isoformat()[:7]), partial
+
+def _add(totals: dict, key, count: int, hours: float, earned: float) -> None:
+    total = totals.get(key)
+    if total is None:
+        totals[key] = [count, hours, earned]
+    else:
+        total[0] += count
+        total[1] += hours
+        total[2] += earned
+
+def _totals(conn, grouping: str, start: datetime.date, end: datetime.date) -> dict:
+    """Returns {key: [lessons, hours, earned]} for lessons dated in [start, end), grouped by 'student',
+    'weekday' or 'month'. Whole months come from the trigger-maintained summary tables, so only the
+    days of a partially covered first or last month are read from lessons."""
+    summary_query, lessons_query = _TOTALS_QUERIES[grouping]
+    months, partial = _split(start, end)
+    totals: dict = {}
+    if months:
+        for key, count, hours, earned in conn.execute(summary_query, months):
+            _add(totals, key, count, hours, earned)
+    for first, last in partial:
+        for key, count, hours, earned in conn.execute(lessons_query, (first.isoformat(), last.isoformat())):
+            _add(totals, key, count, hours, earned)
+    return totals
+
+def _item(key, label, total: list) -> dict:
+    return {"key": key, "label": label, "lessons": total[0], "hours": total[1], "earned": total[2]}
+
+def _rollup(by: str, start: datetime.date, end: datetime.date) -> list[dict]:
+    with db.connection() as conn:
+        if by in ('weekday', 'month'):
+            totals = _totals(conn, by, start, end)
+            if by == 'weekday':
+                return [_item(day, calendar.day_name[day], total) for day, total in totals.items()]
+            return [_item(month, month, total) for month, total in totals.items()]
+
+        per_student = _totals(conn, 'student', start, end)
+        students = {row[0]: row[1:] for row in conn.execute(
+            f"SELECT id, {', '.join(_STUDENT_COLUMNS)} FROM students")}
+        if by == 'student':
+            items = []
+            for student_id, total in per_student.items():
+                profile = dict(zip(_STUDENT_COLUMNS, students.get(student_id, _NO_PROFILE)))
+                profile["active"] = bool(profile["active"])
+                items.append(dict(_item(student_id, profile.pop("name") or "Unassigned", total), **profile))
+            return items
+
+        # Every other dimension is a student attribute; a lesson tagged with its own subject counts
+        # under that subject instead of its student's
+        column = _STUDENT_COLUMNS.index(by)
+        totals: dict = {}
+        for student_id, total in per_student.items():
+            _add(totals, students.get(student_id, _NO_PROFILE)[column] or None, *total)
+        if by == 'subject':
+            for student_id, subject, count, hours, earned in conn.execute(
+                    _TAGGED_QUERY, (start.isoformat(), end.isoformat())):
+                default = students.get(student_id, _NO_PROFILE)[column] or None
+                _add(totals, default, -count, -hours, -earned)
+                _add(totals, subject, count, hours, earned)
+            totals = {key: total for key, total in totals.items() if total[0] > 0}
+    return [_item(key, key if key is not None else "Unassigned", total) for key, total in totals.items()]
+
+def rollup(by: str = 'student', start: datetime.date = None, end: datetime.date = None,
+           order: str = 'earned', limit: int = None) -> list[dict]:
+    """Lessons, hours and earnings dated in [start, end) grouped by `by` (one of DIMENSIONS), largest
+    `order` first, e.g. rollup('student', limit=10) for the top students of the current academic year.
+    Either end of the range defaults to the current academic year's.
+
+    Each item has `key`, `label`, `lessons`, `hours` and `earned`; student items also carry the profile.
+    Results are memoized until the database generation moves on.
+    """
+    if by not in DIMENSIONS:
+        raise ValueError(f"Unknown analytics dimension '{by}'; choose from {', '.join(DIMENSIONS)}")
+    if order not in ORDERS:
+        raise ValueError(f"Unknown order '{order}'; choose from {', '.join(ORDERS)}")
+    default_start, default_end = academic_year()
+    start, end = start or default_start, end or default_end
+
+    def build():
+        items = _rollup(by, start, end)
+        items.sort(key=lambda item: (-item[order], str(item["label"])))
+        return items
+    items = cache.get(db.generation(), ('rollup', by, start, end, order), build)
+    return items[:limit] if limit else list(items)
+
+def retention(start: datetime.date = None, end: datetime.date = None) -> dict:
+    """Compares the students taught in [start, end) (default: the current academic year) with those
+    taught in the period of equal length just before it.
+
+    :return: the periods compared and the number of active, new, retained and lost students, with the
+        retention rate (retained / previously active; None if nobody was taught before).
+    """
+    default_start, default_end = academic_year()
+    start, end = start or default_start, end or default_end
+    previous_start = start - (end - start)
+    current = {item["key"] for item in rollup('student', start, end)} - {0}
+    previous = {item["key"] for item in rollup('student', previous_start, start)} - {0}
+    retained = current & previous
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "previous_from": previous_start.isoformat(),
+        "active": len(current),
+        "new": len(current - previous),
+        "retained": len(retained),
+        "lost": len(previous - current),
+        "retention_rate": len(retained) / len(previous) if previous else None,
+    }
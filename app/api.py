@@ -0,0 +1,261 @@
+import base64
+import datetime
+import itertools
+import json
+import zlib
+from contextlib import ExitStack
+from flask import Blueprint, Response, request, jsonify
+import analytics
+import db
+import tenants
+from export import FORMATS, export_stream
+
+# Page sizes for the keyset-paginated endpoints
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+# Rows pulled from SQLite per fetchmany() while streaming a page
+FETCH_SIZE = 500
+# Responses smaller than this are sent uncompressed even if the client accepts gzip
+GZIP_MIN_ROWS = 20
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+class BadRequest(ValueError):
+    """An invalid query parameter; answered with a 400 JSON error."""
+
+@api.errorhandler(BadRequest)
+def bad_request(error):
+    return jsonify({"error": str(error)}), 400
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str, types: tuple[type, ...]) -> list:
+    """Decodes a `next_cursor` whose values must have exactly the given `types`, e.g. (str, str)."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise BadRequest("Invalid cursor") from None
+    if not isinstance(values, list) or [type(value) for value in values] != list(types):
+        raise BadRequest("Invalid cursor")
+    return values
+
+def date_arg(name: str) -> str | None:
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise BadRequest(f"'{name}' must be a YYYY-MM-DD date") from None
+
+def int_arg(name: str, default: int = None) -> int | None:
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f"'{name}' must be an integer") from None
+
+def page_size() -> int:
+    limit = int_arg('limit', DEFAULT_PAGE_SIZE)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise BadRequest(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+def accepts_gzip() -> bool:
+    return 'gzip' in request.headers.get('Accept-Encoding', '')
+
+def stream_page(query: str, args: list, limit: int, to_item, cursor_of) -> Response:
+    """Streams one page of `query` results as `{"items": [...], "next_cursor": ...}`.
+
+    `query` must be ordered by its keyset columns and is run with LIMIT `limit` + 1; the extra row only
+    signals that another page exists. Rows are fetched and encoded FETCH_SIZE at a time, so memory stays
+    bounded by the fetch size rather than the page size, and the body is gzipped on the fly when the
+    client accepts it.
+    """
+    # Run the query before responding, so a failing query is an error response rather than a cut-off body
+    with ExitStack() as stack:
+        conn = stack.enter_context(db.stream_connection())
+        rows = conn.execute(f"{query} LIMIT ?", (*args, limit + 1))
+        release = stack.pop_all()
+
+    def generate():
+        try:
+            yield '{"items":['
+            written, last = 0, None
+            while written < limit:
+                chunk = rows.fetchmany(min(FETCH_SIZE, limit - written))
+                if not chunk:
+                    break
+                yield (',' if written else '') + ','.join(json.dumps(to_item(row)) for row in chunk)
+                written += len(chunk)
+                last = chunk[-1]
+            has_more = rows.fetchone() is not None
+        finally:
+            release.close()
+        next_cursor = encode_cursor(cursor_of(last)) if has_more else None
+        yield f'],"next_cursor":{json.dumps(next_cursor)}}}'
+
+    def gzipped(chunks):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode())
+            if data:
+                yield data
+        yield compressor.flush()
+
+    compress = accepts_gzip() and limit >= GZIP_MIN_ROWS
+    # The body is produced after the view returns, so it is bound to the request's tenant
+    body = tenants.bind(generate())
+    response = Response(gzipped(body) if compress else body, mimetype='application/json')
+    # A body that is never read still gives its connection back
+    response.call_on_close(release.close)
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def lesson_item(row: tuple) -> dict:
+    (event_id, date, weekday, student_id, student, duration, hourly_rate,
+     start_time, end_time, subject_id) = row
+    return {
+        "event_id": event_id,
+        "date": date,
+        "weekday": weekday,
+        "student_id": student_id,
+        "student": student,
+        "duration": duration,
+        "hourly_rate": hourly_rate,
+        "earned": duration * hourly_rate,
+        "start_time": start_time,
+        "end_time": end_time,
+        "subject_id": subject_id,
+    }
+
+@api.route('/lessons')
+def lessons():
+    """Lessons ordered by (date, event_id).
+
+    Query parameters: `from` (inclusive) and `to` (exclusive) YYYY-MM-DD dates, `student_id`, `limit`
+    and `cursor` (the `next_cursor` of the previous page).
+    """
+    filters, args = [], []
+    start, end = date_arg('from'), date_arg('to')
+    if start:
+        filters.append("date >= ?")
+        args.append(start)
+    if end:
+        filters.append("date < ?")
+        args.append(end)
+    student_id = int_arg('student_id')
+    if student_id is not None:
+        filters.append("student_id = ?")
+        args.append(student_id)
+    cursor = request.args.get('cursor')
+    if cursor:
+        filters.append("(date, event_id) > (?, ?)")
+        args.extend(decode_cursor(cursor, (str, str)))
+    query = '''
+        SELECT event_id, date, weekday, student_id, student, duration, hourly_rate,
+               start_time, end_time, subject_id
+        FROM lessons
+    '''
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    query += " ORDER BY date, event_id"
+    return stream_page(query, args, page_size(), lesson_item, lambda row: [row[1], row[0]])
+
+STUDENT_COLUMNS = ('id', 'name', 'level', 'year', 'exam_board', 'target_grade', 'subject', 'active')
+
+def student_item(row: tuple) -> dict:
+    item = dict(zip(STUDENT_COLUMNS, row))
+    item["active"] = bool(item["active"])
+    return item
+
+@api.route('/students')
+def students():
+    """Students ordered by id.
+
+    Query parameters: `active` (0 or 1), `year`, `level`, `exam_board`, `limit` and `cursor`.
+    """
+    filters, args = [], []
+    active = int_arg('active')
+    if active is not None:
+        if active not in (0, 1):
+            raise BadRequest("'active' must be 0 or 1")
+        filters.append("active = ?")
+        args.append(active)
+    for column in ('year', 'level', 'exam_board'):
+        value = request.args.get(column)
+        if value:
+            filters.append(f"{column} = ?")
+            args.append(value)
+    cursor = request.args.get('cursor')
+    if cursor:
+        filters.append("id > ?")
+        args.extend(decode_cursor(cursor, (int,)))
+    query = f"SELECT {', '.join(STUDENT_COLUMNS)} FROM students"
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    query += " ORDER BY id"
+    return stream_page(query, args, page_size(), student_item, lambda row: [row[0]])
+
+@api.route('/lessons/export.<fmt>')
+def export_lessons(fmt: str):
+    """The full lesson history joined with student profiles as a streamed csv, jsonl or parquet download.
+
+    Query parameters: `from` (inclusive) and `to` (exclusive) YYYY-MM-DD dates and `student_id`.
+    """
+    if fmt not in FORMATS:
+        raise BadRequest(f"Unknown export format '{fmt}'; choose from {', '.join(FORMATS)}")
+    stream = export_stream(fmt, date_arg('from'), date_arg('to'), int_arg('student_id'))
+    try:
+        # Start the export before responding so a missing optional dependency is reported, not truncated
+        first = next(stream, b'')
+    except RuntimeError as error:
+        return jsonify({"error": str(error)}), 501
+    response = Response(tenants.bind(itertools.chain([first], stream)), mimetype=FORMATS[fmt][1])
+    response.headers['Content-Disposition'] = f'attachment; filename="lessons{FORMATS[fmt][2]}"'
+    return response
+
+def date_range_args() -> tuple[datetime.date | None, datetime.date | None]:
+    start, end = date_arg('from'), date_arg('to')
+    return (datetime.date.fromisoformat(start) if start else None,
+            datetime.date.fromisoformat(end) if end else None)
+
+@api.route('/analytics/retention')
+def analytics_retention():
+    """New, retained and lost students in a period compared with the period of equal length before it.
+
+    Query parameters: `from` (inclusive) and `to` (exclusive) YYYY-MM-DD dates, defaulting to the
+    current academic year.
+    """
+    return jsonify(analytics.retention(*date_range_args()))
+
+@api.route('/analytics/<dimension>')
+def analytics_rollup(dimension: str):
+    """Lessons, hours and earnings grouped by student, subject, level, year, exam_board, weekday or month.
+
+    Query parameters: `from` (inclusive) and `to` (exclusive) YYYY-MM-DD dates, defaulting to the
+    current academic year, `order` (earned, hours or lessons; largest first) and `limit`.
+    """
+    if dimension not in analytics.DIMENSIONS:
+        raise BadRequest(f"Unknown dimension '{dimension}'; choose from {', '.join(analytics.DIMENSIONS)}")
+    order = request.args.get('order', 'earned')
+    if order not in analytics.ORDERS:
+        raise BadRequest(f"'order' must be one of {', '.join(analytics.ORDERS)}")
+    limit = int_arg('limit')
+    if limit is not None and limit < 1:
+        raise BadRequest("'limit' must be at least 1")
+    start, end = date_range_args()
+    default_start, default_end = analytics.academic_year()
+    start, end = start or default_start, end or default_end
+    return jsonify({
+        "dimension": dimension,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "order": order,
+        "items": analytics.rollup(dimension, start, end, order, limit),
+    })
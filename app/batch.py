@@ -0,0 +1,105 @@
+import datetime
+import hashlib
+import json
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from quickstart import fetch_lessons_between, group_by_week, invoice_context, build_invoice
+from renderers import get_renderer, DEFAULT_RENDERER
+import tenants
+
+BATCH_OUTPUT_DIR = 'invoices/batch'
+
+def _render(job: tuple) -> tuple[str, bytes]:
+    """Process-pool worker: builds one invoice and renders it with the named backend
+    (each process keeps its own renderer)."""
+    filename, renderer, weeks, weekly_totals, context = job
+    return filename, get_renderer(renderer).render(build_invoice(weeks, weekly_totals, context))
+
+def _month_after(year: int, month: int) -> datetime.date:
+    return datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+
+def create_pdfs(start: tuple[int, int],
+                end: tuple[int, int],
+                per_student: bool = True,
+                output: str = 'zip',
+                workers: int = None,
+                renderer: str = None) -> str:
+    """Creates every invoice from `start` through `end` (inclusive (year, month) tuples), one per month
+    or, with `per_student`, one per student per month.
+
+    All lessons are fetched with a single query and partitioned in memory; the invoices are then built
+    and rendered in parallel on a process pool of `workers` processes (default: one per CPU core). The PDFs and a
+    manifest.json are written to a zip file or, with output='dir', to a directory.
+
+    :return: the path of the zip file or directory.
+    """
+    if output not in ('zip', 'dir'):
+        raise ValueError("output must be 'zip' or 'dir'")
+    (start_year, start_month), (end_year, end_month) = start, end
+    lessons = fetch_lessons_between(datetime.date(start_year, start_month, 1), _month_after(end_year, end_month))
+
+    partitions: dict[tuple, list] = {}
+    for lesson in lessons:
+        key = (lesson.date.year, lesson.date.month, lesson.student.id if per_student else 0)
+        partitions.setdefault(key, []).append(lesson)
+
+    jobs, entries = [], []
+    for (year, month, student_id), month_lessons in sorted(partitions.items()):
+        student = month_lessons[0].student if per_student else None
+        hours = sum(lesson.duration for lesson in month_lessons)
+        weeks, weekly_totals = group_by_week(month_lessons)
+        total = sum(weekly_totals)
+        if student:
+            # The id keeps apart students whose names sanitise to the same string
+            filename = f"{year:04}{month:02}-{student_id}-{re.sub(r'[^A-Za-z0-9]+', '_', student.name)}.pdf"
+            invoice_no = f"{year}{month:02}-{student_id}"
+        else:
+            filename, invoice_no = f"{year:04}{month:02}.pdf", None
+        jobs.append((filename, renderer, weeks, weekly_totals, invoice_context(month, year, total, invoice_no)))
+        entries.append({
+            "file": filename,
+            "year": year,
+            "month": month,
+            "student_id": student.id if student else None,
+            "student": student.name if student else None,
+            "lessons": len(month_lessons),
+            "hours": hours,
+            "total": round(total, 2),
+        })
+
+    label = f"{start_year:04}{start_month:02}-{end_year:04}{end_month:02}"
+    output_dir = tenants.resolve(BATCH_OUTPUT_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"invoices_{label}" + ('.zip' if output == 'zip' else ''))
+    manifest = {
+        "generated_at": datetime.datetime.now().isoformat(timespec='seconds'),
+        "range": [f"{start_year:04}-{start_month:02}", f"{end_year:04}-{end_month:02}"],
+        "per_student": per_student,
+        "renderer": renderer or DEFAULT_RENDERER,
+        "invoices": entries,
+    }
+    by_file = {entry["file"]: entry for entry in entries}
+
+    def record(filename: str, pdf: bytes) -> None:
+        by_file[filename]["bytes"] = len(pdf)
+        by_file[filename]["sha256"] = hashlib.sha256(pdf).hexdigest()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_render, jobs, chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1))))
+        if output == 'zip':
+            with zipfile.ZipFile(path, 'w') as archive:
+                for filename, pdf in results:
+                    archive.writestr(filename, pdf)
+                    record(filename, pdf)
+                archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+        else:
+            os.makedirs(path, exist_ok=True)
+            for filename, pdf in results:
+                with open(os.path.join(path, filename), 'wb') as out:
+                    out.write(pdf)
+                record(filename, pdf)
+            with open(os.path.join(path, 'manifest.json'), 'w') as out:
+                json.dump(manifest, out, indent=2)
+    return path
@@ -0,0 +1,4 @@
+"""Benchmarks for the invoice creator's hot paths.
+
+Run them from the ``app`` directory, e.g. ``python -m benchmarks.bench_ingest``.
+"""
@@ -0,0 +1,88 @@
+"""Walks every page of /api/lessons over a 200k-lesson database and reports throughput and peak
+Python memory, against loading the whole history with one query and json.dumps(). Exits non-zero
+if any page is missing rows or if peak memory grows with the history rather than the page size."""
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_ingest import SETTINGS, make_events
+
+def walk(client, path: str, compressed: bool) -> tuple[int, int, int]:
+    """Follows next_cursor to the end; returns (pages, items, bytes on the wire)."""
+    pages = items = wire = 0
+    cursor = None
+    headers = {"Accept-Encoding": "gzip"} if compressed else {}
+    while True:
+        response = client.get(path + (f"&cursor={cursor}" if cursor else ""), headers=headers)
+        body = response.get_data()
+        wire += len(body)
+        if response.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        page = json.loads(body)
+        pages += 1
+        items += len(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages, items, wire
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lessons", type=int, default=200_000)
+    parser.add_argument("--limit", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        with open("user_settings.json", "w") as file:
+            json.dump(SETTINGS, file)
+        os.environ["SYNC_REFRESH_MINUTES"] = "0"
+        import db
+        import quickstart as q
+        import server
+
+        events = make_events(args.lessons)
+        for i in range(0, len(events), 20_000):
+            with db.connection() as conn:
+                q.store_events(conn.cursor(), events[i:i + 20_000])
+        del events
+        client = server.app.test_client()
+
+        def load_all():
+            with db.connection() as conn:
+                return len(json.dumps(conn.execute("SELECT * FROM lessons ORDER BY date, event_id").fetchall()))
+
+        print(f"{args.lessons:,} lessons, pages of {args.limit}")
+        failed = False
+        peaks = {}
+        for label, run in (("one query + json.dumps", load_all),
+                           ("keyset pages", lambda: walk(client, f"/api/lessons?limit={args.limit}", False)),
+                           ("keyset pages, gzip", lambda: walk(client, f"/api/lessons?limit={args.limit}", True))):
+            # Time without tracing, then measure the peak on a second run
+            started = time.perf_counter()
+            result = run()
+            seconds = time.perf_counter() - started
+            tracemalloc.start()
+            run()
+            peaks[label] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            detail = ""
+            if isinstance(result, tuple):
+                pages, items, wire = result
+                detail = f"  {pages} pages, {wire / 2**20:.1f} MB sent"
+                failed |= items != args.lessons
+            print(f"  {label:<24} {seconds:>6.2f}s  {args.lessons / seconds:>10,.0f} lessons/s  "
+                  f"peak {peaks[label] / 2**20:>6.1f} MB{detail}")
+        # A page of `limit` lessons is a few hundred bytes each; allow generous headroom
+        bounded = peaks["keyset pages"] < max(args.limit * 2048, 8 * 2**20)
+        print("memory bounded by page size:", "yes" if bounded else "NO")
+        server.scheduler.stop()
+        db.get_pool().close()
+    sys.exit(0 if bounded and not failed else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Measures batch invoice throughput (invoices/second) of `create_pdfs` for increasing numbers of
+worker processes, to show how rendering scales across CPU cores."""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.bench_ingest import SETTINGS, make_events
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--renderer", default="simple")
+    parser.add_argument("--workers", type=int, nargs="*", default=None)
+    args = parser.parse_args()
+    app_dir = os.getcwd()
+    counts = args.workers or sorted({1, 2, 4, os.cpu_count() or 1})
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.symlink(os.path.join(app_dir, "templates"), "templates")
+        os.symlink(os.path.join(app_dir, "static"), "static")
+        with open("user_settings.json", "w") as file:
+            json.dump(SETTINGS, file)
+        import db
+        import quickstart as q
+        from batch import create_pdfs
+
+        q.init_db()
+        events = make_events(args.events)
+        with db.connection() as conn:
+            q.store_events(conn.cursor(), events)
+        first, last = events[0]["start"]["dateTime"], events[-1]["start"]["dateTime"]
+        start, end = (int(first[:4]), int(first[5:7])), (int(last[:4]), int(last[5:7]))
+
+        baseline = None
+        for workers in counts:
+            started = time.perf_counter()
+            path = create_pdfs(start, end, per_student=True, output="dir", workers=workers,
+                               renderer=args.renderer)
+            elapsed = time.perf_counter() - started
+            with open(os.path.join(path, "manifest.json")) as file:
+                invoices = len(json.load(file)["invoices"])
+            rate = invoices / elapsed
+            baseline = baseline or rate
+            print(f"  {workers:>3} workers: {rate:>8,.1f} invoices/s  ({rate / baseline:.2f}x, {invoices} invoices)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Runs parallel dashboard-style readers against two writers through the pooled connection layer, a sync
+upserting lessons and the students page saving edits, and reports throughput and any `database is locked`
+errors. Exits with status 1 if any request failed."""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_ingest import SETTINGS, make_events
+
+def hammer(readers: int, seconds: float, batch: int) -> tuple[dict, list[Exception]]:
+    """Runs `readers` dashboard readers for `seconds` against two writers on the database in the working
+    directory: a sync upserting `batch` lessons at a time, and the students page saving edits.
+    :return: the read/write counts and every error raised"""
+    import db
+    import quickstart as q
+    import server
+
+    events = make_events(20_000)
+    with db.connection() as conn:
+        q.store_events(conn.cursor(), events[:batch])
+        student_ids = [row[0] for row in conn.execute("SELECT id FROM students")]
+
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "student_saves": 0}
+    errors: list[Exception] = []
+    lock = threading.Lock()
+
+    def reader() -> None:
+        while not stop.is_set():
+            try:
+                q.monthly_earnings()
+                q.fetch_lessons(1, 2020)
+            except sqlite3.OperationalError as error:
+                errors.append(error)
+            with lock:
+                counts["reads"] += 1
+
+    def sync_writer() -> None:
+        offset = 0
+        while not stop.is_set():
+            chunk = events[offset:offset + batch] or events[:batch]
+            offset = (offset + batch) % len(events)
+            try:
+                with db.connection() as conn:
+                    q.store_events(conn.cursor(), chunk)
+            except sqlite3.OperationalError as error:
+                errors.append(error)
+            counts["writes"] += len(chunk)
+
+    def students_writer() -> None:
+        # Saves the students editor, alternating every student's year so each save really writes
+        client = server.app.test_client()
+        saves = 0
+        while not stop.is_set():
+            form = {"student_ids": [str(sid) for sid in student_ids]}
+            for sid in student_ids:
+                form.update({f"year-{sid}": f"Year {10 + saves % 2}", f"active-{sid}": "1"})
+            response = client.post("/students", data=form)
+            if response.status_code != 302:
+                errors.append(RuntimeError(f"POST /students returned {response.status}"))
+            saves += 1
+        counts["student_saves"] = saves
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=sync_writer), threading.Thread(target=students_writer)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.scheduler.stop()
+    return counts, errors
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        with open("user_settings.json", "w") as file:
+            json.dump(SETTINGS, file)
+        # The benchmark drives the app directly, so keep the periodic calendar refresh out of it
+        os.environ.setdefault("SYNC_REFRESH_MINUTES", "0")
+        import quickstart as q
+
+        q.init_db()
+        counts, errors = hammer(args.readers, args.seconds, args.batch)
+
+    print(f"{args.readers} readers + 2 writers for {args.seconds:.0f}s")
+    print(f"  reads:  {counts['reads'] / args.seconds:>10,.0f} dashboard reads/s")
+    print(f"  writes: {counts['writes'] / args.seconds:>10,.0f} lessons upserted/s")
+    print(f"  saves:  {counts['student_saves'] / args.seconds:>10,.0f} students page saves/s")
+    print(f"  errors: {len(errors)}" + (f" (first: {errors[0]})" if errors else ""))
+    if errors:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Export throughput (rows/second) and peak Python memory for each export format, to a file and
+through the streaming HTTP endpoint, at two history sizes to show memory does not grow with rows."""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_ingest import SETTINGS, make_events
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lessons", type=int, nargs="+", default=[50_000, 200_000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        with open("user_settings.json", "w") as file:
+            json.dump(SETTINGS, file)
+        os.environ["SYNC_REFRESH_MINUTES"] = "0"
+        import db
+        import export
+        import quickstart as q
+        import server
+
+        client = server.app.test_client()
+        stored = 0
+        for lessons in sorted(args.lessons):
+            events = make_events(lessons)
+            for i in range(stored, lessons, 20_000):
+                with db.connection() as conn:
+                    q.store_events(conn.cursor(), events[i:min(i + 20_000, lessons)])
+            stored = lessons
+            del events
+            print(f"{lessons:,} lessons")
+            for fmt in export.FORMATS:
+                try:
+                    __import__("pyarrow") if fmt == "parquet" else None
+                except ImportError:
+                    print(f"  {fmt:<8} skipped (pyarrow not installed)")
+                    continue
+                path = f"lessons{export.FORMATS[fmt][2]}"
+                started = time.perf_counter()
+                export.export_to_file(path, fmt)
+                file_seconds = time.perf_counter() - started
+                tracemalloc.start()
+                export.export_to_file(path, fmt)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                started = time.perf_counter()
+                response = client.get(f"/api/lessons/export.{fmt}", buffered=False)
+                sent = sum(len(block) for block in response.response)
+                response.close()
+                http_seconds = time.perf_counter() - started
+                print(f"  {fmt:<8} file {lessons / file_seconds:>9,.0f} rows/s  "
+                      f"http {lessons / http_seconds:>9,.0f} rows/s  "
+                      f"{sent / 2**20:>6.1f} MB  peak {peak / 2**20:>5.1f} MB")
+        server.scheduler.stop()
+        db.get_pool().close()
+
+if __name__ == "__main__":
+    main()
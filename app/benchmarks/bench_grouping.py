@@ -0,0 +1,81 @@
+"""Microbenchmark of lesson hydration and week grouping on 100k lessons: the legacy
+`%d/%m/%Y` string dates with strptime-based sorting versus `datetime.date` lessons grouped
+by ISO week in one linear pass."""
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.bench_ingest import SETTINGS
+
+def legacy_group(lessons_info: list) -> list[list]:
+    """The original group_lessons() week-break logic over display-string dates."""
+    lessons_info.sort(key=lambda lesson: datetime.datetime.strptime(lesson.date, '%d/%m/%Y').date())
+    month_lessons, week = [], []
+    for i, lesson in enumerate(lessons_info):
+        week.append(lesson)
+        next_day_jump = (
+            i == len(lessons_info) - 1 or
+            lesson.weekday > lessons_info[i + 1].weekday or
+            (int(lessons_info[i + 1].date.split('/')[0]) >= int(lesson.date.split('/')[0]) + 7)
+        )
+        if next_day_jump:
+            month_lessons.append(week)
+            week = []
+    return month_lessons
+
+def timed(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lessons", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        with open("user_settings.json", "w") as file:
+            json.dump(SETTINGS, file)
+        import quickstart as q
+
+    student = q.Student(1, "Student", None, None, None, None, None, 1)
+    start = datetime.date(2015, 1, 1)
+    rows = []
+    for i in range(args.lessons):
+        day = start + datetime.timedelta(days=i // 4)
+        rows.append((day.isoformat(), day.weekday(), student, 1.0, 30.0, "", "", None))
+
+    def legacy_hydrate():
+        lessons = []
+        for date_str, weekday, *rest in rows:
+            lesson = q.Lesson.from_db(date_str, weekday, *rest)
+            lesson.date = datetime.datetime.strptime(date_str, '%Y-%m-%d').strftime('%d/%m/%Y')
+            lessons.append(lesson)
+        return lessons
+
+    def hydrate():
+        return [q.Lesson.from_db(*row) for row in rows]
+
+    legacy_lessons, lessons = legacy_hydrate(), hydrate()
+    results = {
+        "hydrate (strptime/strftime)": timed(legacy_hydrate, args.repeat),
+        "hydrate (date.fromisoformat)": timed(hydrate, args.repeat),
+        "group by week (legacy)": timed(lambda: legacy_group(list(legacy_lessons)), args.repeat),
+        "group by week (ISO, linear)": timed(lambda: q.group_by(sorted(lessons, key=lambda l: l.date)), args.repeat),
+        "group by month": timed(lambda: q.group_by(lessons, 'month'), args.repeat),
+        "group by student": timed(lambda: q.group_by(lessons, 'student'), args.repeat),
+    }
+    print(f"{args.lessons:,} lessons (best of {args.repeat})")
+    for name, seconds in results.items():
+        print(f"  {name:<30} {seconds * 1000:>9.1f} ms  {args.lessons / seconds:>12,.0f} lessons/s")
+
+if __name__ == "__main__":
+    main()
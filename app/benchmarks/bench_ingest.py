@@ -0,0 +1,86 @@
+"""Measures lesson ingestion throughput (events/second) for a synthetic history,
+comparing the legacy per-event loop with the batched upsert in `store_events`."""
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from migrations import migrate
+
+SETTINGS = {
+    "full_name": "Bench Tutor", "email": "bench@example.com", "address": "1 Bench Street",
+    "town": "Benchton", "postcode": "BE1 1NC", "control_str": "Tutoring with",
+    "hourly_rate": "30", "account_no": "12345678", "sort_code": "00-00-00",
+}
+
+def make_events(count: int, students: int = 40) -> list[dict]:
+    """Builds `count` Calendar events, one hour long, spread across `students` students."""
+    start = datetime.datetime(2020, 1, 6, 9)
+    events = []
+    for i in range(count):
+        begin = start + datetime.timedelta(hours=i * 2)
+        events.append({
+            "id": f"event{i:07}",
+            "summary": f"Tutoring with Student{i % students} Maths",
+            "start": {"dateTime": begin.isoformat()},
+            "end": {"dateTime": (begin + datetime.timedelta(hours=1)).isoformat()},
+        })
+    return events
+
+def legacy_store_events(q, c: sqlite3.Cursor, events: list[dict]) -> None:
+    """The original per-event loop: one SELECT, maybe one INSERT and one INSERT OR REPLACE per event."""
+    for event in events:
+        date_obj = q.get_lesson_date(event)
+        student = q.get_student_name(q.load_settings().control_str, event)
+        c.execute("SELECT id FROM students WHERE name = ?", (student,))
+        row = c.fetchone()
+        if row:
+            student_id = row[0]
+        else:
+            c.execute("INSERT INTO students (name) VALUES (?)", (student,))
+            student_id = c.lastrowid
+        c.execute('''
+            INSERT OR REPLACE INTO lessons (
+                event_id, date, weekday, student, duration, hourly_rate, start_time, end_time, student_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (event["id"], date_obj.strftime("%Y-%m-%d"), date_obj.weekday(), student,
+              q.get_duration(event), q.load_settings().hourly_rate,
+              event["start"]["dateTime"], event["end"]["dateTime"], student_id))
+
+def run(q, store, events: list[dict], passes: int, db_file: str) -> float:
+    """Ingests `events` into a fresh database `passes` times (the first pass inserts,
+    the rest update) and returns events/second."""
+    migrate(db_file)
+    conn = sqlite3.connect(db_file)
+    started = time.perf_counter()
+    for _ in range(passes):
+        with conn:
+            store(conn.cursor(), events)
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return len(events) * passes / elapsed
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--passes", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        with open("user_settings.json", "w") as file:
+            json.dump(SETTINGS, file)
+        import quickstart as q
+
+        events = make_events(args.events)
+        before = run(q, lambda c, evs: legacy_store_events(q, c, evs), events, args.passes, "before.db")
+        after = run(q, q.store_events, events, args.passes, "after.db")
+    print(f"{args.events} events x {args.passes} passes")
+    print(f"  per-event loop: {before:>10,.0f} events/s")
+    print(f"  batched upsert: {after:>10,.0f} events/s  ({after / before:.1f}x)")
+
+if __name__ == "__main__":
+    main()
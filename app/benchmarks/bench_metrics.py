@@ -0,0 +1,61 @@
+"""Overhead of the metrics instrumentation: cost per timed call and dashboard/API requests per second
+with metrics enabled and disabled (set in separate processes, as METRICS_ENABLED is read at import)."""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from benchmarks.bench_ingest import SETTINGS, make_events
+
+def run(args) -> None:
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        with open("user_settings.json", "w") as file:
+            json.dump(SETTINGS, file)
+        os.environ["SYNC_REFRESH_MINUTES"] = "0"
+        import db
+        import metrics
+        import quickstart as q
+        import server
+
+        with db.connection() as conn:
+            q.store_events(conn.cursor(), make_events(args.events))
+        state = "enabled" if metrics.ENABLED else "disabled"
+
+        noop = metrics.timed("noop")(lambda: None)
+        per_call = min(timeit.repeat(noop, number=100_000, repeat=5)) / 100_000
+        baseline = min(timeit.repeat(lambda: None, number=100_000, repeat=5)) / 100_000
+        print(f"  metrics {state:<8} timed() overhead {(per_call - baseline) * 1e9:>7.0f} ns/call")
+
+        client = server.app.test_client()
+        server.fragment_cache.max_entries = 0
+        for path in ("/", "/api/lessons?limit=100"):
+            client.get(path)
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                client.get(path)
+            rate = args.requests / (time.perf_counter() - started)
+            print(f"  metrics {state:<8} {path:<24} {rate:>8,.0f} req/s")
+        server.scheduler.stop()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run(args)
+        return
+    print(f"{args.events:,} lessons, {args.requests} requests per path")
+    for enabled in ("1", "0"):
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_metrics", "--child",
+                        "--events", str(args.events), "--requests", str(args.requests)],
+                       env={**os.environ, "METRICS_ENABLED": enabled}, check=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Load test of the dashboard and students pages through the Flask test client: requests/second
+without caching (every request queries and renders), with the fragment cache, and with clients
+revalidating their ETag so unchanged pages are answered with 304 Not Modified."""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_ingest import SETTINGS, make_events
+
+def load(app, path: str, threads: int, seconds: float, revalidate: bool) -> tuple[float, dict]:
+    """Requests `path` from `threads` clients for `seconds`; returns (requests/second, status counts)."""
+    stop = threading.Event()
+    statuses: dict[int, int] = {}
+    lock = threading.Lock()
+
+    def client() -> None:
+        http = app.test_client()
+        etag = None
+        while not stop.is_set():
+            headers = {"If-None-Match": etag} if revalidate and etag else {}
+            response = http.get(path, headers=headers)
+            etag = response.headers.get("ETag", etag)
+            with lock:
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return sum(statuses.values()) / (time.perf_counter() - started), statuses
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        with open("user_settings.json", "w") as file:
+            json.dump(SETTINGS, file)
+        os.environ["SYNC_REFRESH_MINUTES"] = "0"
+        import db
+        import quickstart as q
+        import server
+
+        with db.connection() as conn:
+            q.store_events(conn.cursor(), make_events(args.events))
+
+        print(f"{args.events:,} lessons, {args.threads} client threads, {args.seconds:g}s per run")
+        for path in ("/", "/students"):
+            for label, max_entries, revalidate in (("no caching", 0, False),
+                                                   ("fragment cache", 256, False),
+                                                   ("ETag revalidation", 256, True)):
+                server.fragment_cache.clear()
+                server.fragment_cache.max_entries = max_entries
+                rate, statuses = load(server.app, path, args.threads, args.seconds, revalidate)
+                print(f"  {path:<10} {label:<18} {rate:>9,.0f} req/s  {statuses}")
+        server.scheduler.stop()
+        db.get_pool().close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Memory and time for holding 100k lessons: the legacy per-row Student/Lesson objects with
+instance dicts, the __slots__ records sharing Students through an identity map, and the
+columnar LessonBatch. Also times a per-month earnings rollup over each representation."""
+import argparse
+import datetime
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_ingest import SETTINGS
+
+class LegacyStudent:
+    def __init__(self, id, name, level, year, exam_board, target_grade, subject, active):
+        self.id = id
+        self.name = name
+        self.level = level
+        self.year = year
+        self.exam_board = exam_board
+        self.target_grade = target_grade
+        self.subject = subject
+        self.active = bool(active)
+
+class LegacyLesson:
+    def __init__(self, date_str, weekday, student, duration, hourly_rate, start_time, end_time, subject_id):
+        self.date = datetime.date.fromisoformat(date_str)
+        self.weekday = weekday
+        self.student = student
+        self.duration = duration
+        self.hourly_rate = hourly_rate
+        self.earned = duration * hourly_rate
+        self.start_time = start_time
+        self.end_time = end_time
+        self.subject_id = subject_id
+
+def measure(build) -> tuple[object, float, int]:
+    """Returns (result, seconds, bytes retained by the result)."""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - started
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, seconds, retained
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lessons", type=int, default=100_000)
+    parser.add_argument("--students", type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        with open("user_settings.json", "w") as file:
+            json.dump(SETTINGS, file)
+        import quickstart as q
+
+    # Rows shaped like fetch_lessons_between()'s query: lesson columns around the student columns
+    start = datetime.date(2015, 1, 1)
+    rows = []
+    for i in range(args.lessons):
+        day = start + datetime.timedelta(days=i // 4)
+        sid = i % args.students + 1
+        rows.append((day.isoformat(), day.weekday(),
+                     sid, f"Student{sid}", "GCSE", 11, "AQA", "7", "Maths", 1,
+                     1.0, 30.0, f"{day}T16:00:00Z", f"{day}T17:00:00Z", None))
+
+    def legacy():
+        return [LegacyLesson(r[0], r[1], LegacyStudent(*r[2:10]), *r[10:]) for r in rows]
+
+    def slotted():
+        students = {}
+        lessons = []
+        for r in rows:
+            student = students.get(r[2])
+            if student is None:
+                student = students[r[2]] = q.Student(*r[2:10])
+            lessons.append(q.Lesson.from_db(r[0], r[1], student, *r[10:]))
+        return lessons
+
+    def columnar():
+        batch = q.LessonBatch()
+        for r in rows:
+            batch.append(datetime.date.fromisoformat(r[0]).toordinal(), r[10], r[11], r[2])
+        return batch
+
+    def rollup(lessons):
+        totals = {}
+        for lesson in lessons:
+            key = (lesson.date.year, lesson.date.month)
+            totals[key] = totals.get(key, 0.0) + lesson.earned
+        return totals
+
+    print(f"{args.lessons:,} lessons, {args.students} students")
+    print(f"  {'representation':<28} {'build ms':>9} {'retained MB':>12} {'bytes/lesson':>13} {'monthly rollup ms':>18}")
+    for name, build, aggregate in (
+        ("legacy objects", legacy, rollup),
+        ("__slots__ + identity map", slotted, rollup),
+        ("LessonBatch (arrays)", columnar, lambda batch: batch.totals_by('month')),
+    ):
+        result, seconds, retained = measure(build)
+        started = time.perf_counter()
+        aggregate(result)
+        rollup_seconds = time.perf_counter() - started
+        print(f"  {name:<28} {seconds * 1000:>9.1f} {retained / 2**20:>12.1f} {retained / args.lessons:>13.0f} "
+              f"{rollup_seconds * 1000:>18.1f}")
+        del result
+
+if __name__ == "__main__":
+    main()
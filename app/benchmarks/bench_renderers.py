@@ -0,0 +1,60 @@
+"""Compares invoices/second across the PDF renderer backends for a typical month
+(four weeks of lessons). Backends whose dependencies are missing are reported and skipped."""
+import argparse
+import datetime
+import time
+
+import jinja2
+
+from renderers import Invoice, RENDERERS, get_renderer
+
+CONTEXT = {
+    "full_name": "Bench Tutor", "address": "1 Bench Street", "town": "Benchton",
+    "invoice_date": "01 Jan 2024", "postcode": "BE1 1NC", "invoice_no": "202401",
+    "email": "bench@example.com", "account_no": "12345678", "sort_code": "00-00-00",
+}
+
+def make_invoice(lessons_per_week: int = 10, weeks: int = 4, rate: float = 30.0) -> Invoice:
+    """Builds an invoice with the same shape create_pdf() produces, including its HTML."""
+    start = datetime.date(2024, 1, 1)
+    rows = [[((start + datetime.timedelta(days=w * 7 + i % 7)).strftime('%d/%m/%Y'),
+              f"Student{i}", rate, 1.0, rate) for i in range(lessons_per_week)] for w in range(weeks)]
+    totals = [sum(row[4] for row in week) for week in rows]
+    context = dict(CONTEXT, monthly_total=f"{sum(totals):.2f}")
+
+    with open('templates/head.html') as head, open('templates/new_table.html') as table, \
+            open('templates/tail.html') as tail:
+        parts, table_html = [head.read()], table.read()
+        for i, week in enumerate(rows):
+            parts.append(table_html)
+            parts.extend(f"<tr><td>{d}</td><td>{s}</td><td>&pound{r:.2f}</td><td>{h}</td>"
+                         f"<td class='bold'>&pound{t:.2f}</td></tr>" for d, s, r, h, t in week)
+            parts.append(f"<tr><td colspan='4' align='right' class='week-total'><strong>TOTAL DUE FOR WEEK "
+                         f"{i + 1}</strong></td><td class='total'><strong>&pound{totals[i]:.2f}</strong></td></tr>")
+        parts.append(tail.read())
+    html = jinja2.Template(''.join(parts)).render(context)
+    return Invoice(context, rows, totals, html)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--invoices", type=int, default=20)
+    parser.add_argument("--backends", nargs="*", default=list(RENDERERS))
+    args = parser.parse_args()
+
+    invoice = make_invoice()
+    for name in args.backends:
+        try:
+            renderer = get_renderer(name)
+            renderer.render(invoice)  # warm-up
+        except OSError as error:
+            print(f"  {name:<18} skipped ({str(error).splitlines()[0]})")
+            continue
+        started = time.perf_counter()
+        for _ in range(args.invoices):
+            renderer.render(invoice)
+        elapsed = time.perf_counter() - started
+        print(f"  {name:<18} {args.invoices / elapsed:>10,.1f} invoices/s")
+        renderer.close()
+
+if __name__ == "__main__":
+    main()
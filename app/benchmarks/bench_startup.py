@@ -0,0 +1,70 @@
+"""Measures cold-start cost: wall time to import `server` (and `quickstart`) in a fresh interpreter, plus a
+`python -X importtime` breakdown of the slowest modules. Fails if a heavy, sync- or renderer-only
+dependency (googleapiclient, google_auth_oauthlib, pdfkit) is imported eagerly."""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.bench_ingest import SETTINGS
+
+# Packages that must only be loaded on first use
+LAZY_PACKAGES = ("googleapiclient", "google_auth_oauthlib", "google.oauth2", "google.auth.transport", "pdfkit")
+
+def import_once(module: str, app_dir: str, env: dict) -> tuple[float, dict[str, tuple[int, int]]]:
+    """Imports `module` in a new interpreter under -X importtime.
+
+    :return: (wall seconds, {module: (self us, cumulative us)}).
+    """
+    code = (f"import time; started = time.perf_counter(); import {module}; "
+            f"print(time.perf_counter() - started)")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, capture_output=True,
+                            text=True, check=True)
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return float(result.stdout.strip().splitlines()[-1]), timings
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", nargs="+", default=["quickstart", "server"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    app_dir = os.getcwd()
+    env = {**os.environ, "PYTHONPATH": app_dir, "PYTHONDONTWRITEBYTECODE": "1", "SYNC_REFRESH_MINUTES": "0"}
+
+    eager = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        with open("user_settings.json", "w") as file:
+            json.dump(SETTINGS, file)
+        for module in args.modules:
+            runs = [import_once(module, app_dir, env) for _ in range(args.runs)]
+            walls = sorted(wall for wall, _ in runs)
+            timings = runs[-1][1]
+            print(f"import {module}: median {statistics.median(walls) * 1000:.1f}ms, "
+                  f"min {walls[0] * 1000:.1f}ms over {args.runs} runs, {len(timings)} modules")
+            slowest = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)
+            for name, (self_us, cumulative_us) in slowest[1:args.top + 1]:
+                print(f"  {cumulative_us / 1000:>8.1f}ms cumulative {self_us / 1000:>7.1f}ms self  {name}")
+            eager += [f"{module} -> {package}" for package in LAZY_PACKAGES
+                      if any(name == package or name.startswith(package + ".") for name in timings)]
+        os.chdir(app_dir)
+
+    if eager:
+        print("Imported eagerly (should be lazy):")
+        for entry in sorted(set(eager)):
+            print(f"  {entry}")
+        sys.exit(1)
+    print(f"OK: none of {', '.join(LAZY_PACKAGES)} imported at startup")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Multi-tenant load test: many tutors, each with their own settings, lesson database and (fake) calendar,
+served by one process. Client threads hit the dashboard, the API and the analytics endpoints for random
+tenants while every tenant queues calendar syncs, one of them a long backfill.
+
+Checks that every tenant only ever sees its own data, that open databases stay within
+MAX_OPEN_DATABASES, and that the noisy tenant's backlog does not hold the others' syncs back."""
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_ingest import SETTINGS
+from benchmarks.generators import FakeCalendarService, anchor_week, events_between, populate_db, size_profile
+from benchmarks.suite import percentile
+
+PATHS = ("/", "/api/lessons?limit=100", "/api/analytics/student?limit=10", "/api/analytics/weekday",
+         "/sync/status")
+
+def create_tenants(tenants, count: int, lessons: int, anchor: datetime.date) -> list:
+    """Creates `count` tenants; tenant i has `lessons` + i lessons generated with seed i."""
+    created = []
+    for i in range(count):
+        tenant = tenants.create_tenant(f"tutor{i:04}")
+        with open(tenant.path("user_settings.json"), "w") as file:
+            json.dump(dict(SETTINGS, full_name=f"Tutor {i}"), file)
+        with tenants.use(tenant):
+            populate_db(tenant.path("lessons.db"), str(lessons + i), anchor, seed=i)
+        created.append(tenant)
+    return created
+
+def check_isolation(client, header: str, created: list) -> list[str]:
+    """Every tenant's analytics and export must count exactly the lessons in its own database file
+    (tenants are created with different lesson counts, so reading another tenant's data shows up)."""
+    failures = []
+    for tenant in created:
+        response = client.get("/api/analytics/month?from=2000-01-01&to=2100-01-01", headers={header: tenant.id})
+        counted = sum(item["lessons"] for item in response.get_json()["items"])
+        conn = sqlite3.connect(tenant.path("lessons.db"))
+        expected = conn.execute("SELECT COUNT(*) FROM lessons").fetchone()[0]
+        conn.close()
+        if counted != expected:
+            failures.append(f"{tenant.id}: {counted} lessons, expected {expected}")
+        # Streamed bodies are produced after the request has finished, so check one of those too
+        exported = client.get("/api/lessons/export.csv", headers={header: tenant.id}).data.count(b"\n") - 1
+        if exported != expected:
+            failures.append(f"{tenant.id}: {exported} lessons exported, expected {expected}")
+    for tenant_id in ("unknown", "../escape"):
+        status = client.get("/", headers={header: tenant_id}).status_code
+        if status != 404:
+            failures.append(f"tenant {tenant_id!r} answered {status}, expected 404")
+    return failures
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenants", type=int, default=50)
+    parser.add_argument("--lessons", type=int, default=2_000, help="lessons per tenant")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--max-open", type=int, default=16, help="MAX_OPEN_DATABASES for the run")
+    parser.add_argument("--backfill", type=int, default=24, help="months the noisy tenant syncs")
+    args = parser.parse_args()
+    app_dir = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.symlink(os.path.join(app_dir, "templates"), "templates")
+        os.symlink(os.path.join(app_dir, "static"), "static")
+        os.environ.update(TENANTS_DIR=os.path.join(workdir, "tenants"), MAX_OPEN_DATABASES=str(args.max_open),
+                          SYNC_REFRESH_MINUTES="0")
+        import db
+        import quickstart as q
+        import server
+        import tenants
+
+        anchor = anchor_week()
+        started = time.perf_counter()
+        created = create_tenants(tenants, args.tenants, args.lessons, anchor)
+        print(f"{args.tenants} tenants x ~{args.lessons:,} lessons created in {time.perf_counter() - started:.1f}s")
+
+        # Each tenant's calendar is generated with the profile and seed its database was
+        services = {}
+        for i, tenant in enumerate(created):
+            _, students, _, lessons_per_week = size_profile(str(args.lessons + i))
+            services[tenant.id] = FakeCalendarService(lambda start, end, seed=i, students=students,
+                                                      lessons_per_week=lessons_per_week: events_between(
+                start, end, students, lessons_per_week, SETTINGS["control_str"], seed))
+        q.get_calendar_service = lambda creds=None: services[tenants.current_id()]
+        client = server.app.test_client()
+        header = server.TENANT_HEADER
+
+        failures = check_isolation(client, header, created)
+
+        # Queue the syncs while the worker is paused: the first tenant backfills many months, every
+        # other tenant then syncs one
+        server.scheduler.stop()
+        noisy, quiet = created[0], created[1:]
+        with tenants.use(noisy):
+            month = anchor.replace(day=1)
+            noisy_jobs = []
+            for _ in range(args.backfill):
+                noisy_jobs.append(server.submit_sync(("month", month.year, month.month), q.sync_calendar,
+                                                     month.month, month.year))
+                month = (month - datetime.timedelta(days=1)).replace(day=1)
+        quiet_jobs = []
+        for tenant in quiet:
+            with tenants.use(tenant):
+                quiet_jobs.append(server.submit_sync(("month", anchor.year, anchor.month), q.sync_calendar,
+                                                     anchor.month, anchor.year))
+        server.scheduler.start()
+
+        stop = threading.Event()
+        latencies: list[float] = []
+        statuses: dict[int, int] = {}
+        lock = threading.Lock()
+        max_open = [0]
+
+        def user(seed: int) -> None:
+            rng = random.Random(seed)
+            http = server.app.test_client()
+            while not stop.is_set():
+                tenant = rng.choice(created)
+                request_started = time.perf_counter()
+                response = http.get(rng.choice(PATHS), headers={header: tenant.id})
+                response.get_data()
+                elapsed = time.perf_counter() - request_started
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        def sample() -> None:
+            while not stop.is_set():
+                max_open[0] = max(max_open[0], db.open_databases())
+                time.sleep(0.01)
+
+        workers = [threading.Thread(target=user, args=(seed,)) for seed in range(args.threads)]
+        workers.append(threading.Thread(target=sample))
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        for job in noisy_jobs + quiet_jobs:
+            job.wait()
+        server.scheduler.stop()
+
+        latencies.sort()
+        print(f"{len(latencies):,} requests from {args.threads} threads in {elapsed:.1f}s: "
+              f"{len(latencies) / elapsed:,.0f} req/s, p50 {percentile(latencies, 0.5) * 1000:.1f}ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms  {statuses}")
+        print(f"open databases: peak {max_open[0]} (MAX_OPEN_DATABASES {db.MAX_OPEN_DATABASES}), "
+              f"fragment cache tenants {server.fragment_cache.stats()['tenants']}, "
+              f"open files {len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else '-'}, "
+              f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+        # Round-robin scheduling: each quiet tenant's sync waits behind at most one noisy job
+        ahead = [sum(job.finished_at < quiet_job.finished_at for job in noisy_jobs) for quiet_job in quiet_jobs]
+        print(f"syncs: noisy tenant {args.backfill} months, {len(quiet_jobs)} quiet tenants 1 month each; "
+              f"noisy jobs finished before a quiet one: median {statistics.median(ahead) if ahead else 0:g}, "
+              f"max {max(ahead, default=0)}")
+        failed = [job for job in noisy_jobs + quiet_jobs if job.state != "done"]
+        failures += [f"job {job.id} {job.state}: {job.error}" for job in failed]
+        if db.open_databases() > db.MAX_OPEN_DATABASES or max_open[0] > db.MAX_OPEN_DATABASES:
+            failures.append(f"{max_open[0]} databases open at once")
+        if max(ahead, default=0) > 1:
+            failures.append("quiet tenants' syncs waited behind more than one noisy job")
+        failures += check_isolation(client, header, created)
+        os.chdir(app_dir)
+
+    if failures:
+        print("FAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        raise SystemExit(1)
+    print("OK: tenants isolated, open databases bounded, syncs scheduled fairly")
+
+if __name__ == "__main__":
+    main()
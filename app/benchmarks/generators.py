@@ -0,0 +1,166 @@
+"""Synthetic data for the benchmarks: Google Calendar event payloads, an offline stand-in for the
+Calendar API serving them, and pre-populated lesson databases of a given size.
+
+Everything is deterministic for a given seed and anchor week, so two runs measure the same data."""
+import datetime
+import itertools
+import math
+import os
+import random
+import sqlite3
+
+SUBJECTS = ("Maths", "Physics", "Chemistry", "Biology", "English")
+DURATIONS = (0.5, 1.0, 1.0, 1.0, 1.5, 2.0)
+TIME_ZONE = "Europe/London"
+# Week numbers (and so event ids) count from this Monday, whatever span is generated
+EPOCH = datetime.date(2000, 1, 3)
+# Weeks of lessons generated after the anchor week, so the dashboard has upcoming lessons
+FUTURE_WEEKS = 4
+# Events written per store_events() batch while populating a database
+POPULATE_BATCH_SIZE = 10_000
+
+# Database sizes: name -> (lessons, students, years of history)
+SIZES = {
+    "1k": (1_000, 20, 2),
+    "100k": (100_000, 250, 10),
+    "1m": (1_000_000, 1_000, 10),
+}
+
+def anchor_week(today: datetime.date = None) -> datetime.date:
+    """Returns the Monday of the week containing `today` (default: the current week)."""
+    today = today or datetime.date.today()
+    return today - datetime.timedelta(days=today.weekday())
+
+def make_event(event_id: str, control_str: str, student: str, subject: str,
+               start: datetime.datetime, hours: float) -> dict:
+    """Builds one event as `events().list()` returns it with `singleEvents=True`."""
+    end = start + datetime.timedelta(hours=hours)
+    return {
+        "kind": "calendar#event",
+        "id": event_id,
+        "status": "confirmed",
+        "summary": f"{control_str} {student} {subject}",
+        "start": {"dateTime": start.isoformat(), "timeZone": TIME_ZONE},
+        "end": {"dateTime": end.isoformat(), "timeZone": TIME_ZONE},
+    }
+
+def week_events(week: int, students: int, lessons_per_week: int, control_str: str, seed: int = 0) -> list[dict]:
+    """The lessons of week number `week` (counted from EPOCH), in start order. Each week has its own
+    random stream, so any window of weeks can be regenerated without building the ones before it."""
+    rng = random.Random(seed * 1_000_003 + week)
+    monday = EPOCH + datetime.timedelta(weeks=week)
+    events = []
+    for i in range(lessons_per_week):
+        student = rng.randrange(students)
+        day = monday + datetime.timedelta(days=rng.randrange(7))
+        # Half-hour slots from 08:00 to 20:30
+        slot = rng.randrange(26)
+        start = datetime.datetime(day.year, day.month, day.day, 8 + slot // 2, 30 * (slot % 2),
+                                  tzinfo=datetime.timezone.utc)
+        events.append(make_event(f"bench{week:05}{i:06}", control_str, f"Student{student:04}",
+                                 SUBJECTS[student % len(SUBJECTS)], start, rng.choice(DURATIONS)))
+    events.sort(key=lambda event: event["start"]["dateTime"])
+    return events
+
+def calendar_events(students: int = 40, lessons_per_week: int = 10, years: float = 1,
+                    anchor: datetime.date = None, control_str: str = "Tutoring with", seed: int = 0):
+    """Yields `years` of lessons up to the anchor week (default: this week), plus FUTURE_WEEKS
+    after it, spread over `students` students, in start order."""
+    last = (anchor_week(anchor) - EPOCH).days // 7 + FUTURE_WEEKS
+    first = last - FUTURE_WEEKS - max(1, round(years * 52)) + 1
+    for week in range(first, last + 1):
+        yield from week_events(week, students, lessons_per_week, control_str, seed)
+
+def events_between(start: datetime.date, end: datetime.date, students: int, lessons_per_week: int,
+                   control_str: str = "Tutoring with", seed: int = 0) -> list[dict]:
+    """The generated events starting on or after `start` and before `end`, as a month sync would list them."""
+    first, last = (start - EPOCH).days // 7, (end - EPOCH).days // 7
+    start_text, end_text = start.isoformat(), end.isoformat()
+    return [event for week in range(first, last + 1)
+            for event in week_events(week, students, lessons_per_week, control_str, seed)
+            if start_text <= event["start"]["dateTime"][:10] < end_text]
+
+class _Request:
+    def __init__(self, response: dict):
+        self._response = response
+
+    def execute(self) -> dict:
+        return self._response
+
+class FakeCalendarService:
+    """An offline stand-in for the Calendar API client, enough for `list_events()`: pages through
+    the events of each `timeMin`/`timeMax` window produced by `list_window(start, end)`."""
+    def __init__(self, list_window, page_size: int = 250):
+        self.list_window = list_window
+        self.page_size = page_size
+        self.calls = 0
+
+    def events(self):
+        return self
+
+    def list(self, timeMin: str = None, timeMax: str = None, maxResults: int = None, pageToken: str = None,
+             **params) -> _Request:
+        self.calls += 1
+        start = datetime.date.fromisoformat(timeMin[:10])
+        end = datetime.date.fromisoformat(timeMax[:10])
+        items = self.list_window(start, end)
+        offset = int(pageToken or 0)
+        size = min(self.page_size, maxResults or self.page_size)
+        response = {"kind": "calendar#events", "items": items[offset:offset + size]}
+        if offset + size < len(items):
+            response["nextPageToken"] = str(offset + size)
+        else:
+            response["nextSyncToken"] = f"sync{len(items)}"
+        return _Request(response)
+
+def size_profile(size: str) -> tuple[int, int, float, int]:
+    """Returns (lessons, students, years, lessons per week) for a SIZES name or a plain row count."""
+    if size in SIZES:
+        rows, students, years = SIZES[size]
+    else:
+        rows = int(size)
+        students, years = max(20, min(1_000, rows // 1_000)), 2 if rows <= 10_000 else 10
+    return rows, students, years, math.ceil(rows / (years * 52 + FUTURE_WEEKS))
+
+def populate_db(db_file: str, size: str, anchor: datetime.date = None, seed: int = 0) -> int:
+    """Creates `db_file` holding `size` lessons (a SIZES name or a row count) ingested through
+    `store_events()`, so students, rates, the monthly summary and every trigger-maintained column
+    look as they would after a real sync. Must run with the user settings in the working directory.
+
+    :return: the number of lessons written.
+    """
+    import quickstart as q
+    from migrations import migrate
+
+    rows, students, years, lessons_per_week = size_profile(size)
+    control_str = q.load_settings().control_str
+    events = calendar_events(students, lessons_per_week, years, anchor, control_str, seed)
+    # Drop the oldest surplus events so the history is exactly `rows` long and still ends at the anchor
+    weeks = max(1, round(years * 52)) + FUTURE_WEEKS
+    events = itertools.islice(events, max(0, weeks * lessons_per_week - rows), None)
+
+    temp_file = f"{db_file}.tmp"
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+    migrate(temp_file)
+    conn = sqlite3.connect(temp_file)
+    conn.execute("PRAGMA synchronous = OFF")
+    written = 0
+    while batch := list(itertools.islice(events, POPULATE_BATCH_SIZE)):
+        with conn:
+            q.store_events(conn.cursor(), batch)
+        written += len(batch)
+    conn.execute("PRAGMA optimize")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    os.replace(temp_file, db_file)
+    return written
+
+def cached_db(data_dir: str, size: str, anchor: datetime.date = None, seed: int = 0) -> str:
+    """Returns the path of a populated database for `size` in `data_dir`, building it on first use.
+    Files are keyed by size, anchor week and seed, so later runs reuse identical data."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"lessons-{size}-{anchor_week(anchor).isoformat()}-{seed}.db")
+    if not os.path.exists(path):
+        populate_db(path, size, anchor, seed)
+    return path
@@ -0,0 +1,227 @@
+"""Reproducible benchmark suite for the hot paths: sync_calendar, fetch_lessons, group_lessons, the index()
+dashboard, create_pdf and the analytics rollups, each run against lesson databases of 1k/100k/1m rows
+built by the generators.
+
+Every scenario reports latency percentiles, throughput and peak traced memory into a JSON results file;
+pass an earlier file as --baseline to compare against it, or compare two files with --compare OLD NEW."""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_ingest import SETTINGS
+from benchmarks.generators import SIZES, FakeCalendarService, anchor_week, cached_db, events_between, size_profile
+
+SCENARIOS = ("sync_calendar", "fetch_lessons", "group_lessons", "dashboard", "create_pdf", "analytics")
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "invoice-bench")
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def measure(run, iterations: int, warmup: int) -> dict:
+    """Times `iterations` calls of `run` (which returns the number of items it processed) after `warmup`
+    untimed calls, then repeats one call under tracemalloc for its peak allocated memory."""
+    for _ in range(warmup):
+        run()
+    latencies, items = [], 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        items += run() or 0
+        latencies.append(time.perf_counter() - started)
+    # Tracing slows every allocation down, so peak memory is taken from a separate, untimed call
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "iterations": iterations,
+        "mean_ms": total / iterations * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p90_ms": percentile(latencies, 0.90) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "ops_per_s": iterations / total,
+        "items_per_s": items / total,
+        "peak_kb": peak / 1024,
+    }
+
+def scenarios(q, server, args, month: int, year: int, students: int, lessons_per_week: int) -> dict:
+    """Returns scenario name -> callable running it once and returning the items it processed."""
+    import analytics
+    start = datetime.date(year, month, 1)
+    end = datetime.date(year + month // 12, month % 12 + 1, 1)
+    control_str = SETTINGS["control_str"]
+    month_events = events_between(start, end, students, lessons_per_week, control_str, args.seed)
+    service = FakeCalendarService(lambda first, last: events_between(first, last, students, lessons_per_week,
+                                                                     control_str, args.seed))
+    # The synced month is already stored, so every run upserts the same events: the steady-state cost
+    q.get_calendar_service = lambda creds=None: service
+    client = server.app.test_client()
+    academic_start, academic_end = analytics.academic_year(start)
+
+    def sync_calendar():
+        q.sync_calendar(month, year)
+        return len(month_events)
+
+    def fetch_lessons():
+        return len(q.fetch_lessons(month, year))
+
+    def group_lessons():
+        return sum(len(week) for week in q.group_lessons(month, year)[0])
+
+    def dashboard():
+        # Without If-None-Match and with the fragment cache emptied, every request renders from the DB
+        server.fragment_cache.clear()
+        response = client.get("/")
+        assert response.status_code == 200, response.status_code
+        return 1
+
+    def create_pdf():
+        q.create_pdf(month, year, renderer=args.renderer, use_cache=False)
+        return 1
+
+    def analytics_rollups():
+        # Every dimension over the academic year, computed afresh rather than served from the memo
+        analytics.cache.clear()
+        for dimension in analytics.DIMENSIONS:
+            analytics.rollup(dimension, academic_start, academic_end)
+        return len(analytics.DIMENSIONS)
+
+    return {"sync_calendar": sync_calendar, "fetch_lessons": fetch_lessons, "group_lessons": group_lessons,
+            "dashboard": dashboard, "create_pdf": create_pdf, "analytics": analytics_rollups}
+
+def git_commit(app_dir: str) -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=app_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args) -> dict:
+    app_dir = os.getcwd()
+    data_dir = os.path.abspath(args.data_dir)
+    anchor = anchor_week(datetime.date.fromisoformat(args.anchor) if args.anchor else None)
+    results = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(app_dir),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "anchor": anchor.isoformat(),
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "renderer": args.renderer,
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.symlink(os.path.join(app_dir, "templates"), "templates")
+        os.symlink(os.path.join(app_dir, "static"), "static")
+        os.makedirs("invoices/html")
+        os.makedirs("invoices/pdf")
+        with open("user_settings.json", "w") as file:
+            json.dump(SETTINGS, file)
+        os.environ["SYNC_REFRESH_MINUTES"] = "0"
+        import db
+        import quickstart as q
+        import server
+
+        try:
+            for size in args.sizes:
+                started = time.perf_counter()
+                source = cached_db(data_dir, size, anchor, args.seed)
+                built = time.perf_counter() - started
+                # Scenarios write (sync upserts, generation bumps), so each size runs on a private copy
+                db_file = os.path.join(workdir, f"lessons-{size}.db")
+                shutil.copyfile(source, db_file)
+                db.DB_FILE = db_file
+                rows, students, _, lessons_per_week = size_profile(size)
+                print(f"{size}: {rows:,} lessons, {students} students ({source}, ready in {built:.1f}s)")
+                runs = scenarios(q, server, args, anchor.month, anchor.year, students, lessons_per_week)
+                for name in args.scenarios:
+                    try:
+                        result = measure(runs[name], args.iterations, args.warmup)
+                    except Exception as error:
+                        print(f"  {name:<14} skipped: {error!r}")
+                        continue
+                    results["results"][f"{size}/{name}"] = result
+                    print(f"  {name:<14} p50 {result['p50_ms']:>9.2f}ms  p99 {result['p99_ms']:>9.2f}ms  "
+                          f"{result['ops_per_s']:>9.1f} ops/s  {result['items_per_s']:>11,.0f} items/s  "
+                          f"peak {result['peak_kb']:>9,.0f} KiB")
+        finally:
+            server.scheduler.stop()
+            os.chdir(app_dir)
+    return results
+
+def compare(old: dict, new: dict, threshold: float) -> bool:
+    """Prints the change in p50 latency, throughput and peak memory per scenario.
+
+    :return: True if any scenario's p50 latency regressed by more than `threshold` (a fraction).
+    """
+    regressed = False
+    print(f"{'scenario':<24} {'p50 old':>10} {'p50 new':>10} {'change':>8} {'ops/s':>8} {'peak':>8}")
+    for key, result in new["results"].items():
+        before = old["results"].get(key)
+        if before is None:
+            print(f"{key:<24} {'-':>10} {result['p50_ms']:>8.2f}ms  (new)")
+            continue
+        latency = result["p50_ms"] / before["p50_ms"] - 1
+        throughput = result["ops_per_s"] / before["ops_per_s"] - 1
+        memory = result["peak_kb"] / before["peak_kb"] - 1 if before["peak_kb"] else 0.0
+        flag = "  REGRESSION" if latency > threshold else ""
+        regressed = regressed or bool(flag)
+        print(f"{key:<24} {before['p50_ms']:>8.2f}ms {result['p50_ms']:>8.2f}ms {latency:>+8.1%} "
+              f"{throughput:>+8.1%} {memory:>+8.1%}{flag}")
+    return regressed
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", nargs="+", default=["1k", "100k"],
+                        help=f"database sizes: {', '.join(SIZES)} or a lesson count (default: 1k 100k)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--renderer", default="simple", help="PDF renderer for create_pdf (default: simple)")
+    parser.add_argument("--anchor", help="YYYY-MM-DD in the week the data ends at and the scenarios run "
+                                         "(default: this week)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="where generated databases are cached")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="an earlier results file to compare this run against")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="only compare two results files")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="p50 slowdown reported as a regression (default: 0.10, i.e. 10%%)")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as old, open(args.compare[1]) as new:
+            sys.exit(1 if compare(json.load(old), json.load(new), args.threshold) else 0)
+    output = os.path.abspath(args.output)
+    results = run(args)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}")
+    if args.baseline:
+        with open(args.baseline) as file:
+            sys.exit(1 if compare(json.load(file), results, args.threshold) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import metrics
+import tenants
+from migrations import migrate
+
+DB_FILE = 'lessons.db'
+POOL_SIZE = 8
+# Seconds a unit of work waits for a free pooled connection before failing with PoolTimeout
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+# Databases kept open at once (one pool each); with many tenants the least recently used are closed
+MAX_OPEN_DATABASES = int(os.environ.get('MAX_OPEN_DATABASES', 32))
+CACHED_STATEMENTS = 256
+# Applied to every pooled connection. WAL lets dashboard readers proceed while a sync is writing.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",       # 16 MB page cache
+    "PRAGMA mmap_size = 134217728",     # 128 MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",         # enforce references and ON DELETE CASCADE
+)
+# Applied to the dedicated connections behind streamed responses, which only ever read
+# (the journal mode is stored in the database file, so it need not be set again)
+STREAM_PRAGMAS = tuple(pragma for pragma in CONNECTION_PRAGMAS if "journal_mode" not in pragma) + (
+    "PRAGMA query_only = ON",
+)
+
+class PoolTimeout(sqlite3.OperationalError):
+    """No pooled connection became free within the pool's timeout."""
+
+class ConnectionPool:
+    """A bounded pool of tuned SQLite connections to a single database file.
+
+    Connections are checked out per thread, so nested `connection()` blocks on one thread share
+    a connection (and its transaction), and are kept open between uses so each keeps its
+    prepared-statement cache. Waiting longer than `timeout` seconds for a free one raises PoolTimeout.
+    Reads that stay open while a response streams use `stream_connection()` instead, outside the pool.
+    """
+    def __init__(self, db_file: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.db_file = db_file
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self.closed = False
+
+    def _open(self, pragmas: tuple[str, ...] = CONNECTION_PRAGMAS) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+        for pragma in pragmas:
+            conn.execute(pragma)
+        if metrics.ENABLED:
+            conn.set_trace_callback(metrics.trace_statement)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Yields a connection for one unit of work, committing on success and rolling back on error."""
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"all {self.size} connections to {self.db_file} stayed busy for {self.timeout:g}s")
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            self._local.conn = conn
+            try:
+                with conn:
+                    yield conn
+            finally:
+                self._local.conn = None
+                if self.closed:
+                    conn.close()
+                else:
+                    self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def stream_connection(self):
+        """Yields a dedicated read-only connection, closed on exit, for a read that stays open while its
+        response streams, so a slow or abandoned download never holds one of the pool's slots."""
+        conn = self._open(STREAM_PRAGMAS)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        """Closes every idle connection; connections still checked out are closed when returned."""
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+# db file -> pool, least recently used first
+_pools: OrderedDict[str, ConnectionPool] = OrderedDict()
+_pools_lock = threading.Lock()
+# db file -> lock held while that database is migrated, so opening one never waits on another's migration
+_migrate_locks: dict[str, threading.Lock] = {}
+
+def _open_pool(db_file: str) -> ConnectionPool | None:
+    with _pools_lock:
+        pool = _pools.get(db_file)
+        if pool is not None:
+            _pools.move_to_end(db_file)
+        return pool
+
+def get_pool(db_file: str = None) -> ConnectionPool:
+    """Returns the shared pool for `db_file` (default: the current tenant's DB_FILE), migrating the
+    database and creating the pool on first use. Beyond MAX_OPEN_DATABASES the least recently used
+    pool is closed; it is reopened if that database is used again."""
+    db_file = db_file or tenants.resolve(DB_FILE)
+    pool = _open_pool(db_file)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        migrate_lock = _migrate_locks.setdefault(db_file, threading.Lock())
+    with migrate_lock:
+        # Another thread may have opened the database while this one waited
+        pool = _open_pool(db_file)
+        if pool is not None:
+            return pool
+        migrate(db_file)
+        with _pools_lock:
+            pool = _pools[db_file] = ConnectionPool(db_file)
+            while len(_pools) > MAX_OPEN_DATABASES:
+                _pools.popitem(last=False)[1].close()
+        return pool
+
+def open_databases() -> int:
+    """The number of databases with an open pool."""
+    return len(_pools)
+
+def connection(db_file: str = None):
+    """Context manager yielding a pooled connection to `db_file` (default: the current tenant's DB_FILE)."""
+    return get_pool(db_file).connection()
+
+def stream_connection(db_file: str = None):
+    """Context manager yielding a dedicated read-only connection to `db_file` (default: the current tenant's
+    DB_FILE) outside the pool, for streamed responses."""
+    return get_pool(db_file).stream_connection()
+
+def generation(db_file: str = None) -> int:
+    """Returns the database generation: a counter bumped by triggers whenever lessons, students
+    or hourly rates change, for deriving cache keys and ETags."""
+    with connection(db_file) as conn:
+        return conn.execute("SELECT value FROM generation WHERE id = 1").fetchone()[0]
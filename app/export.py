@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+import os
+import threading
+import db
+
+# Rows read from SQLite per fetchmany(), and per CSV/JSONL write or Parquet row group
+CHUNK_SIZE = 5000
+
+EXPORT_COLUMNS = ('event_id', 'date', 'weekday', 'start_time', 'end_time', 'duration', 'hourly_rate', 'earned',
+                  'student_id', 'student', 'level', 'year', 'exam_board', 'target_grade', 'subject')
+EXPORT_QUERY = '''
+    SELECT l.event_id, l.date, l.weekday, l.start_time, l.end_time, l.duration, l.hourly_rate,
+           l.duration * l.hourly_rate, l.student_id, l.student,
+           s.level, s.year, s.exam_board, s.target_grade, s.subject
+    FROM lessons l
+    LEFT JOIN students s ON l.student_id = s.id
+'''
+
+def iter_chunks(start: str = None, end: str = None, student_id: int = None, chunk_size: int = CHUNK_SIZE):
+    """Yields the lesson history (joined with student profiles) in date order, `chunk_size` rows at a time.
+    `start` is inclusive and `end` exclusive ('YYYY-MM-DD'); any filter may be None."""
+    filters, args = [], []
+    if start:
+        filters.append("l.date >= ?")
+        args.append(start)
+    if end:
+        filters.append("l.date < ?")
+        args.append(end)
+    if student_id is not None:
+        filters.append("l.student_id = ?")
+        args.append(student_id)
+    query = EXPORT_QUERY
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    query += " ORDER BY l.date, l.event_id"
+    # A dedicated connection, since the download may stay open for as long as the client takes to read it
+    with db.stream_connection() as conn:
+        rows = conn.execute(query, args)
+        while True:
+            chunk = rows.fetchmany(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+def csv_stream(chunks):
+    """Encodes row chunks as CSV with a header line, yielding one bytes block per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def jsonl_stream(chunks):
+    """Encodes row chunks as JSON Lines, one object per lesson."""
+    for chunk in chunks:
+        yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n' for row in chunk).encode()
+
+class _Sink(io.RawIOBase):
+    """A write-only file that hands back whatever was written since the last drain(), so a Parquet
+    writer's output can be streamed row group by row group."""
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+def parquet_stream(chunks):
+    """Encodes row chunks as a Parquet file, one row group per chunk. Requires the optional pyarrow package."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs the optional 'pyarrow' package (pip install pyarrow)") from None
+    schema = pa.schema([
+        ('event_id', pa.string()), ('date', pa.string()), ('weekday', pa.int64()),
+        ('start_time', pa.string()), ('end_time', pa.string()), ('duration', pa.float64()),
+        ('hourly_rate', pa.float64()), ('earned', pa.float64()), ('student_id', pa.int64()),
+        ('student', pa.string()), ('level', pa.string()), ('year', pa.string()), ('exam_board', pa.string()),
+        ('target_grade', pa.string()), ('subject', pa.string()),
+    ])
+    sink = _Sink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+# Export formats: name -> (encoder, MIME type, file extension)
+FORMATS = {
+    'csv': (csv_stream, 'text/csv', '.csv'),
+    'jsonl': (jsonl_stream, 'application/x-ndjson', '.jsonl'),
+    'parquet': (parquet_stream, 'application/vnd.apache.parquet', '.parquet'),
+}
+
+def export_stream(fmt: str, start: str = None, end: str = None, student_id: int = None):
+    """Yields the filtered lesson history encoded as `fmt` (csv, jsonl or parquet), in bytes blocks.
+    Only one chunk of rows is held in memory at a time, however long the history."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'; choose from {', '.join(FORMATS)}")
+    return FORMATS[fmt][0](iter_chunks(start, end, student_id))
+
+def export_to_file(path: str, fmt: str = None, start: str = None, end: str = None, student_id: int = None) -> int:
+    """Writes the filtered lesson history to `path`, inferring the format from its extension if `fmt` is None.
+
+    :return: the number of lessons written.
+    """
+    if fmt is None:
+        fmt = next((name for name, (_, _, ext) in FORMATS.items() if path.endswith(ext)), None)
+        if fmt is None:
+            raise ValueError(f"Cannot infer the export format of '{path}'; pass one of {', '.join(FORMATS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'; choose from {', '.join(FORMATS)}")
+    count = 0
+
+    def counted(chunks):
+        nonlocal count
+        for chunk in chunks:
+            count += len(chunk)
+            yield chunk
+
+    # Write under a per-thread name, then swap into place, so readers never see a partial export
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as out:
+            for block in FORMATS[fmt][0](counted(iter_chunks(start, end, student_id))):
+                out.write(block)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return count
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+import tenants
+
+MAX_ENTRIES = 256
+# Tenants with cached fragments; the least recently used tenant's fragments are dropped beyond this
+MAX_SCOPES = 64
+
+class _Scope:
+    """The fragments cached for one tenant's database."""
+    __slots__ = ('generation', 'entries')
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.entries: dict = {}
+
+class FragmentCache:
+    """An in-memory cache of page fragments (query results and serialised JSON) for one database generation.
+
+    Entries are looked up with the current `db.generation()`; when it moves on (after a sync or an
+    edit) every entry is dropped at once, so nothing stale is ever served. Within a generation the
+    oldest entries are discarded beyond `max_entries`. Each tenant's database has its own generation,
+    so entries are kept per tenant, for at most `max_scopes` tenants.
+    """
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_scopes: int = MAX_SCOPES):
+        self.max_entries = max_entries
+        self.max_scopes = max_scopes
+        self.counters = {"hits": 0, "misses": 0, "invalidations": 0}
+        self._scopes: OrderedDict[str | None, _Scope] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _scope(self, tenant_id: str | None, generation: int) -> _Scope:
+        scope = self._scopes.get(tenant_id)
+        if scope is None:
+            scope = self._scopes[tenant_id] = _Scope(generation)
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+        else:
+            self._scopes.move_to_end(tenant_id)
+            if generation != scope.generation:
+                if scope.entries:
+                    self.counters["invalidations"] += 1
+                scope.entries.clear()
+                scope.generation = generation
+        return scope
+
+    def get(self, generation: int, key, build):
+        """Returns the fragment cached under `key` for `generation`, calling `build()` to create it on a miss."""
+        tenant_id = tenants.current_id()
+        with self._lock:
+            scope = self._scope(tenant_id, generation)
+            if key in scope.entries:
+                self.counters["hits"] += 1
+                return scope.entries[key]
+            self.counters["misses"] += 1
+        value = build()
+        with self._lock:
+            if generation == scope.generation and self._scopes.get(tenant_id) is scope:
+                scope.entries[key] = value
+                while len(scope.entries) > self.max_entries:
+                    del scope.entries[next(iter(scope.entries))]
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scopes.clear()
+
+    def stats(self) -> dict:
+        """Counters across every tenant, with the current tenant's entries and generation."""
+        with self._lock:
+            scope = self._scopes.get(tenants.current_id())
+            return dict(self.counters, entries=len(scope.entries) if scope else 0,
+                        generation=scope.generation if scope else None, tenants=len(self._scopes))
+
+cache = FragmentCache()
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+import tenants
+
+CACHE_DIR = 'invoices/cache'
+MAX_BYTES = int(os.environ.get('INVOICE_CACHE_MAX_MB', 200)) * 1024 * 1024
+
+class InvoiceCache:
+    """A content-addressed, size-capped cache of rendered invoice PDFs.
+
+    Each PDF is stored as `<YYYYMM>-<key>.pdf`, where the key hashes everything the PDF depends on:
+    the month's lesson rows, the user settings (with the invoice date printed on it), the template and CSS
+    file contents and the renderer.
+    Changing any of them produces a new key, so stale entries are never served. Entries are evicted
+    least-recently-used first (by file mtime, refreshed on every hit) once the directory exceeds
+    `max_bytes`, and `invalidate()` drops every entry for the given months after a sync.
+    A relative `directory` is kept per tenant, each capped at `max_bytes`.
+    """
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = MAX_BYTES):
+        self._directory = directory
+        self.max_bytes = max_bytes
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+        self._file_hashes: dict[str, tuple[float, str]] = {}
+
+    @property
+    def directory(self) -> str:
+        return tenants.resolve(self._directory)
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += amount
+
+    def _file_hash(self, path: str) -> str:
+        """Hashes a template or CSS file, re-reading it only when its mtime changes."""
+        mtime = os.path.getmtime(path)
+        cached = self._file_hashes.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'rb') as file:
+                cached = (mtime, hashlib.sha256(file.read()).hexdigest())
+            self._file_hashes[path] = cached
+        return cached[1]
+
+    def key(self, rows: list[tuple], settings: dict, template_files: list[str], renderer: str) -> str:
+        """Returns the content hash identifying one rendered invoice."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(rows, default=str).encode())
+        digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+        for path in template_files:
+            digest.update(self._file_hash(path).encode())
+        digest.update(renderer.encode())
+        return digest.hexdigest()[:32]
+
+    def _path(self, month: int, year: int, key: str) -> str:
+        return os.path.join(self.directory, f"{year:04}{month:02}-{key}.pdf")
+
+    def get(self, month: int, year: int, key: str) -> str | None:
+        """Returns the path of the cached PDF, or None on a miss."""
+        path = self._path(month, year, key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return path
+
+    def put(self, month: int, year: int, key: str, pdf: bytes) -> str:
+        """Stores a rendered PDF and evicts least-recently-used entries beyond the size cap."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(month, year, key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as out:
+            out.write(pdf)
+        os.replace(temp_path, path)
+        self._count("stores")
+        self._evict()
+        return path
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self._count("evictions")
+
+    def invalidate(self, months) -> int:
+        """Removes every cached invoice for the given 'YYYY-MM' months.
+
+        :return: the number of entries removed.
+        """
+        prefixes = tuple(f"{month.replace('-', '')}-" for month in months)
+        if not prefixes or not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(prefixes):
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        self._count("invalidations", removed)
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        entries = [entry.stat().st_size for entry in os.scandir(self.directory)
+                   if entry.name.endswith('.pdf')] if os.path.isdir(self.directory) else []
+        stats["entries"] = len(entries)
+        stats["bytes"] = sum(entries)
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+cache = InvoiceCache()
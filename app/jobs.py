@@ -0,0 +1,194 @@
+import datetime
+import itertools
+import threading
+import time
+import traceback
+from collections import deque
+import tenants
+
+MAX_FINISHED_JOBS = 50
+
+class Job:
+    """A unit of background work, with the state reported by the sync status endpoint."""
+    _ids = itertools.count(1)
+
+    def __init__(self, key: tuple, func, args: tuple, kwargs: dict):
+        self.id = next(Job._ids)
+        self.key = key
+        # Jobs run with the tenant (settings, credentials and database) of whoever submitted them
+        self.tenant = tenants.current()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.state = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = datetime.datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def set_progress(self, done: int, total: int) -> None:
+        self.progress = done / total if total else 1.0
+
+    def wait(self, timeout: float = None) -> bool:
+        """Blocks until the job finishes or `timeout` seconds pass; returns True if it finished."""
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> dict:
+        def iso(value):
+            return value.isoformat() if value else None
+        return {
+            "id": self.id,
+            "kind": self.key[0],
+            "args": list(self.key[1:]),
+            "state": self.state,
+            "progress": round(self.progress, 3),
+            "result": self.result,
+            "error": self.error,
+            "created_at": iso(self.created_at),
+            "started_at": iso(self.started_at),
+            "finished_at": iso(self.finished_at),
+        }
+
+class SyncScheduler:
+    """Runs calendar sync jobs one at a time on a background thread, so requests never wait on
+    the Google API and SQLite only ever sees a single sync writer.
+
+    Each job runs for the tenant that submitted it. Tenants have separate queues, served round-robin
+    one job at a time, so a tenant queueing a long backfill cannot starve the others. Submitting a job
+    whose key matches one the same tenant already has queued or running returns the existing job
+    instead of queueing a duplicate. If `refresh_interval` (seconds) is set, each (key, func) in
+    `refresh_jobs` is submitted, in order, for every tenant listed by `tenants_provider` (default: the
+    single tenant) that often.
+    """
+    def __init__(self, refresh_interval: float = None, refresh_jobs: list[tuple] = (), tenants_provider=None):
+        self.refresh_interval = refresh_interval
+        self.refresh_jobs = list(refresh_jobs)
+        self.tenants_provider = tenants_provider
+        # tenant id -> its queued jobs, and the order tenants with queued jobs are served in
+        self._queues: dict[str | None, deque[Job]] = {}
+        self._rotation: deque[str | None] = deque()
+        self._jobs: dict[int, Job] = {}
+        self._active: dict[tuple, Job] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = False
+        self._thread = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="sync-scheduler", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Lets queued jobs finish, then stops the worker thread."""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, key: tuple, func, *args, track_progress: bool = False, **kwargs) -> Job:
+        """Queues `func(*args, **kwargs)` under `key`, e.g. ("month", 2024, 5), for the current tenant.
+        With `track_progress`, `func` is also passed a `progress(done, total)` callback."""
+        tenant_id = tenants.current_id()
+        with self._lock:
+            existing = self._active.get((tenant_id, key))
+            if existing is not None:
+                return existing
+            job = Job(key, func, args, kwargs)
+            if track_progress:
+                job.kwargs["progress"] = job.set_progress
+            self._active[(tenant_id, key)] = job
+            self._jobs[job.id] = job
+            self._prune(tenant_id)
+            pending = self._queues.get(tenant_id)
+            if pending is None:
+                pending = self._queues[tenant_id] = deque()
+                self._rotation.append(tenant_id)
+            pending.append(job)
+            self._wakeup.notify()
+        return job
+
+    def get(self, job_id: int) -> Job | None:
+        """Returns the job if it belongs to the current tenant."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None and _tenant_id(job) == tenants.current_id() else None
+
+    def status(self) -> dict:
+        """The current tenant's queued, running and recently finished jobs."""
+        tenant_id = tenants.current_id()
+        with self._lock:
+            jobs = sorted((job for job in self._jobs.values() if _tenant_id(job) == tenant_id),
+                          key=lambda job: job.id, reverse=True)
+        return {
+            "running": any(job.state == "running" for job in jobs),
+            "queued": sum(job.state == "queued" for job in jobs),
+            "jobs": [job.to_dict() for job in jobs],
+        }
+
+    def _prune(self, tenant_id: str | None) -> None:
+        finished = [job_id for job_id, job in sorted(self._jobs.items())
+                    if job.state in ("done", "failed") and _tenant_id(job) == tenant_id]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _refresh(self) -> None:
+        for tenant in (self.tenants_provider() if self.tenants_provider else [tenants.current()]):
+            with tenants.use(tenant):
+                for key, func in self.refresh_jobs:
+                    self.submit(key, func)
+
+    def _next_job(self, deadline: float | None) -> Job | None:
+        """Waits for a queued job until `deadline` (a time.monotonic() value) and takes the next
+        tenant's oldest one; None when the deadline passes or the scheduler is stopping with nothing queued."""
+        with self._lock:
+            while not self._rotation:
+                if self._stopping:
+                    return None
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    return None
+                self._wakeup.wait(timeout)
+            tenant_id = self._rotation.popleft()
+            pending = self._queues[tenant_id]
+            job = pending.popleft()
+            if pending:
+                self._rotation.append(tenant_id)
+            else:
+                del self._queues[tenant_id]
+            return job
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.refresh_interval if self.refresh_interval else None
+        while True:
+            job = self._next_job(deadline)
+            if job is None:
+                if self._stopping:
+                    return
+                self._refresh()
+                deadline = time.monotonic() + self.refresh_interval
+                continue
+            job.state = "running"
+            job.started_at = datetime.datetime.now()
+            try:
+                with tenants.use(job.tenant):
+                    job.result = job.func(*job.args, **job.kwargs)
+                job.state = "done"
+                job.progress = 1.0
+            except Exception as error:
+                job.error = f"{type(error).__name__}: {error}"
+                job.state = "failed"
+                traceback.print_exc()
+            job.finished_at = datetime.datetime.now()
+            with self._lock:
+                self._active.pop((_tenant_id(job), job.key), None)
+            job._done.set()
+
+def _tenant_id(job: Job) -> str | None:
+    return job.tenant.id if job.tenant is not None else None
@@ -0,0 +1,177 @@
+import bisect
+import contextlib
+import functools
+import os
+import threading
+import time
+
+# Set METRICS_ENABLED=0 to turn every span, counter and the query tracer into no-ops
+ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+# Requests slower than this many seconds are logged with their stage timings; 0 disables the log
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 0))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+REGISTRY: list = []
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_text(names: tuple, values: tuple, le: str = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels."""
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, *label_values) -> None:
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        if not values and not self.labels:
+            values[()] = 0
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(self.labels, label_values)} {value:g}"
+
+class Histogram:
+    """Observations counted into cumulative buckets, Prometheus style, optionally split by labels."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # label values -> [bucket counts..., sum, count]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *label_values) -> None:
+        if not ENABLED:
+            return
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            # Values above the last bound only count towards +Inf, i.e. the total count
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(state) for key, state in self._values.items()}
+        for label_values, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield f"{self.name}_bucket{_label_text(self.labels, label_values, f'{bound:g}')} {cumulative}"
+            yield f"{self.name}_bucket{_label_text(self.labels, label_values, '+Inf')} {state[-1]}"
+            yield f"{self.name}_sum{_label_text(self.labels, label_values)} {state[-2]:.6f}"
+            yield f"{self.name}_count{_label_text(self.labels, label_values)} {state[-1]}"
+
+STAGE_SECONDS = Histogram('invoice_stage_duration_seconds', 'Time spent in each instrumented stage.', ('stage',))
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Flask request latency.', ('route', 'method', 'status'))
+REQUEST_QUERIES = Histogram('http_request_db_queries', 'SQLite statements run per request.', ('route',),
+                            buckets=COUNT_BUCKETS)
+DB_QUERIES = Counter('db_queries_total', 'SQLite statements run on pooled connections.')
+API_CALLS = Counter('calendar_api_calls_total', 'Google Calendar API requests, including retries.')
+API_RETRIES = Counter('calendar_api_retries_total', 'Google Calendar API requests retried after 429/5xx.')
+
+# Per-thread state of the request being served: statement count and stage timings for the slow log
+_local = threading.local()
+
+class _Span:
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(elapsed, self.stage)
+        stages = getattr(_local, 'stages', None)
+        if stages is not None:
+            stages.append((self.stage, elapsed))
+        return False
+
+_NOOP = contextlib.nullcontext()
+
+def span(stage: str):
+    """Context manager timing a block into the `stage` latency histogram (a shared no-op when disabled)."""
+    return _Span(stage) if ENABLED else _NOOP
+
+def timed(stage: str):
+    """Decorator timing every call of a function as `stage`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def trace_statement(statement: str) -> None:
+    """sqlite3 trace callback: counts top-level statements (trigger bodies are reported as comments)."""
+    if statement.startswith('--'):
+        return
+    DB_QUERIES.inc()
+    _local.queries = getattr(_local, 'queries', 0) + 1
+
+def init_app(app) -> None:
+    """Times every Flask request by route, counts its SQLite statements and logs slow requests."""
+    if not ENABLED:
+        return
+
+    @app.before_request
+    def start_request():
+        _local.queries = 0
+        _local.stages = [] if SLOW_REQUEST_SECONDS else None
+        _local.started = time.perf_counter()
+
+    @app.after_request
+    def finish_request(response):
+        from flask import request
+        started = getattr(_local, 'started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, route, request.method, response.status_code)
+        REQUEST_QUERIES.observe(_local.queries, route)
+        if SLOW_REQUEST_SECONDS and elapsed >= SLOW_REQUEST_SECONDS:
+            stages = ', '.join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in _local.stages or [])
+            app.logger.warning(f"Slow request: {request.method} {request.full_path.rstrip('?')} {response.status_code} "
+                               f"{elapsed * 1000:.1f}ms, {_local.queries} queries" + (f" ({stages})" if stages else ""))
+        _local.started = _local.stages = None
+        return response
+
+def render() -> str:
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
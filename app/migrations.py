@@ -0,0 +1,386 @@
+import datetime
+import sqlite3
+
+# Per-month (and per-student) lesson totals. student_id 0 collects lessons without a student.
+MONTHLY_SUMMARY_QUERY = '''
+    SELECT substr(date, 1, 7) AS month, IFNULL(student_id, 0) AS sid,
+           COUNT(*), SUM(duration), SUM(duration * hourly_rate)
+    FROM lessons
+    GROUP BY month, sid
+'''
+
+# Applies one lesson row as a delta to monthly_summary (sign +1 for NEW rows, -1 for OLD rows)
+_SUMMARY_ADD = '''
+        INSERT INTO monthly_summary (month, student_id, lesson_count, hours, earned)
+        VALUES (substr(NEW.date, 1, 7), IFNULL(NEW.student_id, 0), 1, NEW.duration, NEW.duration * NEW.hourly_rate)
+        ON CONFLICT(month, student_id) DO UPDATE SET
+            lesson_count = lesson_count + 1,
+            hours = hours + excluded.hours,
+            earned = earned + excluded.earned;
+'''
+_SUMMARY_REMOVE = '''
+        UPDATE monthly_summary
+        SET lesson_count = lesson_count - 1,
+            hours = hours - OLD.duration,
+            earned = earned - OLD.duration * OLD.hourly_rate
+        WHERE month = substr(OLD.date, 1, 7) AND student_id = IFNULL(OLD.student_id, 0);
+        DELETE FROM monthly_summary
+        WHERE month = substr(OLD.date, 1, 7) AND student_id = IFNULL(OLD.student_id, 0) AND lesson_count <= 0;
+'''
+
+# Per-month, per-weekday lesson totals for the analytics weekday rollup (weekday 0 is Monday)
+WEEKDAY_SUMMARY_QUERY = '''
+    SELECT substr(date, 1, 7) AS month, weekday,
+           COUNT(*), SUM(duration), SUM(duration * hourly_rate)
+    FROM lessons
+    GROUP BY month, weekday
+'''
+
+_WEEKDAY_SUMMARY_ADD = '''
+        INSERT INTO weekday_summary (month, weekday, lesson_count, hours, earned)
+        VALUES (substr(NEW.date, 1, 7), NEW.weekday, 1, NEW.duration, NEW.duration * NEW.hourly_rate)
+        ON CONFLICT(month, weekday) DO UPDATE SET
+            lesson_count = lesson_count + 1,
+            hours = hours + excluded.hours,
+            earned = earned + excluded.earned;
+'''
+_WEEKDAY_SUMMARY_REMOVE = '''
+        UPDATE weekday_summary
+        SET lesson_count = lesson_count - 1,
+            hours = hours - OLD.duration,
+            earned = earned - OLD.duration * OLD.hourly_rate
+        WHERE month = substr(OLD.date, 1, 7) AND weekday = OLD.weekday;
+        DELETE FROM weekday_summary
+        WHERE month = substr(OLD.date, 1, 7) AND weekday = OLD.weekday AND lesson_count <= 0;
+'''
+
+def _table_columns(c: sqlite3.Cursor, table: str) -> list[str]:
+    c.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in c.fetchall()]
+
+def _base_schema(c: sqlite3.Cursor) -> None:
+    """Brings a new database, or any pre-versioning layout, up to the lessons/students/subjects schema."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS lessons (
+            event_id TEXT PRIMARY KEY,
+            date TEXT NOT NULL,
+            weekday INTEGER NOT NULL,
+            student TEXT NOT NULL,
+            duration REAL NOT NULL,
+            hourly_rate REAL NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL
+        )
+    ''')
+    # Create students table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            level TEXT,
+            year TEXT,
+            exam_board TEXT,
+            target_grade TEXT,
+            subject TEXT,
+            active INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    # Add student_id FK and weekday column to lessons if missing
+    cols = _table_columns(c, "lessons")
+    if 'student_id' not in cols:
+        c.execute("ALTER TABLE lessons ADD COLUMN student_id INTEGER")
+    if 'weekday' not in cols:
+        c.execute("ALTER TABLE lessons ADD COLUMN weekday INTEGER")
+    # Add active column to students if missing and initialize active flags on first migration
+    if 'active' not in _table_columns(c, "students"):
+        c.execute("ALTER TABLE students ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
+        one_year_ago = datetime.date.today() - datetime.timedelta(days=365)
+        c.execute('''
+            UPDATE students
+            SET active = CASE
+                WHEN EXISTS (
+                    SELECT 1 FROM lessons
+                    WHERE lessons.student_id = students.id AND date >= ?
+                ) THEN 1
+                ELSE 0
+            END
+        ''', (one_year_ago.isoformat(),))
+
+    # Create subjects table and student_subjects link table
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS student_subjects (
+            student_id INTEGER NOT NULL REFERENCES students(id),
+            subject_id INTEGER NOT NULL REFERENCES subjects(id),
+            PRIMARY KEY (student_id, subject_id)
+        )
+    ''')
+    # Add subject_id column to lessons if missing
+    if 'subject_id' not in _table_columns(c, "lessons"):
+        c.execute("ALTER TABLE lessons ADD COLUMN subject_id INTEGER REFERENCES subjects(id)")
+
+def _sync_state(c: sqlite3.Cursor) -> None:
+    """Adds the sync_state table holding the Calendar sync token for incremental syncs."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            calendar_id TEXT PRIMARY KEY,
+            sync_token TEXT,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+
+def _monthly_summary(c: sqlite3.Cursor) -> None:
+    """Adds monthly_summary, kept in step with lessons by triggers in the writer's transaction."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_summary (
+            month TEXT NOT NULL,
+            student_id INTEGER NOT NULL,
+            lesson_count INTEGER NOT NULL,
+            hours REAL NOT NULL,
+            earned REAL NOT NULL,
+            PRIMARY KEY (month, student_id)
+        )
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS lessons_summary_insert AFTER INSERT ON lessons
+        BEGIN {_SUMMARY_ADD} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS lessons_summary_delete AFTER DELETE ON lessons
+        BEGIN {_SUMMARY_REMOVE} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS lessons_summary_update
+        AFTER UPDATE OF date, student_id, duration, hourly_rate ON lessons
+        BEGIN {_SUMMARY_REMOVE} {_SUMMARY_ADD} END
+    ''')
+    c.execute("DELETE FROM monthly_summary")
+    c.execute(f"INSERT INTO monthly_summary (month, student_id, lesson_count, hours, earned) {MONTHLY_SUMMARY_QUERY}")
+
+def _indexes(c: sqlite3.Cursor) -> None:
+    """Adds indexes for the date-range, per-student and student filter queries."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_lessons_date ON lessons(date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_lessons_student_date ON lessons(student_id, date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_students_filters ON students(active, year, level, exam_board)")
+
+def _hourly_rates(c: sqlite3.Cursor) -> None:
+    """Adds hourly_rates, holding per-student and per-subject overrides of the default hourly rate.
+    A NULL student_id or subject matches any student or subject."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS hourly_rates (
+            student_id INTEGER REFERENCES students(id),
+            subject TEXT,
+            hourly_rate REAL NOT NULL CHECK (hourly_rate > 0),
+            CHECK (student_id IS NOT NULL OR subject IS NOT NULL)
+        )
+    ''')
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_hourly_rates_key ON hourly_rates(IFNULL(student_id, 0), IFNULL(subject, ''))")
+
+# Tables whose changes bump the generation counter read by the HTTP and fragment caches
+GENERATION_TABLES = ('lessons', 'students', 'hourly_rates')
+
+def _generation(c: sqlite3.Cursor) -> None:
+    """Adds a single-row generation counter, bumped by triggers on every change to GENERATION_TABLES."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS generation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            value INTEGER NOT NULL
+        )
+    ''')
+    c.execute("INSERT OR IGNORE INTO generation (id, value) VALUES (1, 0)")
+    for table in GENERATION_TABLES:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            c.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_generation_{event.lower()} AFTER {event} ON {table}
+                BEGIN UPDATE generation SET value = value + 1 WHERE id = 1; END
+            ''')
+
+def _keyset_indexes(c: sqlite3.Cursor) -> None:
+    """Extends the lesson indexes with event_id so the API's (date, event_id) keyset pagination is an index
+    range scan; the old indexes are prefixes of the new ones and are dropped."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_lessons_date_event ON lessons(date, event_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_lessons_student_date_event ON lessons(student_id, date, event_id)")
+    c.execute("DROP INDEX IF EXISTS idx_lessons_date")
+    c.execute("DROP INDEX IF EXISTS idx_lessons_student_date")
+
+def _rebuild_table(c: sqlite3.Cursor, table: str, create_sql: str, columns: str, select_sql: str) -> None:
+    """Replaces `table` with the schema in `create_sql` (written for `{table}_new`), copying rows with
+    `select_sql` into `columns` and recreating the table's indexes and triggers afterwards.
+    SQLite cannot add constraints to an existing table, so this is its documented rebuild procedure."""
+    c.execute("SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+              (table,))
+    dependents = [row[0] for row in c.fetchall()]
+    c.execute(create_sql)
+    c.execute(f"INSERT INTO {table}_new ({columns}) {select_sql}")
+    c.execute(f"DROP TABLE {table}")
+    c.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    for sql in dependents:
+        c.execute(sql)
+
+def _cascade_deletes(c: sqlite3.Cursor) -> None:
+    """Rebuilds lessons, student_subjects and hourly_rates with ON DELETE CASCADE foreign keys to students,
+    so deleting a student removes their lessons, subjects and rate overrides in one statement.
+    References to students that no longer exist are cleared (lessons) or dropped (link rows)."""
+    _rebuild_table(c, 'lessons', '''
+        CREATE TABLE lessons_new (
+            event_id TEXT PRIMARY KEY,
+            date TEXT NOT NULL,
+            weekday INTEGER NOT NULL,
+            student TEXT NOT NULL,
+            duration REAL NOT NULL,
+            hourly_rate REAL NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            student_id INTEGER REFERENCES students(id) ON DELETE CASCADE,
+            subject_id INTEGER REFERENCES subjects(id)
+        )
+    ''', "event_id, date, weekday, student, duration, hourly_rate, start_time, end_time, student_id, subject_id", '''
+        SELECT event_id, date, IFNULL(weekday, (CAST(strftime('%w', date) AS INTEGER) + 6) % 7),
+               student, duration, hourly_rate, start_time, end_time,
+               CASE WHEN student_id IN (SELECT id FROM students) THEN student_id END, subject_id
+        FROM lessons
+    ''')
+    _rebuild_table(c, 'student_subjects', '''
+        CREATE TABLE student_subjects_new (
+            student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+            subject_id INTEGER NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+            PRIMARY KEY (student_id, subject_id)
+        )
+    ''', "student_id, subject_id", '''
+        SELECT student_id, subject_id FROM student_subjects
+        WHERE student_id IN (SELECT id FROM students) AND subject_id IN (SELECT id FROM subjects)
+    ''')
+    _rebuild_table(c, 'hourly_rates', '''
+        CREATE TABLE hourly_rates_new (
+            student_id INTEGER REFERENCES students(id) ON DELETE CASCADE,
+            subject TEXT,
+            hourly_rate REAL NOT NULL CHECK (hourly_rate > 0),
+            CHECK (student_id IS NOT NULL OR subject IS NOT NULL)
+        )
+    ''', "student_id, subject, hourly_rate", '''
+        SELECT student_id, subject, hourly_rate FROM hourly_rates
+        WHERE student_id IS NULL OR student_id IN (SELECT id FROM students)
+    ''')
+    # Lessons whose student reference was cleared now count under student 0
+    c.execute("DELETE FROM monthly_summary")
+    c.execute(f"INSERT INTO monthly_summary (month, student_id, lesson_count, hours, earned) {MONTHLY_SUMMARY_QUERY}")
+
+# Keeps students.last_lesson_date equal to the student's latest lesson date
+_LAST_LESSON_ADD = '''
+        UPDATE students SET last_lesson_date = NEW.date
+        WHERE id = NEW.student_id AND (last_lesson_date IS NULL OR last_lesson_date < NEW.date);
+'''
+_LAST_LESSON_REMOVE = '''
+        UPDATE students SET last_lesson_date = (SELECT MAX(date) FROM lessons WHERE student_id = OLD.student_id)
+        WHERE id = OLD.student_id AND last_lesson_date = OLD.date;
+'''
+
+def _last_lesson_date(c: sqlite3.Cursor) -> None:
+    """Adds students.last_lesson_date, kept current by triggers on lessons, and an index for the
+    active-flag recompute. Removing a student's latest lesson re-reads MAX(date) through
+    idx_lessons_student_date_event, so every trigger is an index lookup."""
+    if 'last_lesson_date' not in _table_columns(c, "students"):
+        c.execute("ALTER TABLE students ADD COLUMN last_lesson_date TEXT")
+    c.execute("UPDATE students SET last_lesson_date = (SELECT MAX(date) FROM lessons WHERE student_id = students.id)")
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS lessons_last_lesson_insert AFTER INSERT ON lessons
+        BEGIN {_LAST_LESSON_ADD} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS lessons_last_lesson_delete AFTER DELETE ON lessons
+        BEGIN {_LAST_LESSON_REMOVE} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS lessons_last_lesson_update AFTER UPDATE OF date, student_id ON lessons
+        BEGIN {_LAST_LESSON_REMOVE} {_LAST_LESSON_ADD} END
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_students_active_last_lesson ON students(active, last_lesson_date)")
+
+def _analytics(c: sqlite3.Cursor) -> None:
+    """Adds weekday_summary, trigger-maintained like monthly_summary, and a partial index over the
+    (usually few) lessons tagged with a subject, for the analytics rollups."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS weekday_summary (
+            month TEXT NOT NULL,
+            weekday INTEGER NOT NULL,
+            lesson_count INTEGER NOT NULL,
+            hours REAL NOT NULL,
+            earned REAL NOT NULL,
+            PRIMARY KEY (month, weekday)
+        )
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS lessons_weekday_summary_insert AFTER INSERT ON lessons
+        BEGIN {_WEEKDAY_SUMMARY_ADD} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS lessons_weekday_summary_delete AFTER DELETE ON lessons
+        BEGIN {_WEEKDAY_SUMMARY_REMOVE} END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS lessons_weekday_summary_update
+        AFTER UPDATE OF date, weekday, duration, hourly_rate ON lessons
+        BEGIN {_WEEKDAY_SUMMARY_REMOVE} {_WEEKDAY_SUMMARY_ADD} END
+    ''')
+    c.execute("DELETE FROM weekday_summary")
+    c.execute(f"INSERT INTO weekday_summary (month, weekday, lesson_count, hours, earned) {WEEKDAY_SUMMARY_QUERY}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_lessons_subject_date ON lessons(date, subject_id) "
+              "WHERE subject_id IS NOT NULL")
+
+def _auto_inactive(c: sqlite3.Cursor) -> None:
+    """Adds students.auto_inactive, set when the active-flag recompute marks a student past, so it only
+    ever brings back students it retired itself. Changing the flag any other way clears the marker, so a
+    student marked past by hand stays past. Students already past are treated as marked by hand."""
+    if 'auto_inactive' not in _table_columns(c, "students"):
+        c.execute("ALTER TABLE students ADD COLUMN auto_inactive INTEGER NOT NULL DEFAULT 0")
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS students_manual_active AFTER UPDATE OF active ON students
+        WHEN NEW.active IS NOT OLD.active AND OLD.auto_inactive = 1 AND NEW.auto_inactive = 1
+        BEGIN
+            UPDATE students SET auto_inactive = 0 WHERE id = NEW.id;
+        END
+    ''')
+
+# Schema migrations in order; PRAGMA user_version records how many have been applied.
+# Append new migrations to the end and never reorder or edit applied ones.
+MIGRATIONS = [
+    _base_schema,
+    _sync_state,
+    _monthly_summary,
+    _indexes,
+    _hourly_rates,
+    _generation,
+    _keyset_indexes,
+    _cascade_deletes,
+    _last_lesson_date,
+    _analytics,
+    _auto_inactive,
+]
+
+def migrate(db_file: str) -> int:
+    """Applies every pending migration to `db_file`, each in its own transaction.
+
+    :return: the schema version after migrating.
+    :rtype: int
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        c = conn.cursor()
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        for version, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            c.execute("BEGIN")
+            try:
+                migration(c)
+                c.execute(f"PRAGMA user_version = {version}")
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+        return version
+    finally:
+        conn.close()
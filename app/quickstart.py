@@ -1,17 +1,28 @@
 import datetime
+import json
 import os
+import random
+import shutil
 import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from operator import attrgetter
 import jinja2
-import pdfkit
-from settings import get_user_settings
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import db
+import metrics
+import tenants
+from renderers import Invoice, get_renderer, CSS_FILE, DEFAULT_RENDERER
+from invoice_cache import cache as invoice_cache
+from settings import load_settings
+from migrations import migrate, MONTHLY_SUMMARY_QUERY, WEEKDAY_SUMMARY_QUERY
 
 class Student:
     """Represents a student with profile data."""
+    __slots__ = ('id', 'name', 'level', 'year', 'exam_board', 'target_grade', 'subject', 'active')
+
     def __init__(self, id, name, level, year, exam_board, target_grade, subject, active):
         self.id = id
         self.name = name
@@ -31,13 +42,25 @@ class Student:
 SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
 CREDENTIALS_FILE = 'credentials.json'
 TOKEN_FILE = 'token.json'
-DB_FILE = 'lessons.db'
-HTML_TEMPLATE_FILE = 'invoices/html/invoice.html'
-CSS_FILE = 'static/css/invoice_styles.css'
-HEAD_TEMPLATE = 'templates/head.html'
-TAIL_TEMPLATE = 'templates/tail.html'
-NEW_TABLE_TEMPLATE = 'templates/new_table.html'
-USER_SETTINGS = get_user_settings()
+DATE_DISPLAY_FORMAT = '%d/%m/%Y'
+TEMPLATES_DIR = 'templates'
+INVOICE_TEMPLATE = 'invoice.html'
+# Every file the invoice template is built from, for invoice cache keys
+INVOICE_TEMPLATE_FILES = [os.path.join(TEMPLATES_DIR, name)
+                          for name in (INVOICE_TEMPLATE, 'head.html', 'new_table.html', 'tail.html')]
+# Calendar API paging, retry and backfill tuning
+PAGE_SIZE = 2500
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+RETRY_BACKOFF = 1.0
+BACKFILL_WORKERS = int(os.environ.get('BACKFILL_WORKERS', 8))
+BACKFILL_BATCH_SIZE = 1000
+# Students with no lesson in this many days are marked as past students by recompute_active()
+ACTIVE_WINDOW_DAYS = 365
+# Tenants whose Google credentials and Calendar clients (one per thread) are kept in memory
+MAX_OPEN_CLIENTS = int(os.environ.get('MAX_OPEN_CLIENTS', 16))
+# Shared, thread-safe Jinja environment; compiled templates are cached and reloaded if the files change
+INVOICE_ENV = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATES_DIR), trim_blocks=True)
 
 def get_student_name(control_str: str, event: dict) -> str:
     """Extracts the student name by stripping the control string from the event summary."""
@@ -61,156 +84,447 @@ def get_duration(event: dict) -> float:
     )
     return (end - start).total_seconds() / 3600
 
-# Initialize SQLite database and lessons table
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS lessons (
-            event_id TEXT PRIMARY KEY,
-            date TEXT NOT NULL,
-            weekday INTEGER NOT NULL,
-            student TEXT NOT NULL,
-            duration REAL NOT NULL,
-            hourly_rate REAL NOT NULL,
-            start_time TEXT NOT NULL,
-            end_time TEXT NOT NULL
-        )
-    ''')
-    # Create students table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS students (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            level TEXT,
-            year TEXT,
-            exam_board TEXT,
-            target_grade TEXT,
-            subject TEXT,
-            active INTEGER NOT NULL DEFAULT 1
-        )
-    ''')
-    # Add student_id FK to lessons if missing
-    c.execute("PRAGMA table_info(lessons)")
-    cols = [row[1] for row in c.fetchall()]
-    if 'student_id' not in cols:
-        c.execute("ALTER TABLE lessons ADD COLUMN student_id INTEGER")
-    # Add weekday column to lessons if missing
-    if 'weekday' not in cols:
-        c.execute("ALTER TABLE lessons ADD COLUMN weekday INTEGER")
-    # Ensure SQLite enforces FKs
-    c.execute("PRAGMA foreign_keys = ON")
-    # Add active column to students if missing and initialize active flags on first migration
-    c.execute("PRAGMA table_info(students)")
-    stu_cols = [row[1] for row in c.fetchall()]
-    if 'active' not in stu_cols:
-        c.execute("ALTER TABLE students ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
-        # On first migration only: initialize active flags
-        one_year_ago = datetime.date.today() - datetime.timedelta(days=365)
-        c.execute('''
-            UPDATE students
-            SET active = CASE
-                WHEN EXISTS (
-                    SELECT 1 FROM lessons
-                    WHERE lessons.student_id = students.id AND date >= ?
-                ) THEN 1
-                ELSE 0
-            END
-        ''', (one_year_ago.isoformat(),))
-
-    # Create subjects table and student_subjects link table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS subjects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS student_subjects (
-            student_id INTEGER NOT NULL REFERENCES students(id),
-            subject_id INTEGER NOT NULL REFERENCES subjects(id),
-            PRIMARY KEY (student_id, subject_id)
-        )
-    ''')
-    # Add subject_id column to lessons if missing
-    c.execute("PRAGMA table_info(lessons)")
-    lesson_cols = [row[1] for row in c.fetchall()]
-    if 'subject_id' not in lesson_cols:
-        c.execute("ALTER TABLE lessons ADD COLUMN subject_id INTEGER REFERENCES subjects(id)")
-
-    conn.commit()
-    conn.close()
-
-def get_google_credentials():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, "w") as token:
+# Initialize or upgrade the SQLite database; run once at process start
+def init_db() -> int:
+    return migrate(tenants.resolve(db.DB_FILE))
+
+def rebuild_monthly_summary() -> int:
+    """Recomputes monthly_summary (and the analytics weekday_summary) from scratch out of the lessons table.
+
+    :return: the number of summary rows written.
+    """
+    with db.connection() as conn:
+        conn.execute("DELETE FROM monthly_summary")
+        written = conn.execute(
+            f"INSERT INTO monthly_summary (month, student_id, lesson_count, hours, earned) {MONTHLY_SUMMARY_QUERY}"
+        ).rowcount
+        conn.execute("DELETE FROM weekday_summary")
+        written += conn.execute(
+            f"INSERT INTO weekday_summary (month, weekday, lesson_count, hours, earned) {WEEKDAY_SUMMARY_QUERY}"
+        ).rowcount
+    return written
+
+def check_monthly_summary(tolerance: float = 1e-6) -> list[tuple]:
+    """Compares monthly_summary against totals recomputed from the lessons table.
+
+    :return: a list of (month, student_id, stored, expected) for every row that differs;
+        empty if the summary is consistent.
+    """
+    with db.connection() as conn:
+        expected = {(month, sid): values for month, sid, *values in conn.execute(MONTHLY_SUMMARY_QUERY)}
+        stored = {(month, sid): values for month, sid, *values in conn.execute(
+            "SELECT month, student_id, lesson_count, hours, earned FROM monthly_summary")}
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys()):
+        have, want = stored.get(key), expected.get(key)
+        if have is None or want is None or have[0] != want[0] or \
+                any(abs(a - b) > tolerance for a, b in zip(have[1:], want[1:])):
+            mismatches.append((*key, have, want))
+    return mismatches
+
+def recompute_active(today: datetime.date = None, window_days: int = ACTIVE_WINDOW_DAYS) -> dict:
+    """Marks students as past if they had no lesson within `window_days` of `today`, using the
+    trigger-maintained last_lesson_date, and brings back those it marked past once they have a lesson
+    in the window again. Students marked past by hand are never reactivated. Each direction is one
+    statement over idx_students_active_last_lesson, touching only the students whose flag actually changes.
+
+    :return: a report of the rows deactivated, reactivated and changed, the cutoff date and the seconds taken.
+    """
+    started = time.perf_counter()
+    cutoff = ((today or datetime.date.today()) - datetime.timedelta(days=window_days)).isoformat()
+    with db.connection() as conn:
+        deactivated = conn.execute('''
+            UPDATE students SET active = 0, auto_inactive = 1
+            WHERE active = 1 AND (last_lesson_date < ? OR last_lesson_date IS NULL)
+        ''', (cutoff,)).rowcount
+        reactivated = conn.execute('''
+            UPDATE students SET active = 1, auto_inactive = 0
+            WHERE active = 0 AND last_lesson_date >= ? AND auto_inactive = 1
+        ''', (cutoff,)).rowcount
+    return {
+        "deactivated": deactivated,
+        "reactivated": reactivated,
+        "changed": deactivated + reactivated,
+        "cutoff": cutoff,
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+
+# The Google client libraries take a few hundred milliseconds to import, so they are only loaded
+# once a sync actually needs them; the dashboard, the API and most CLI commands never do.
+# token file -> credentials, least recently used first
+_credentials: OrderedDict = OrderedDict()
+_credentials_lock = threading.Lock()
+# token file -> lock guarding reads and writes of that file; never held across a network call
+_token_locks: dict[str, threading.Lock] = {}
+_discovery_document = None
+_clients = threading.local()
+
+def _http_error() -> type[Exception]:
+    """googleapiclient's HttpError, for `except` clauses (only evaluated once an exception is raised)."""
+    from googleapiclient.errors import HttpError
+    return HttpError
+
+def _remember(cache: OrderedDict, key, value) -> None:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > MAX_OPEN_CLIENTS:
+        cache.popitem(last=False)
+
+class AuthorisationRequired(RuntimeError):
+    """The tenant has no usable Google token, and the browser sign-in may not run here."""
+
+def _token_lock(token_file: str) -> threading.Lock:
+    with _credentials_lock:
+        return _token_locks.setdefault(token_file, threading.Lock())
+
+def get_google_credentials(interactive: bool = None):
+    """Returns the current tenant's OAuth credentials, loaded once per process and refreshed when they expire.
+
+    Without a usable token the browser sign-in runs only if `interactive` (default: on the main thread, i.e.
+    from the CLI); elsewhere, such as in a sync job, AuthorisationRequired is raised instead. No lock is held
+    while refreshing or signing in, so one tenant's slow token endpoint never stalls the others.
+    """
+    token_file = tenants.resolve(TOKEN_FILE)
+    with _credentials_lock:
+        creds = _credentials.get(token_file)
+    if creds is None:
+        with _token_lock(token_file):
+            if os.path.exists(token_file):
+                from google.oauth2.credentials import Credentials
+                creds = Credentials.from_authorized_user_file(token_file, SCOPES)
+    if creds is not None and creds.valid:
+        with _credentials_lock:
+            _remember(_credentials, token_file, creds)
+        return creds
+
+    if creds is not None and creds.expired and creds.refresh_token:
+        # Refresh a private copy, so other threads keep using the cached token until the new one is stored
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        creds = Credentials.from_authorized_user_info(json.loads(creds.to_json()), SCOPES)
+        creds.refresh(Request())
+    else:
+        if interactive is None:
+            interactive = threading.current_thread() is threading.main_thread()
+        if not interactive:
+            raise AuthorisationRequired(f"No valid Google token in {token_file}; run `flask authorise` to sign in")
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        flow = InstalledAppFlow.from_client_secrets_file(tenants.resolve(CREDENTIALS_FILE), SCOPES)
+        creds = flow.run_local_server(port=0)
+    with _token_lock(token_file):
+        with open(token_file, "w") as token:
             token.write(creds.to_json())
+    with _credentials_lock:
+        _remember(_credentials, token_file, creds)
     return creds
 
+def calendar_discovery_document() -> dict:
+    """The Calendar v3 discovery document bundled with google-api-python-client, parsed once,
+    so building a client never fetches or re-reads it."""
+    global _discovery_document
+    if _discovery_document is None:
+        from googleapiclient.discovery_cache import get_static_doc
+        document = get_static_doc("calendar", "v3")
+        if document is None:
+            raise RuntimeError("google-api-python-client has no bundled Calendar v3 discovery document")
+        _discovery_document = json.loads(document)
+    return _discovery_document
+
+def get_calendar_service(creds=None):
+    """Returns an authorised Google Calendar API client for the current tenant, built once per thread
+    (httplib2 is not thread-safe) and reused by every later sync on that thread."""
+    if creds is None:
+        creds = get_google_credentials()
+    clients = getattr(_clients, 'calendar', None)
+    if clients is None:
+        clients = _clients.calendar = OrderedDict()
+    token_file = tenants.resolve(TOKEN_FILE)
+    cached = clients.get(token_file)
+    if cached is None or cached[0] is not creds:
+        from googleapiclient.discovery import build_from_document
+        cached = (creds, build_from_document(calendar_discovery_document(), credentials=creds))
+    _remember(clients, token_file, cached)
+    return cached[1]
+
+def execute_with_retry(request, retries: int = MAX_RETRIES, backoff: float = RETRY_BACKOFF) -> dict:
+    """Executes an API request, retrying rate-limit (429) and server (5xx) errors
+    with exponential backoff and jitter."""
+    for attempt in range(retries + 1):
+        metrics.API_CALLS.inc()
+        try:
+            return request.execute()
+        except _http_error() as error:
+            if error.resp.status not in RETRY_STATUSES or attempt == retries:
+                raise
+            metrics.API_RETRIES.inc()
+            time.sleep(backoff * 2 ** attempt + random.uniform(0, backoff))
+
+def list_events(service, **params):
+    """Yields each response page of `events().list()`, following `nextPageToken` to the end."""
+    params.setdefault("maxResults", PAGE_SIZE)
+    while True:
+        response = execute_with_retry(service.events().list(**params))
+        yield response
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return
+        params["pageToken"] = page_token
+
+class RateTable:
+    """In-memory lookup of the hourly_rates overrides, loaded once per sync batch.
+    The most specific match wins: student and subject, then student, then subject, then the default."""
+    __slots__ = ('default', 'rates')
+
+    def __init__(self, c: sqlite3.Cursor, default: float):
+        self.default = default
+        c.execute("SELECT IFNULL(student_id, 0), IFNULL(subject, ''), hourly_rate FROM hourly_rates")
+        self.rates = {(student_id, subject): rate for student_id, subject, rate in c.fetchall()}
+
+    def rate(self, student_id: int, subject: str | None) -> float:
+        if not self.rates:
+            return self.default
+        subject = subject or ''
+        for key in ((student_id, subject), (student_id, ''), (0, subject)):
+            if key[0] or key[1]:
+                rate = self.rates.get(key)
+                if rate is not None:
+                    return rate
+        return self.default
+
+def set_hourly_rate(rate: float | None, student: str = None, subject: str = None) -> None:
+    """Sets (or with rate=None, removes) the hourly rate override for a student, a subject or both.
+    Applies to lessons stored from the next sync onwards."""
+    if student is None and subject is None:
+        raise ValueError("An override needs a student, a subject or both")
+    with db.connection() as conn:
+        student_id = None
+        if student is not None:
+            row = conn.execute("SELECT id FROM students WHERE name = ?", (student,)).fetchone()
+            if row is None:
+                raise ValueError(f"Unknown student '{student}'")
+            student_id = row[0]
+        conn.execute("DELETE FROM hourly_rates WHERE IFNULL(student_id, 0) = ? AND IFNULL(subject, '') = ?",
+                     (student_id or 0, subject or ''))
+        if rate is not None:
+            conn.execute("INSERT INTO hourly_rates (student_id, subject, hourly_rate) VALUES (?, ?, ?)",
+                         (student_id, subject, rate))
+
+def lesson_months(c: sqlite3.Cursor, event_ids) -> set[str]:
+    """Returns the 'YYYY-MM' months currently holding the given lessons."""
+    event_ids = list(event_ids)
+    months = set()
+    for i in range(0, len(event_ids), 500):
+        chunk = event_ids[i:i + 500]
+        c.execute(f"SELECT DISTINCT substr(date, 1, 7) FROM lessons WHERE event_id IN ({','.join('?' * len(chunk))})",
+                  chunk)
+        months.update(row[0] for row in c.fetchall())
+    return months
+
+def store_events(c: sqlite3.Cursor, events: list[dict]) -> set[str]:
+    """Upserts the lessons (and any new students) for the given events as one batch.
+    Runs inside the caller's transaction; the caller commits.
+
+    :return: the 'YYYY-MM' months whose lessons changed (including months lessons moved out of).
+    """
+    settings = load_settings()
+    control_str = settings.control_str
+    rows = []
+    for event in events:
+        date_obj = get_lesson_date(event)
+        rows.append((
+            event["id"],
+            date_obj.strftime("%Y-%m-%d"),
+            date_obj.weekday(),
+            get_student_name(control_str, event),
+            get_duration(event),
+            event["start"].get("dateTime", event["start"].get("date")),
+            event["end"].get("dateTime", event["end"].get("date")),
+        ))
+    if not rows:
+        return set()
+    months = lesson_months(c, (row[0] for row in rows)) | {row[1][:7] for row in rows}
+
+    # Resolve every student name in one pass, inserting the missing ones together
+    c.execute("SELECT name, id, subject FROM students")
+    students = {name: (student_id, subject) for name, student_id, subject in c.fetchall()}
+    missing = {row[3] for row in rows} - students.keys()
+    if missing:
+        c.executemany("INSERT INTO students (name) VALUES (?)", [(name,) for name in sorted(missing)])
+        c.execute("SELECT name, id, subject FROM students")
+        students = {name: (student_id, subject) for name, student_id, subject in c.fetchall()}
+    rates = RateTable(c, settings.hourly_rate)
+
+    params = []
+    for event_id, date_str, weekday, name, duration, start_time, end_time in rows:
+        student_id, subject = students[name]
+        params.append((event_id, date_str, weekday, name, duration, rates.rate(student_id, subject),
+                       start_time, end_time, student_id))
+
+    c.executemany('''
+        INSERT INTO lessons (
+            event_id, date, weekday, student, duration, hourly_rate, start_time, end_time, student_id
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(event_id) DO UPDATE SET
+            date = excluded.date,
+            weekday = excluded.weekday,
+            student = excluded.student,
+            duration = excluded.duration,
+            hourly_rate = excluded.hourly_rate,
+            start_time = excluded.start_time,
+            end_time = excluded.end_time,
+            student_id = excluded.student_id
+    ''', params)
+    return months
+
 # Sync Google Calendar events into the SQLite database
+@metrics.timed("sync_calendar")
 def sync_calendar(month: int, year: int) -> None:
-    init_db()
-    creds = get_google_credentials()
     try:
-        service = build("calendar", "v3", credentials=creds)
+        service = get_calendar_service()
         time_min = datetime.datetime(year, month, 1).isoformat() + "Z"
         next_month = month + 1 if month < 12 else 1
         next_year = year + 1 if month == 12 else year
         time_max = datetime.datetime(next_year, next_month, 1).isoformat() + "Z"
 
-        events_result = service.events().list(
-            calendarId="primary", timeMin=time_min, timeMax=time_max,
-            maxResults=1000, singleEvents=True, orderBy="startTime"
-        ).execute()
-        events = events_result.get("items", [])
+        events = []
+        for page in list_events(service, calendarId="primary", timeMin=time_min, timeMax=time_max,
+                                singleEvents=True, orderBy="startTime"):
+            events.extend(page.get("items", []))
 
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        for event in events:
-            event_id = event["id"]
-            date_obj = datetime.datetime.fromisoformat(
-                event["start"].get("dateTime", event["start"].get("date"))
-            ).date()
-            date_str = date_obj.strftime("%Y-%m-%d")
-            weekday = date_obj.weekday()
-            student = get_student_name(USER_SETTINGS["control_str"], event)
-            # Lookup or insert student
-            c.execute("SELECT id FROM students WHERE name = ?", (student,))
-            row = c.fetchone()
-            if row:
-                student_id = row[0]
-            else:
-                c.execute("INSERT INTO students (name) VALUES (?)", (student,))
-                student_id = c.lastrowid
-            duration = get_duration(event)
-            hourly_rate = float(USER_SETTINGS["hourly_rate"])
-            start_str = event["start"].get("dateTime", event["start"].get("date"))
-            end_str = event["end"].get("dateTime", event["end"].get("date"))
-            c.execute('''
-                INSERT OR REPLACE INTO lessons (
-                    event_id, date, weekday, student, duration, hourly_rate, start_time, end_time, student_id
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (event_id, date_str, weekday, student, duration, hourly_rate, start_str, end_str, student_id))
-        conn.commit()
-        conn.close()
-    except HttpError as error:
+        with db.connection() as conn:
+            months = store_events(conn.cursor(), events)
+        invoice_cache.invalidate(months)
+    except _http_error() as error:
         print(f"An error occurred: {error}")
 
+def _pull_changes(service, calendar_id: str, sync_token: str | None):
+    """Lists every page of events changed since `sync_token` (or all events if None).
+
+    :return: (changed events, cancelled event ids, next sync token)
+    """
+    params = {"calendarId": calendar_id, "singleEvents": True}
+    if sync_token:
+        params["syncToken"] = sync_token
+    changed, cancelled = [], []
+    for page in list_events(service, **params):
+        for event in page.get("items", []):
+            if event.get("status") == "cancelled":
+                cancelled.append(event["id"])
+            else:
+                changed.append(event)
+    return changed, cancelled, page.get("nextSyncToken")
+
+@metrics.timed("sync_incremental")
+def sync_incremental(service=None, calendar_id: str = "primary") -> tuple[int, int]:
+    """Syncs only the events changed since the last sync, using the stored Calendar sync token.
+    The first run (or a run after Google expires the token) performs one full pull.
+
+    :return: a tuple of (lessons inserted or updated, lessons deleted).
+    """
+    if service is None:
+        service = get_calendar_service()
+    with db.connection() as conn:
+        row = conn.execute("SELECT sync_token FROM sync_state WHERE calendar_id = ?", (calendar_id,)).fetchone()
+    sync_token = row[0] if row else None
+    try:
+        changed, cancelled, next_token = _pull_changes(service, calendar_id, sync_token)
+    except _http_error() as error:
+        # 410 Gone: the sync token is no longer valid and a full pull is required
+        if sync_token is None or error.resp.status != 410:
+            raise
+        sync_token = None
+        changed, cancelled, next_token = _pull_changes(service, calendar_id, None)
+
+    with db.connection() as conn:
+        c = conn.cursor()
+        months = store_events(c, changed)
+        if sync_token is None:
+            # A full pull is authoritative: drop lessons whose events no longer exist
+            c.execute("SELECT event_id FROM lessons")
+            cancelled = {row[0] for row in c.fetchall()} - {event["id"] for event in changed}
+        months |= lesson_months(c, cancelled)
+        c.executemany("DELETE FROM lessons WHERE event_id = ?", [(event_id,) for event_id in cancelled])
+        deleted = c.rowcount
+        c.execute('''
+            INSERT INTO sync_state (calendar_id, sync_token, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(calendar_id) DO UPDATE SET sync_token = excluded.sync_token, updated_at = excluded.updated_at
+        ''', (calendar_id, next_token, datetime.datetime.now().isoformat()))
+    invoice_cache.invalidate(months)
+    return len(changed), deleted
+
+def month_windows(start_month: int, start_year: int, end_month: int, end_year: int,
+                  months_per_window: int = 1) -> list[tuple[str, str]]:
+    """Splits the months from start through end (inclusive) into (timeMin, timeMax) windows
+    of `months_per_window` months each, e.g. 1 for monthly or 3 for quarterly windows."""
+    windows = []
+    index, last = start_year * 12 + start_month - 1, end_year * 12 + end_month - 1
+    while index <= last:
+        stop = min(index + months_per_window, last + 1)
+        time_min = datetime.datetime(index // 12, index % 12 + 1, 1)
+        time_max = datetime.datetime(stop // 12, stop % 12 + 1, 1)
+        windows.append((time_min.isoformat() + "Z", time_max.isoformat() + "Z"))
+        index = stop
+    return windows
+
+def backfill(windows: list[tuple[str, str]],
+             workers: int = BACKFILL_WORKERS,
+             service_factory=None,
+             batch_size: int = BACKFILL_BATCH_SIZE,
+             progress=None) -> int:
+    """Fetches every page of events for each (timeMin, timeMax) window in parallel on a bounded
+    thread pool, while the calling thread acts as the single SQLite writer committing in batches.
+    If given, `progress(done, total)` is called as each window completes.
+
+    :return: the number of events stored.
+    """
+    if service_factory is None:
+        # Authorise once up front; each worker then builds its own client (httplib2 is not thread-safe)
+        creds = get_google_credentials()
+        service_factory = lambda: get_calendar_service(creds)
+    local = threading.local()
+
+    def fetch_window(window: tuple[str, str]) -> list[dict]:
+        if not hasattr(local, "service"):
+            local.service = service_factory()
+        time_min, time_max = window
+        events = []
+        for page in list_events(local.service, calendarId="primary", timeMin=time_min, timeMax=time_max,
+                                singleEvents=True, orderBy="startTime"):
+            events.extend(page.get("items", []))
+        return events
+
+    def write(events: list[dict]) -> None:
+        with db.connection() as conn:
+            months = store_events(conn.cursor(), events)
+        invoice_cache.invalidate(months)
+
+    stored = 0
+    pending: list[dict] = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(fetch_window, window) for window in windows]
+        for done, future in enumerate(as_completed(futures), start=1):
+            pending.extend(future.result())
+            if progress is not None:
+                progress(done, len(futures))
+            if len(pending) >= batch_size:
+                write(pending)
+                stored += len(pending)
+                pending = []
+    write(pending)
+    return stored + len(pending)
+
 def sync_history(end_month: int = None,
                  end_year: int = None,
                  start_month: int = None,
                  start_year: int = None,
-                 years_back: int = 5) -> None:
+                 years_back: int = 5,
+                 months_per_window: int = 1,
+                 workers: int = BACKFILL_WORKERS,
+                 progress=None) -> int:
     """Syncs Google Calendar events from a past start date up through an end date.
-    By default, syncs the last `years_back` years ending at the given month/year (or today)."""
+    By default, syncs the last `years_back` years ending at the given month/year (or today),
+    fetching month windows concurrently on up to `workers` threads."""
     # Determine end date
     if end_month is None or end_year is None:
         now = datetime.datetime.now()
@@ -221,69 +535,86 @@ def sync_history(end_month: int = None,
         start_year = end_year - years_back
         start_month = end_month
 
-    cur_year, cur_month = start_year, start_month
-    # Loop month-by-month until end date inclusive
-    while (cur_year < end_year) or (cur_year == end_year and cur_month <= end_month):
-        sync_calendar(cur_month, cur_year)
-        # advance one month
-        if cur_month == 12:
-            cur_month = 1
-            cur_year += 1
-        else:
-            cur_month += 1
+    windows = month_windows(start_month, start_year, end_month, end_year, months_per_window)
+    return backfill(windows, workers=workers, progress=progress)
 
 # Fetch lessons from the database for a given month/year
 def fetch_lessons(month: int, year: int):
-    init_db()
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
     start_date = datetime.date(year, month, 1)
     if month == 12:
         end_date = datetime.date(year + 1, 1, 1)
     else:
         end_date = datetime.date(year, month + 1, 1)
-    c.execute('''
-        SELECT l.date, l.weekday,
-               s.id, s.name, s.level, s.year, s.exam_board, s.target_grade, s.subject, s.active,
-               l.duration, l.hourly_rate, l.start_time, l.end_time, l.subject_id
-        FROM lessons l
-        JOIN students s ON l.student_id = s.id
-        WHERE l.date >= ? AND l.date < ?
-        ORDER BY l.date
-    ''', (start_date.isoformat(), end_date.isoformat()))
-    rows = c.fetchall()
-    conn.close()
+    return fetch_lessons_between(start_date, end_date)
+
+@metrics.timed("fetch_lessons")
+def fetch_lessons_between(start_date: datetime.date, end_date: datetime.date) -> list["Lesson"]:
+    """Fetches lessons dated from `start_date` up to (not including) `end_date` in one query."""
+    with db.connection() as conn:
+        rows = conn.execute('''
+            SELECT l.date, l.weekday,
+                   s.id, s.name, s.level, s.year, s.exam_board, s.target_grade, s.subject, s.active,
+                   l.duration, l.hourly_rate, l.start_time, l.end_time, l.subject_id
+            FROM lessons l
+            JOIN students s ON l.student_id = s.id
+            WHERE l.date >= ? AND l.date < ?
+            ORDER BY l.date
+        ''', (start_date.isoformat(), end_date.isoformat())).fetchall()
 
+    # Identity map: every lesson of the same student shares one Student instance
+    students: dict[int, Student] = {}
     lessons = []
     for (date_str, weekday,
          stu_id, name, level, student_year, exam_board, target_grade, subject, active,
          duration, hourly_rate, start_time, end_time, subject_id) in rows:
-        student = Student.from_db((stu_id, name, level, student_year, exam_board, target_grade, subject, active))
-        lesson = Lesson.from_db(date_str, weekday, student, duration, hourly_rate, start_time, end_time, subject_id)
-        lessons.append(lesson)
+        student = students.get(stu_id)
+        if student is None:
+            student = students[stu_id] = Student(stu_id, name, level, student_year, exam_board,
+                                                  target_grade, subject, active)
+        lessons.append(Lesson.from_db(date_str, weekday, student, duration, hourly_rate,
+                                      start_time, end_time, subject_id))
     return lessons
 
+def monthly_earnings(years: list[int] | None = None) -> dict[int, list[float]]:
+    """Returns total earnings for each month, keyed by year, from the monthly_summary table.
+    Every year in `years` is present (zero-filled); if None, every year with lessons is returned."""
+    with db.connection() as conn:
+        rows = conn.execute("SELECT month, SUM(earned) FROM monthly_summary GROUP BY month").fetchall()
+
+    earnings = {year: [0.0] * 12 for year in years or []}
+    for month_str, total in rows:
+        year, month = int(month_str[:4]), int(month_str[5:7])
+        if years is None or year in earnings:
+            earnings.setdefault(year, [0.0] * 12)[month - 1] = total
+    return dict(sorted(earnings.items()))
+
 # Type aliases
 type Date = datetime.date
 type LessonList = list["Lesson"]
 
 class Lesson:
-    """Class containing information relating to a lesson."""
+    """Class containing information relating to a lesson. `earned` is always a float;
+    currency formatting happens when the invoice is rendered."""
+    __slots__ = ('date', 'weekday', 'student', 'duration', 'hourly_rate', 'earned',
+                 'start_time', 'end_time', 'subject_id')
+
     def __init__(self, event) -> None:
-        self.date = get_lesson_date(event).strftime('%d/%m/%Y')
-        self.weekday = get_lesson_date(event).weekday()
-        self.student = get_student_name(USER_SETTINGS["control_str"], event)
+        self.date = get_lesson_date(event)
+        self.weekday = self.date.weekday()
+        settings = load_settings()
+        self.student = get_student_name(settings.control_str, event)
         self.duration = get_duration(event)
-        self.hourly_rate = float(USER_SETTINGS["hourly_rate"])
+        self.hourly_rate = settings.hourly_rate
         self.earned = self.duration * self.hourly_rate
         # record actual start/end timestamps
         self.start_time = event["start"].get("dateTime", event["start"].get("date"))
         self.end_time   = event["end"].get("dateTime", event["end"].get("date"))
+        self.subject_id = None
 
     @classmethod
     def from_db(cls, date_str, weekday, student: Student, duration, hourly_rate, start_time, end_time, subject_id):
         obj = cls.__new__(cls)
-        obj.date = datetime.datetime.strptime(date_str, '%Y-%m-%d').strftime('%d/%m/%Y')
+        obj.date = datetime.date.fromisoformat(date_str)
         obj.weekday = weekday
         obj.student = student  # now a Student object
         obj.duration = duration
@@ -295,91 +626,246 @@ class Lesson:
         return obj
 
     def __repr__(self) -> str:
-        return f'{self.date}: {self.student.name}, {self.earned:.2f} ({self.duration}h @ {self.hourly_rate}/hr)'
-
-    def add_currency_symbol(self, currency: str = '&pound') -> None:
-        self.earned = f"{currency}{self.earned:.2f}"
-
-def sorting_logic(lesson: Lesson):
-    return datetime.datetime.strptime(lesson.date, '%d/%m/%Y').date()
-
-def group_lessons(month: int, year: int) -> tuple[list[LessonList], list[float]]:
-    """Returns lessons grouped by week and total earnings per week."""
-    # Sync latest events then fetch from DB
-    sync_calendar(month, year)
-    lessons_info = fetch_lessons(month, year)
-
-    lessons_info.sort(key=sorting_logic)
-    month_lessons: list[LessonList] = []
-    week: LessonList = []
-
-    for i, lesson in enumerate(lessons_info):
-        week.append(lesson)
-        next_day_jump = (
-            i == len(lessons_info) - 1 or
-            lesson.weekday > lessons_info[i + 1].weekday or
-            (int(lessons_info[i + 1].date.split('/')[0]) >= int(lesson.date.split('/')[0]) + 7)
-        )
-        if next_day_jump:
-            month_lessons.append(week)
-            week = []
-
-    weekly_totals = [sum(l.duration * l.hourly_rate for l in w) for w in month_lessons]
-    for week in month_lessons:
-        for lesson in week:
-            lesson.add_currency_symbol()
+        return f'{self.date:{DATE_DISPLAY_FORMAT}}: {self.student.name}, {self.earned:.2f} ({self.duration}h @ {self.hourly_rate}/hr)'
+
+def week_key(lesson: Lesson) -> int:
+    """Monday-based week number: day ordinal 1 (0001-01-01) was a Monday, so this groups by ISO week."""
+    return (lesson.date.toordinal() - 1) // 7
+
+# Grouping keys for group_by()
+GROUP_KEYS = {
+    'week': week_key,
+    'month': lambda lesson: (lesson.date.year, lesson.date.month),
+    'student': lambda lesson: lesson.student.id,
+    'subject': lambda lesson: lesson.subject_id,
+}
+
+def group_by(lessons: LessonList, by: str = 'week') -> list[LessonList]:
+    """Groups lessons by week, month, student or subject in one linear pass.
+    Groups keep the order in which they first appear, so date-ordered input gives date-ordered groups."""
+    key = GROUP_KEYS[by]
+    groups: dict = {}
+    for lesson in lessons:
+        k = key(lesson)
+        group = groups.get(k)
+        if group is None:
+            groups[k] = [lesson]
+        else:
+            group.append(lesson)
+    return list(groups.values())
+
+@metrics.timed("group_lessons")
+def group_lessons(month: int, year: int, sync: bool = False) -> tuple[list[LessonList], list[float]]:
+    """Returns lessons grouped by week and total earnings per week.
+    Reads from the local DB, syncing the month from the calendar first only if `sync` is set."""
+    if sync:
+        sync_calendar(month, year)
+    return group_by_week(fetch_lessons(month, year))
+
+def group_by_week(lessons_info: LessonList) -> tuple[list[LessonList], list[float]]:
+    """Groups lessons into ISO (Monday to Sunday) weeks and totals the earnings per week."""
+    lessons_info.sort(key=attrgetter('date'))
+    month_lessons = group_by(lessons_info, 'week')
+    weekly_totals = [sum(l.earned for l in w) for w in month_lessons]
     return month_lessons, weekly_totals
 
-def create_html(month_lessons: list[LessonList], weekly_totals: list[float]) -> None:
-    """Creates an HTML invoice using pre-set templates."""
-    hourly_rate = int(USER_SETTINGS["hourly_rate"])
-    TEMP_HTML_OUTPUT = f"invoices/html/invoice.html"
-    with open(HEAD_TEMPLATE) as head, \
-         open(TAIL_TEMPLATE) as tail, \
-         open(NEW_TABLE_TEMPLATE) as table, \
-         open(TEMP_HTML_OUTPUT, 'w') as out:
-        out.write(head.read())
-        rows = table.read()
-        for i, week in enumerate(month_lessons):
-            out.write(rows)
-            for lesson in week:
-                out.write(f"<tr><td>{lesson.date}</td><td>{lesson.student.name}</td>"
-                          f"<td>&pound{hourly_rate:.2f}</td><td>{lesson.duration}</td>"
-                          f"<td class='bold'>{lesson.earned}</td></tr>")
-            out.write(f"<tr><td colspan='4' align='right' class='week-total'>"
-                      f"<strong>TOTAL DUE FOR WEEK {i+1}</strong></td>"
-                      f"<td class='total'><strong>&pound{weekly_totals[i]:.2f}</strong></td></tr>")
-        out.write(tail.read())
-
-def create_pdf(month: int = None, year: int = None, delete_html: bool = True) -> None:
+class LessonBatch:
+    """Columnar lessons: parallel arrays of date ordinal, duration, hourly rate and student id.
+
+    Aggregations run straight over the arrays without building a Lesson or Student per row, which
+    keeps multi-year ranges compact (about 32 bytes per lesson instead of two objects).
+    """
+    __slots__ = ('ordinals', 'durations', 'rates', 'student_ids')
+
+    def __init__(self) -> None:
+        self.ordinals = array('l')
+        self.durations = array('d')
+        self.rates = array('d')
+        self.student_ids = array('l')
+
+    @classmethod
+    def fetch(cls, start_date: Date, end_date: Date) -> "LessonBatch":
+        """Loads lessons dated from `start_date` up to (not including) `end_date`, ordered by date."""
+        batch = cls()
+        with db.connection() as conn:
+            rows = conn.execute('''
+                SELECT date, duration, hourly_rate, IFNULL(student_id, 0)
+                FROM lessons
+                WHERE date >= ? AND date < ?
+                ORDER BY date
+            ''', (start_date.isoformat(), end_date.isoformat()))
+            for date_str, duration, hourly_rate, student_id in rows:
+                batch.append(datetime.date.fromisoformat(date_str).toordinal(), duration, hourly_rate, student_id)
+        return batch
+
+    @classmethod
+    def from_lessons(cls, lessons: LessonList) -> "LessonBatch":
+        batch = cls()
+        for lesson in lessons:
+            batch.append(lesson.date.toordinal(), lesson.duration, lesson.hourly_rate, lesson.student.id)
+        return batch
+
+    def append(self, ordinal: int, duration: float, hourly_rate: float, student_id: int) -> None:
+        self.ordinals.append(ordinal)
+        self.durations.append(duration)
+        self.rates.append(hourly_rate)
+        self.student_ids.append(student_id)
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def total_hours(self) -> float:
+        return sum(self.durations)
+
+    def total_earned(self) -> float:
+        return sum(map(float.__mul__, self.durations, self.rates))
+
+    def totals_by(self, by: str = 'month') -> dict:
+        """Returns {key: [lesson count, hours, earned]} grouped by 'week', 'month', 'weekday' or 'student'.
+        Week keys match week_key(); month keys are (year, month) tuples."""
+        if by == 'student':
+            keys = self.student_ids
+        elif by == 'week':
+            keys = ((ordinal - 1) // 7 for ordinal in self.ordinals)
+        elif by == 'weekday':
+            keys = ((ordinal - 1) % 7 for ordinal in self.ordinals)
+        elif by == 'month':
+            months: dict[int, tuple[int, int]] = {}
+
+            def month_of(ordinal: int) -> tuple[int, int]:
+                month = months.get(ordinal)
+                if month is None:
+                    date = datetime.date.fromordinal(ordinal)
+                    month = months[ordinal] = (date.year, date.month)
+                return month
+            keys = map(month_of, self.ordinals)
+        else:
+            raise ValueError(f"Unknown grouping '{by}'")
+        totals: dict = {}
+        for key, duration, rate in zip(keys, self.durations, self.rates):
+            total = totals.get(key)
+            if total is None:
+                totals[key] = [1, duration, duration * rate]
+            else:
+                total[0] += 1
+                total[1] += duration
+                total[2] += duration * rate
+        return totals
+
+@metrics.timed("create_html")
+def create_html(month_lessons: list[LessonList], weekly_totals: list[float], context: dict) -> str:
+    """Renders the invoice HTML in memory, streaming it from the compiled invoice template."""
+    template = INVOICE_ENV.get_template(INVOICE_TEMPLATE)
+    return ''.join(template.generate(context, weeks=month_lessons, weekly_totals=weekly_totals,
+                                     date_format=DATE_DISPLAY_FORMAT))
+
+def invoice_date() -> str:
+    """Today's date as printed on an invoice."""
+    return datetime.datetime.today().strftime("%d %b %Y")
+
+def invoice_context(month: int, year: int, monthly_total: float, invoice_no: str = None,
+                    date: str = None) -> dict:
+    """Returns the header and footer fields for an invoice, dated `date` (default: today)."""
+    settings = load_settings()
+    return {
+        'full_name': settings.full_name.title(),
+        'address': settings.address.title(),
+        'town': settings.town.title(),
+        'invoice_date': date or invoice_date(),
+        'postcode': settings.postcode.upper(),
+        'invoice_no': invoice_no or f"{year}{month:02}",
+        'email': settings.email,
+        'account_no': settings.account_no,
+        'sort_code': settings.sort_code,
+        'monthly_total': f"{monthly_total:.2f}"
+    }
+
+def invoice_rows(month_lessons: list[LessonList]) -> list[list[tuple]]:
+    """Returns the (date, student, rate, hours, subtotal) rows for each week."""
+    return [[(f"{lesson.date:{DATE_DISPLAY_FORMAT}}", lesson.student.name, lesson.hourly_rate, lesson.duration,
+              lesson.earned) for lesson in week] for week in month_lessons]
+
+def build_invoice(month_lessons: list[LessonList], weekly_totals: list[float], context: dict) -> Invoice:
+    """Builds a complete Invoice, rendering its HTML in memory."""
+    html = create_html(month_lessons, weekly_totals, context)
+    return Invoice(context, invoice_rows(month_lessons), weekly_totals, html)
+
+def invoice_cache_key(month: int, year: int, renderer: str, date: str) -> str:
+    """Returns the invoice cache key for a month: a hash of its lesson rows, the user settings, the invoice
+    date printed on it, the templates/CSS and the renderer."""
+    start_date = datetime.date(year, month, 1)
+    end_date = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+    with db.connection() as conn:
+        rows = conn.execute('''
+            SELECT l.event_id, l.date, s.name, l.duration, l.hourly_rate, l.start_time, l.end_time
+            FROM lessons l
+            JOIN students s ON l.student_id = s.id
+            WHERE l.date >= ? AND l.date < ?
+            ORDER BY l.event_id
+        ''', (start_date.isoformat(), end_date.isoformat())).fetchall()
+    settings = {**load_settings().as_dict(), 'invoice_date': date}
+    return invoice_cache.key(rows, settings, INVOICE_TEMPLATE_FILES + [CSS_FILE], renderer)
+
+@metrics.timed("create_pdf")
+def create_pdf(month: int = None, year: int = None, delete_html: bool = True, sync: bool = False,
+               renderer: str = None, use_cache: bool = True) -> str:
+    """Creates the invoice PDF for a month and returns its path.
+    Unless `use_cache` is off (or the HTML is being kept), a month unchanged since an invoice was
+    rendered today is served from the invoice cache instead of being re-rendered."""
     if month is None or year is None:
         now = datetime.datetime.now()
         month, year = now.month, now.year
+    if sync:
+        sync_calendar(month, year)
+    renderer = renderer or DEFAULT_RENDERER
+    use_cache = use_cache and delete_html
+    # Fixed once, so the cache key and the rendered invoice always carry the same date
+    date = invoice_date()
+    output_path = tenants.resolve(f"invoices/pdf/{year:04}{month:02}.pdf")
+    if use_cache:
+        cache_key = invoice_cache_key(month, year, renderer, date)
+        cached_path = invoice_cache.get(month, year, cache_key)
+        if cached_path is not None:
+            # Link the entry to the invoice path, since a sync or eviction may delete it before it is sent
+            try:
+                _link_pdf(cached_path, output_path)
+                return output_path
+            except FileNotFoundError:
+                pass
     month_lessons, weekly_totals = group_lessons(month, year)
-    create_html(month_lessons, weekly_totals)
-    context = {
-        'full_name': USER_SETTINGS['full_name'].title(),
-        'address': USER_SETTINGS['address'].title(),
-        'town': USER_SETTINGS['town'].title(),
-        'invoice_date': datetime.datetime.today().strftime("%d %b %Y"),
-        'postcode': USER_SETTINGS['postcode'].upper(),
-        'invoice_no': f"{year}{month:02}",
-        'email': USER_SETTINGS["email"],
-        'account_no': USER_SETTINGS["account_no"],
-        'sort_code': USER_SETTINGS["sort_code"],
-        'monthly_total': f"{sum(weekly_totals):.2f}"
-    }
-    TEMP_HTML_OUTPUT = f"invoices/html/invoice.html"
-    loader = jinja2.FileSystemLoader('invoices/html')
-    env = jinja2.Environment(loader=loader)
-    template = env.get_template('invoice.html')
-    output_text = template.render(context)
-    WKHTMLTOPDF_PATH = '/usr/local/bin/wkhtmltopdf'
-    config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH)
-    output_path = f"invoices/pdf/{year:04}{month:02}.pdf"
-    pdfkit.from_string(output_text, output_path, configuration=config, css=CSS_FILE)
-    if delete_html:
-        os.remove(TEMP_HTML_OUTPUT)
-    else:
-        os.rename(TEMP_HTML_OUTPUT, f"invoices/html/{year}{month:02}.html")
-    return output_path
\ No newline at end of file
+    # Total the rows the invoice lists, so lessons without a student never inflate it
+    context = invoice_context(month, year, sum(weekly_totals), date=date)
+    invoice = build_invoice(month_lessons, weekly_totals, context)
+    with metrics.span("render_pdf"):
+        pdf = get_renderer(renderer).render(invoice)
+    if not delete_html:
+        html_path = tenants.resolve(f"invoices/html/{year}{month:02}.html")
+        os.makedirs(os.path.dirname(html_path), exist_ok=True)
+        with open(html_path, 'w') as out:
+            out.write(invoice.html)
+    if use_cache:
+        invoice_cache.put(month, year, cache_key, pdf)
+    # Write under a per-thread name, then swap into place, so concurrent requests never see a partial file
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    temp_path = f"{output_path}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as out:
+        out.write(pdf)
+    os.replace(temp_path, output_path)
+    return output_path
+
+def _link_pdf(source: str, output_path: str) -> None:
+    """Puts a cached PDF at `output_path` as a hard link (a copy across filesystems), swapped into place
+    like a freshly rendered one. Raises FileNotFoundError if `source` has already been removed."""
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    temp_path = f"{output_path}.{threading.get_ident()}.tmp"
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(source, temp_path)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(source, temp_path)
+    os.replace(temp_path, output_path)
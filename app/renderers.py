@@ -0,0 +1,234 @@
+import atexit
+import os
+import queue
+import subprocess
+import threading
+from dataclasses import dataclass, field
+
+CSS_FILE = 'static/css/invoice_styles.css'
+WKHTMLTOPDF_PATH = os.environ.get('WKHTMLTOPDF_PATH', '/usr/local/bin/wkhtmltopdf')
+# Backend used by get_renderer() when no name is given: wkhtmltopdf, wkhtmltopdf-pool or simple
+DEFAULT_RENDERER = os.environ.get('INVOICE_RENDERER', 'wkhtmltopdf-pool')
+WKHTMLTOPDF_POOL_SIZE = int(os.environ.get('WKHTMLTOPDF_POOL_SIZE', 2))
+
+@dataclass
+class Invoice:
+    """Everything a renderer needs to produce one invoice PDF.
+
+    `context` holds the header/footer fields (full_name, address, invoice_no, monthly_total, ...),
+    `weeks` holds one list of (date, student, rate, hours, subtotal) rows per week, and `html`
+    is the fully rendered HTML document used by the HTML-based backends.
+    """
+    context: dict
+    weeks: list[list[tuple]] = field(default_factory=list)
+    weekly_totals: list[float] = field(default_factory=list)
+    html: str = ''
+
+class InvoiceRenderer:
+    """Turns an Invoice into PDF bytes."""
+    name = 'base'
+
+    def render(self, invoice: Invoice) -> bytes:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+class WkhtmltopdfRenderer(InvoiceRenderer):
+    """Runs a fresh wkhtmltopdf process through pdfkit for every invoice."""
+    name = 'wkhtmltopdf'
+
+    def __init__(self, binary: str = WKHTMLTOPDF_PATH, css_file: str = CSS_FILE):
+        # Imported here so that only this backend pays for (and depends on) pdfkit
+        import pdfkit
+        self.config = pdfkit.configuration(wkhtmltopdf=binary)
+        self.css_file = css_file
+
+    def render(self, invoice: Invoice) -> bytes:
+        import pdfkit
+        return pdfkit.from_string(invoice.html, False, configuration=self.config, css=self.css_file)
+
+class PooledWkhtmltopdfRenderer(InvoiceRenderer):
+    """Keeps `size` wkhtmltopdf processes started ahead of time, each blocked reading HTML from stdin.
+
+    Process startup (dynamic loading and Qt initialisation) happens off the request path: a render
+    hands its HTML to an already-warm process and immediately starts its replacement. The
+    stylesheet is read once and inlined the same way pdfkit's `css=` option does.
+    """
+    name = 'wkhtmltopdf-pool'
+
+    def __init__(self, size: int = WKHTMLTOPDF_POOL_SIZE, binary: str = WKHTMLTOPDF_PATH,
+                 css_file: str = CSS_FILE):
+        if not os.path.isfile(binary):
+            raise OSError(f'No wkhtmltopdf executable found: "{binary}"')
+        self.command = [binary, '--quiet', '--encoding', 'UTF-8', '-', '-']
+        with open(css_file) as file:
+            self.style_tag = f'<style>{file.read()}</style>'
+        self._warm: queue.Queue[subprocess.Popen] = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(max(1, size)):
+            self._spawn()
+        atexit.register(self.close)
+
+    def _spawn(self) -> None:
+        process = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._warm.put(process)
+
+    def _with_style(self, html: str) -> str:
+        if '</head>' in html:
+            return html.replace('</head>', self.style_tag + '</head>')
+        return self.style_tag + html
+
+    def render(self, invoice: Invoice) -> bytes:
+        process = self._warm.get()
+        with self._lock:
+            if not self._closed:
+                self._spawn()
+        pdf, stderr = process.communicate(self._with_style(invoice.html).encode('utf-8'))
+        if process.returncode != 0 or not pdf:
+            raise OSError(f'wkhtmltopdf exited with code {process.returncode}: {stderr.decode(errors="replace")}')
+        return pdf
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                process = self._warm.get_nowait()
+            except queue.Empty:
+                return
+            process.kill()
+            process.wait()
+
+class SimplePdfRenderer(InvoiceRenderer):
+    """Writes the tabular invoice layout straight to PDF in pure Python, with no subprocess.
+
+    Uses the built-in Helvetica fonts, so the output needs no embedded font data.
+    """
+    name = 'simple'
+
+    PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+    MARGIN = 50
+    LINE = 16
+    # Column x positions and alignment: date, student, rate, hours, subtotal
+    COLUMNS = ((50, 'left'), (140, 'left'), (370, 'right'), (440, 'right'), (545, 'right'))
+    HEADINGS = ('Date', 'Student', 'Rate', 'Hrs', 'Subtotal')
+
+    def render(self, invoice: Invoice) -> bytes:
+        ctx = invoice.context
+        pages: list[list[str]] = [[]]
+        y = self.PAGE_HEIGHT - self.MARGIN
+
+        def text(x, text_y, value, size=10, bold=False, align='left'):
+            value = str(value)
+            if align == 'right':
+                x -= self._text_width(value, size)
+            font = 'F2' if bold else 'F1'
+            pages[-1].append(f'BT /{font} {size} Tf {x:.2f} {text_y:.2f} Td ({self._escape(value)}) Tj ET')
+
+        def rule(rule_y):
+            pages[-1].append(f'{self.MARGIN} {rule_y:.2f} m {self.PAGE_WIDTH - self.MARGIN} {rule_y:.2f} l S')
+
+        def advance(lines=1):
+            nonlocal y
+            y -= self.LINE * lines
+            if y < self.MARGIN + self.LINE * 2:
+                pages.append([])
+                y = self.PAGE_HEIGHT - self.MARGIN
+
+        # Header: tutor details on the left, address block on the right
+        text(self.MARGIN, y, ctx.get('full_name', ''), size=16, bold=True)
+        text(self.PAGE_WIDTH - self.MARGIN, y, ctx.get('address', ''), align='right')
+        advance()
+        text(self.PAGE_WIDTH - self.MARGIN, y, ctx.get('town', ''), align='right')
+        advance()
+        text(self.MARGIN, y, f"Invoice Date: {ctx.get('invoice_date', '')}")
+        text(self.PAGE_WIDTH - self.MARGIN, y, ctx.get('postcode', ''), align='right')
+        advance()
+        text(self.MARGIN, y, f"Invoice No: {ctx.get('invoice_no', '')}")
+        text(self.PAGE_WIDTH - self.MARGIN, y, ctx.get('email', ''), align='right')
+        advance(2)
+
+        for i, week in enumerate(invoice.weeks):
+            for (x, align), heading in zip(self.COLUMNS, self.HEADINGS):
+                text(x, y, heading, bold=True, align=align)
+            rule(y - 4)
+            advance()
+            for date, student, rate, hours, subtotal in week:
+                values = (date, student, f'£{rate:.2f}', f'{hours:g}', f'£{subtotal:.2f}')
+                for (x, align), value in zip(self.COLUMNS, values):
+                    text(x, y, value, bold=x == self.COLUMNS[-1][0], align=align)
+                advance()
+            text(self.COLUMNS[3][0], y, f'TOTAL DUE FOR WEEK {i + 1}', bold=True, align='right')
+            text(self.COLUMNS[4][0], y, f'£{invoice.weekly_totals[i]:.2f}', bold=True, align='right')
+            advance(2)
+
+        # Footer: payment details and the monthly total
+        rule(y + self.LINE - 4)
+        text(self.MARGIN, y, 'Payment Info', bold=True)
+        text(self.PAGE_WIDTH - self.MARGIN, y, 'Total Due', bold=True, align='right')
+        advance()
+        text(self.MARGIN, y, f"Account No: {ctx.get('account_no', '')}")
+        text(self.PAGE_WIDTH - self.MARGIN, y, f"£{ctx.get('monthly_total', '')}", size=16, bold=True,
+             align='right')
+        advance()
+        text(self.MARGIN, y, f"Sort Code: {ctx.get('sort_code', '')}")
+        return self._document(['\n'.join(ops).encode('cp1252', 'replace') for ops in pages])
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    @staticmethod
+    def _text_width(value: str, size: float) -> float:
+        # Helvetica advance widths (1/1000 em): digits and currency are 556, punctuation 278;
+        # other glyphs use an average width, which is close enough for right-aligned figures.
+        widths = {'.': 278, ',': 278, ' ': 278, ':': 278}
+        return sum(widths.get(ch, 556) for ch in value) * size / 1000
+
+    def _document(self, streams: list[bytes]) -> bytes:
+        """Assembles page content streams into a complete PDF file with a cross-reference table."""
+        page_ids = [5 + 2 * i for i in range(len(streams))]
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            f'<< /Type /Pages /Kids [{" ".join(f"{p} 0 R" for p in page_ids)}] /Count {len(streams)} >>'.encode(),
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        ]
+        for page_id, stream in zip(page_ids, streams):
+            objects.append(
+                f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.PAGE_WIDTH} {self.PAGE_HEIGHT}] '
+                f'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {page_id + 1} 0 R >>'.encode()
+            )
+            objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+
+        out = bytearray(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        xref = len(out)
+        out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+        out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+        return bytes(out)
+
+RENDERERS = {
+    WkhtmltopdfRenderer.name: WkhtmltopdfRenderer,
+    PooledWkhtmltopdfRenderer.name: PooledWkhtmltopdfRenderer,
+    SimplePdfRenderer.name: SimplePdfRenderer,
+}
+_instances: dict[str, InvoiceRenderer] = {}
+_instances_lock = threading.Lock()
+
+def get_renderer(name: str = None) -> InvoiceRenderer:
+    """Returns the shared renderer for backend `name` (default INVOICE_RENDERER), creating it on first use."""
+    name = name or DEFAULT_RENDERER
+    if name not in RENDERERS:
+        raise ValueError(f"Unknown invoice renderer '{name}'; choose from {', '.join(RENDERERS)}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = RENDERERS[name]()
+        return _instances[name]
@@ -1,7 +1,21 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, send_file
+from flask import (Flask, Response, render_template, redirect, url_for, request, flash, send_file, jsonify,
+                   abort, make_response, session, g)
+import hashlib
 import os
-from quickstart import create_pdf, sync_history, fetch_lessons, DB_FILE, Student, init_db
-import sqlite3
+from quickstart import (create_pdf, sync_calendar, sync_incremental, sync_history, monthly_earnings,
+                        rebuild_monthly_summary, check_monthly_summary, set_hourly_rate, recompute_active,
+                        get_google_credentials, Student, init_db)
+from settings import prompt_user_settings, SettingsError
+from jobs import SyncScheduler
+from batch import create_pdfs
+from invoice_cache import cache as invoice_cache
+from fragment_cache import cache as fragment_cache
+from api import api
+from export import FORMATS as EXPORT_FORMATS, export_to_file
+import db
+import metrics
+import tenants
+import click
 import json
 import datetime
 
@@ -13,59 +27,139 @@ FILTER_ACTIVE = [(1, 'Current'), (0, 'Past')]
 
 app = Flask(__name__, template_folder='templates')
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev-secret-key')
+app.register_blueprint(api)
+metrics.init_app(app)
 DASHBOARD = 'index.html'
 STUDENTS_HTML = 'students.html'
 
-@app.route("/", methods=["GET"])
-def index():
-    # Ensure database and tables are initialized
+# Background calendar sync: requests queue jobs instead of calling the Google API inline.
+# Set SYNC_REFRESH_MINUTES=0 to disable the periodic incremental sync.
+SYNC_REFRESH_MINUTES = float(os.environ.get('SYNC_REFRESH_MINUTES', 30))
+# How long an invoice request with ?sync=1 waits for its month sync before using the local DB
+INVOICE_SYNC_WAIT_SECONDS = 20
+# With TENANTS_DIR set, every request names its tenant in this header. The app does no authentication of
+# its own, so it must sit behind a trusted reverse proxy that sets this header for the signed-in tutor and
+# strips any value the client sends; otherwise anyone can read any tutor's data.
+TENANT_HEADER = os.environ.get('TENANT_HEADER', 'X-Tenant')
+# Endpoints that serve the whole process rather than one tutor, and so need no tenant
+TENANT_FREE_ENDPOINTS = {'metrics_endpoint', 'static'}
+
+# Apply any pending schema migrations once at startup, so request handlers skip schema work.
+# Tenants' databases are migrated when they are first opened instead.
+if not tenants.multi_tenant():
     init_db()
-    # Determine current year
-    now = datetime.datetime.now()
-    current_year = now.year
-    # Get selected years from query parameters
-    selected_years = request.args.getlist('year', type=int)
-    if not selected_years:
-        selected_years = [current_year]
-    # Determine earliest recorded lesson year
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT MIN(date) FROM lessons")
-    min_date = c.fetchone()[0]
-    conn.close()
-    min_year = int(min_date.split("-")[0]) if min_date else current_year
+# Each periodic refresh syncs, then recomputes the students' active flags, for every tenant in turn
+scheduler = SyncScheduler(refresh_interval=SYNC_REFRESH_MINUTES * 60,
+                          refresh_jobs=[(("incremental",), sync_incremental), (("active",), recompute_active)],
+                          tenants_provider=tenants.list_tenants if tenants.multi_tenant() else None)
+
+@app.before_request
+def start_scheduler():
+    # Started with the first request rather than at import, so CLI commands and tools that
+    # import the app never spawn the worker thread
+    scheduler.start()
+
+@app.before_request
+def select_tenant():
+    """Serves the request from the tenant named in the TENANT_HEADER header (or TENANT) when multi-tenant.
+    Tenant-agnostic endpoints, and URLs that match no route (answered with a 404), need no tenant."""
+    if not tenants.multi_tenant() or request.endpoint in TENANT_FREE_ENDPOINTS or request.endpoint is None:
+        return
+    tenant_id = request.headers.get(TENANT_HEADER) or tenants.DEFAULT_TENANT
+    if not tenant_id:
+        abort(400, f"Missing {TENANT_HEADER} header")
+    try:
+        tenant = tenants.get_tenant(tenant_id)
+    except tenants.TenantError as error:
+        abort(404, str(error))
+    g.tenant_token = tenants.activate(tenant)
+
+@app.errorhandler(db.PoolTimeout)
+def database_busy(error):
+    """Every pooled connection stayed busy: ask the client to retry rather than leaving it hanging."""
+    response = make_response(f"Database busy: {error}", 503)
+    response.headers['Retry-After'] = '5'
+    return response
+
+@app.teardown_request
+def release_tenant(error=None):
+    token = g.pop('tenant_token', None)
+    if token is not None:
+        tenants.deactivate(token)
+
+def submit_sync(key: tuple, func, *args, **kwargs):
+    """Queues a sync job followed by an active-flag recompute, which runs once the sync has finished."""
+    job = scheduler.submit(key, func, *args, **kwargs)
+    scheduler.submit(("active",), recompute_active)
+    return job
+
+def sync_month_before_invoice(month: int, year: int) -> None:
+    """Honours an explicit ?sync=1 on invoice routes by syncing that month in the background
+    worker and waiting briefly for it; otherwise invoices are built from the local DB."""
+    if request.args.get("sync", type=int):
+        job = submit_sync(("month", year, month), sync_calendar, month, year)
+        job.wait(INVOICE_SYNC_WAIT_SECONDS)
+
+def page_etag(generation: int, *parts) -> str:
+    """ETag for a page built from the DB at `generation`, the request URL and any other inputs (e.g. today's date)."""
+    key = (tenants.current_id(), generation, request.full_path, parts)
+    return hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+
+def not_modified(etag: str) -> bool:
+    """True if the client already holds this version of the page. Pages carrying flash messages are never
+    treated as cached, since the flash is shown only once."""
+    return '_flashes' not in session and request.if_none_match.contains(etag)
+
+def conditional_response(etag: str, render):
+    """Returns 304 Not Modified if the client's copy matches `etag`, otherwise the page built by `render()`
+    tagged with `etag` (omitted when flash messages are shown). Clients must revalidate on every view."""
+    if not_modified(etag):
+        response = make_response('', 304)
+    else:
+        has_flashes = '_flashes' in session
+        response = make_response(render())
+        if has_flashes:
+            return response
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    if tenants.multi_tenant():
+        response.vary.add(TENANT_HEADER)
+    return response
+
+def earnings_fragment(current_year: int, current_month: int) -> dict:
+    """Dashboard earnings chart data and statistics."""
+    # Earnings per month for every year with lessons, from one aggregate query
+    all_earnings = monthly_earnings()
+    min_year = min(all_earnings, default=current_year)
     available_years = list(range(min_year, current_year + 1))
-    # Compute earnings per month for each available year
-    earnings_data = {}
-    for year in available_years:
-        monthly_totals = []
-        for month in range(1, 13):
-            lessons = fetch_lessons(month, year)
-            total = sum(lesson.earned for lesson in lessons)
-            monthly_totals.append(total)
-        earnings_data[year] = monthly_totals
-
-    # Fetch next 5 upcoming lessons with student profiles
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    today_str = now.date().isoformat()
-    c.execute(
-        """
-        SELECT l.date, l.start_time, l.end_time,
-               s.id, s.name, s.level, s.year, s.exam_board, s.target_grade, s.subject, s.active
-        FROM lessons l
-        JOIN students s ON l.student_id = s.id
-        WHERE l.date >= ?
-        ORDER BY l.date ASC
-        LIMIT 5
-        """,
-        (today_str,)
-    )
-    rows = c.fetchall()
-    conn.close()
+    earnings_data = {year: all_earnings.get(year, [0.0] * 12) for year in available_years}
+    return {
+        "earnings_data_json": json.dumps(earnings_data),
+        "available_years": available_years,
+        # Year-to-date and month-to-date earnings for the current year
+        "ytd_total": sum(earnings_data.get(current_year, [])),
+        "mtd_total": earnings_data.get(current_year, [0] * 12)[current_month - 1],
+        # Total earnings since the beginning
+        "total_all": sum(sum(totals) for totals in all_earnings.values()),
+    }
+
+def upcoming_lessons_fragment(today: datetime.date) -> list[dict]:
+    """The next 5 upcoming lessons with student profiles."""
+    with db.connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT l.date, l.start_time, l.end_time,
+                   s.id, s.name, s.level, s.year, s.exam_board, s.target_grade, s.subject, s.active
+            FROM lessons l
+            JOIN students s ON l.student_id = s.id
+            WHERE l.date >= ?
+            ORDER BY l.date ASC
+            LIMIT 5
+            """,
+            (today.isoformat(),)
+        ).fetchall()
 
     upcoming_lessons = []
-    today = now.date()
     for (date_str, start_str, end_str,
          sid, name, level, student_year, exam_board, target_grade, subject, active) in rows:
         # parse lesson date
@@ -89,146 +183,307 @@ def index():
             "end_time": end_time,
             "student": student
         })
+    return upcoming_lessons
 
-    # Compute statistics
-    # Year-to-date earnings for current year
-    ytd_total = sum(earnings_data.get(current_year, []))
-    # Month-to-date earnings
-    mtd_total = earnings_data.get(current_year, [0] * 12)[now.month - 1]
-    # Total earnings since the beginning
-    conn2 = sqlite3.connect(DB_FILE)
-    c2 = conn2.cursor()
-    c2.execute("SELECT SUM(duration * hourly_rate) FROM lessons")
-    total_all = c2.fetchone()[0] or 0
-    conn2.close()
-
-    # Pass data to template
-    earnings_data_json = json.dumps(earnings_data)
-    return render_template(
-        DASHBOARD,
-        earnings_data_json=earnings_data_json,
-        available_years=available_years,
-        selected_years=selected_years,
-        upcoming_lessons=upcoming_lessons,
-        ytd_total=ytd_total,
-        mtd_total=mtd_total,
-        total_all=total_all,
-        current_month=now.month,
-        current_year=current_year
-    )
+@app.route("/", methods=["GET"])
+def index():
+    # Determine current year
+    now = datetime.datetime.now()
+    current_year = now.year
+    today = now.date()
+    # Get selected years from query parameters
+    selected_years = request.args.getlist('year', type=int)
+    if not selected_years:
+        selected_years = [current_year]
+
+    # The page depends only on the DB contents and today's date: unchanged, it is a 304,
+    # and its fragments are cached until the next sync or edit bumps the generation
+    generation = db.generation()
+
+    def render():
+        earnings = fragment_cache.get(generation, ("earnings", current_year, now.month),
+                                      lambda: earnings_fragment(current_year, now.month))
+        upcoming_lessons = fragment_cache.get(generation, ("upcoming", today),
+                                              lambda: upcoming_lessons_fragment(today))
+        return render_template(
+            DASHBOARD,
+            selected_years=selected_years,
+            upcoming_lessons=upcoming_lessons,
+            current_month=now.month,
+            current_year=current_year,
+            **earnings
+        )
+    return conditional_response(page_etag(generation, today), render)
 
 @app.route("/create-invoice")
 def create_invoice():
     # Generate PDF and return as download
-    pdf_path = create_pdf()
+    now = datetime.datetime.now()
+    sync_month_before_invoice(now.month, now.year)
+    pdf_path = create_pdf(now.month, now.year)
     return send_file(
         pdf_path,
         mimetype="application/pdf",
         as_attachment=True,
-        download_name=os.path.basename(pdf_path)
+        download_name=f"{now.year:04}{now.month:02}.pdf"
     )
 
 @app.route("/sync-all")
 def sync_all():
-    sync_history()
-    flash("All lessons have been synced successfully.")
+    job = submit_sync(("incremental",), sync_incremental)
+    flash(f"Lesson sync started (job {job.id}); the dashboard will update once it finishes.")
     return redirect(url_for("index"))
 
+@app.route("/sync-history")
+def sync_all_history():
+    job = submit_sync(("history",), sync_history, track_progress=True)
+    flash(f"Full history sync started (job {job.id}).")
+    return redirect(url_for("index"))
+
+@app.route("/sync/status")
+def sync_status():
+    return jsonify(scheduler.status())
+
+@app.route("/sync/status/<int:job_id>")
+def sync_job_status(job_id: int):
+    job = scheduler.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
 @app.route("/create-invoice/<int:year>/<int:month>")
 def create_invoice_custom(year: int, month: int):
     # Generate custom PDF and return as download
+    sync_month_before_invoice(month, year)
     pdf_path = create_pdf(month, year)
     return send_file(
         pdf_path,
         mimetype="application/pdf",
         as_attachment=True,
-        download_name=os.path.basename(pdf_path)
+        download_name=f"{year:04}{month:02}.pdf"
     )
 
+@app.route("/invoices/cache-stats")
+def invoice_cache_stats():
+    return jsonify(invoice_cache.stats())
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/fragments/cache-stats")
+def fragment_cache_stats():
+    return jsonify(fragment_cache.stats())
+
+def student_filters(args) -> tuple[str, list]:
+    """Builds the WHERE clause for the students page filters in `args`.
+    With no status filter only current students are shown; an empty value means all."""
+    filters = []
+    params = []
+    active_param = args.get('active')
+    # Default to current students if no active filter provided
+    if active_param is None:
+        filters.append("active = ?")
+        params.append(1)
+    elif active_param != '':
+        if active_param not in ('0', '1'):
+            abort(400, "The active filter must be 0 (past), 1 (current) or empty (all)")
+        filters.append("active = ?")
+        params.append(int(active_param))
+    for column in ('year', 'level', 'exam_board'):
+        value = args.get(column)
+        if value:
+            filters.append(f"{column} = ?")
+            params.append(value)
+    return (" WHERE " + " AND ".join(filters) if filters else ""), params
+
+# Student columns the batch editor and the bulk action may change
+STUDENT_EDIT_COLUMNS = ('level', 'year', 'exam_board', 'target_grade', 'subject', 'active')
+BULK_EDIT_COLUMNS = ('active', 'year', 'level', 'exam_board')
+# The values the bulk action may write: the options the students page offers for each column
+BULK_EDIT_CHOICES = {
+    'active': [str(value) for value, _ in FILTER_ACTIVE],
+    'year': FILTER_YEARS,
+    'level': FILTER_LEVELS,
+    'exam_board': FILTER_EXAM_BOARDS,
+}
+
 @app.route("/students", methods=["GET", "POST"])
 def manage_students():
     """View and edit student properties."""
-    # Ensure database structure is set up
-    init_db()
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
     if request.method == "POST":
-        # Handle deletion of a student and their lessons
+        # Handle deletion of a student; lessons, subjects and rates follow by ON DELETE CASCADE
         delete_id = request.form.get("delete")
         if delete_id:
-            c.execute("DELETE FROM lessons WHERE student_id = ?", (delete_id,))
-            c.execute("DELETE FROM student_subjects WHERE student_id = ?", (delete_id,))
-            c.execute("DELETE FROM students WHERE id = ?", (delete_id,))
-            conn.commit()
-            conn.close()
+            with db.connection() as conn:
+                conn.execute("DELETE FROM students WHERE id = ?", (delete_id,))
             flash("Student and associated lessons deleted.")
-            return redirect(url_for("manage_students"))
-
-        # Batch update all students
-        student_ids = request.form.getlist("student_ids")
-        for sid in student_ids:
-            level = request.form.get(f"level-{sid}")
-            year_val = request.form.get(f"year-{sid}")
-            exam_board = request.form.get(f"exam_board-{sid}")
-            target_grade = request.form.get(f"target_grade-{sid}")
-            subject_val = request.form.get(f"subject-{sid}")
-            active_val = int(request.form.get(f"active-{sid}", 0))
-            c.execute("""
+            return redirect(url_for("manage_students", **request.args))
+
+        # Apply the chosen values to every student matching the current filters in one statement
+        if request.form.get("bulk"):
+            changes = {column: request.form.get(f"bulk-{column}") for column in BULK_EDIT_COLUMNS}
+            changes = {column: value for column, value in changes.items() if value}
+            invalid = [column for column, value in changes.items() if value not in BULK_EDIT_CHOICES[column]]
+            if invalid:
+                flash(f"Nothing updated: invalid {', '.join(invalid)}.")
+            elif changes:
+                where, params = student_filters(request.args)
+                with db.connection() as conn:
+                    updated = conn.execute(
+                        f"UPDATE students SET {', '.join(f'{column} = ?' for column in changes)}{where}",
+                        [*changes.values(), *params]
+                    ).rowcount
+                flash(f"Updated {updated} students.")
+            return redirect(url_for("manage_students", **request.args))
+
+        # Batch update the students the editor reports as changed, in one transaction.
+        # Rows whose values are already stored are skipped by the WHERE clause.
+        rows = []
+        for sid in request.form.getlist("student_ids"):
+            values = [request.form.get(f"{column}-{sid}") for column in STUDENT_EDIT_COLUMNS]
+            values[-1] = int(values[-1] or 0)
+            rows.append((*values, sid, *values))
+        with db.connection() as conn:
+            conn.executemany(f"""
                 UPDATE students
-                SET level=?, year=?, exam_board=?, target_grade=?, subject=?, active=?
-                WHERE id=?
-            """, (level, year_val, exam_board, target_grade, subject_val, active_val, sid))
-        conn.commit()
-        conn.close()
+                SET {', '.join(f'{column}=?' for column in STUDENT_EDIT_COLUMNS)}
+                WHERE id=? AND ({' OR '.join(f'{column} IS NOT ?' for column in STUDENT_EDIT_COLUMNS)})
+            """, rows)
         flash("Students updated successfully.")
-        return redirect(url_for("manage_students"))
+        return redirect(url_for("manage_students", **request.args))
 
     # GET: fetch all students with optional filters
-    year_filter = request.args.get('year')
-    level_filter = request.args.get('level')
-    board_filter = request.args.get('exam_board')
-    active_param = request.args.get('active')
+    where, args = student_filters(request.args)
     query = """
         SELECT id, name, level, year, exam_board, target_grade, subject, active
         FROM students
-    """
-    filters = []
-    args = []
-    # Default to current students if no active filter provided
-    if active_param is None:
-        filters.append("active = ?")
-        args.append(1)
-    else:
-        filters.append("active = ?")
-        args.append(int(active_param))
-    if year_filter:
-        filters.append("year = ?")
-        args.append(year_filter)
-    if level_filter:
-        filters.append("level = ?")
-        args.append(level_filter)
-    if board_filter:
-        filters.append("exam_board = ?")
-        args.append(board_filter)
-    if filters:
-        query += " WHERE " + " AND ".join(filters)
-
-    c.execute(query, tuple(args))
-    rows = c.fetchall()
-    conn.close()
-
-    # Convert to Student objects
-    students = [Student.from_db(row) for row in rows]
-
-    return render_template(
+    """ + where
+
+    def fetch_students() -> list[Student]:
+        with db.connection() as conn:
+            rows = conn.execute(query, tuple(args)).fetchall()
+        # Convert to Student objects
+        return [Student.from_db(row) for row in rows]
+
+    generation = db.generation()
+    return conditional_response(page_etag(generation), lambda: render_template(
         STUDENTS_HTML,
-        students=students,
+        students=fragment_cache.get(generation, ("students", query, tuple(args)), fetch_students),
         filter_years=FILTER_YEARS,
         filter_levels=FILTER_LEVELS,
         filter_boards=FILTER_EXAM_BOARDS,
         filter_active=FILTER_ACTIVE
-    )
+    ))
+
+@app.cli.command("create-tenant")
+@click.argument("tenant_id")
+def create_tenant_command(tenant_id):
+    """Create a tenant under TENANTS_DIR and prompt for its settings; add its credentials.json next to them."""
+    try:
+        tenant = tenants.create_tenant(tenant_id)
+        with tenants.use(tenant):
+            settings = prompt_user_settings()
+            init_db()
+    except (tenants.TenantError, SettingsError) as error:
+        raise click.ClickException(str(error))
+    print(f"Tenant '{tenant.id}' created in {tenant.directory} for {settings.full_name}.")
+    print(f"Add its credentials.json there, then run `flask authorise {tenant.id}` before its first sync.")
+
+@app.cli.command("authorise")
+@click.argument("tenant_id", required=False)
+def authorise_command(tenant_id):
+    """Sign in to Google in the browser and store the token the background syncs use (default tenant: TENANT)."""
+    try:
+        tenant = tenants.get_tenant(tenant_id) if tenant_id else tenants.current()
+    except tenants.TenantError as error:
+        raise click.ClickException(str(error))
+    if tenant is None and tenants.multi_tenant():
+        raise click.ClickException("Name the tenant to authorise, or set TENANT")
+    with tenants.use(tenant):
+        get_google_credentials(interactive=True)
+    print(f"Google Calendar access authorised{f' for tenant {tenant.id}' if tenant else ''}.")
+
+@app.cli.command("rebuild-summary")
+def rebuild_summary_command():
+    """Recompute the monthly_summary table from the lessons table."""
+    print(f"Rebuilt monthly summary ({rebuild_monthly_summary()} rows).")
+
+@app.cli.command("check-summary")
+def check_summary_command():
+    """Compare the monthly_summary table against the lessons table."""
+    mismatches = check_monthly_summary()
+    for month, student_id, stored, expected in mismatches:
+        print(f"{month} student {student_id}: stored {stored}, expected {expected}")
+    print("Monthly summary is consistent." if not mismatches else f"{len(mismatches)} mismatched rows.")
+    if mismatches:
+        raise SystemExit(1)
+
+@app.cli.command("recompute-active")
+@click.option("--days", type=int, default=None, help="Days without a lesson before a student is past.")
+def recompute_active_command(days):
+    """Mark students current or past from the date of their last lesson."""
+    report = recompute_active(**({"window_days": days} if days is not None else {}))
+    print(f"{report['changed']} students changed ({report['deactivated']} now past, "
+          f"{report['reactivated']} now current; cutoff {report['cutoff']}) in {report['seconds']:.3f}s.")
+
+@app.cli.command("init-settings")
+def init_settings_command():
+    """Create or update user_settings.json interactively."""
+    try:
+        settings = prompt_user_settings()
+    except SettingsError as error:
+        raise click.ClickException(str(error))
+    print(f"Settings saved for {settings.full_name}.")
+
+@app.cli.command("set-rate")
+@click.argument("rate", required=False, type=float)
+@click.option("--student", default=None, help="Student name the rate applies to.")
+@click.option("--subject", default=None, help="Subject the rate applies to.")
+@click.option("--clear", is_flag=True, help="Remove the override instead of setting it.")
+def set_rate_command(rate, student, subject, clear):
+    """Set an hourly RATE override for a student, a subject or both (used from the next sync)."""
+    if rate is None and not clear:
+        raise click.UsageError("Give a RATE or --clear.")
+    try:
+        set_hourly_rate(None if clear else rate, student=student, subject=subject)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    print("Override removed." if clear else f"Hourly rate set to {rate:.2f}.")
+
+@app.cli.command("export-lessons")
+@click.argument("path")
+@click.option("--format", "fmt", type=click.Choice(list(EXPORT_FORMATS)), default=None,
+              help="Output format (default: from the file extension).")
+@click.option("--from", "start", type=click.DateTime(["%Y-%m-%d"]), default=None, help="First date (inclusive).")
+@click.option("--to", "end", type=click.DateTime(["%Y-%m-%d"]), default=None, help="Last date (exclusive).")
+@click.option("--student-id", type=int, default=None)
+def export_lessons_command(path, fmt, start, end, student_id):
+    """Export the lesson history with student profiles to PATH as csv, jsonl or parquet."""
+    try:
+        count = export_to_file(path, fmt, start and start.date().isoformat(), end and end.date().isoformat(),
+                               student_id)
+    except (ValueError, RuntimeError) as error:
+        raise click.ClickException(str(error))
+    print(f"Exported {count} lessons to {path}")
+
+def parse_month(value: str) -> tuple[int, int]:
+    year, month = value.split("-")
+    return int(year), int(month)
+
+@app.cli.command("create-invoices")
+@click.argument("start")
+@click.argument("end")
+@click.option("--per-student/--combined", default=True, help="One invoice per student per month, or one per month.")
+@click.option("--format", "output", type=click.Choice(["zip", "dir"]), default="zip")
+@click.option("--workers", type=int, default=None, help="Rendering processes (default: one per CPU core).")
+@click.option("--renderer", default=None, help="PDF backend: wkhtmltopdf, wkhtmltopdf-pool or simple.")
+def create_invoices_command(start, end, per_student, output, workers, renderer):
+    """Create every invoice from START to END (inclusive, YYYY-MM) as a zip or directory."""
+    path = create_pdfs(parse_month(start), parse_month(end), per_student=per_student,
+                       output=output, workers=workers, renderer=renderer)
+    print(f"Invoices written to {path}")
 
 if __name__ == "__main__":
+    scheduler.start()
     app.run(host="0.0.0.0", port=5001)
\ No newline at end of file
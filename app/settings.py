@@ -1,27 +1,103 @@
 import json
 import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, fields
+import tenants
 
 USER_SETTINGS_FILE = 'user_settings.json'
+# Settings files (one per tenant) kept parsed in memory
+MAX_CACHED_SETTINGS = 256
 
-# Fetch user settings
-def get_user_settings() -> dict:
-    """Fetches the user settings from the 'user_settings.json' file.
-    If the user settings file does not exist, prompts the user to enter the relevant data and creates it.
+class SettingsError(Exception):
+    """Raised when the user settings file is missing or invalid."""
 
-    :return: a dictionary containing the user settings.
-    :rtype: dict
-    """
-    if os.path.isfile(USER_SETTINGS_FILE):
-        with open(USER_SETTINGS_FILE, 'r') as file:
-            user_settings = json.load(file)
+@dataclass(frozen=True, slots=True)
+class UserSettings:
+    """The validated contents of the user settings file."""
+    full_name: str
+    email: str
+    address: str
+    town: str
+    postcode: str
+    control_str: str
+    hourly_rate: float
+    account_no: str
+    sort_code: str
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "UserSettings":
+        """Validates raw settings, converting the hourly rate to a float.
+
+        :raises SettingsError: if a setting is missing or the hourly rate is not a positive number.
+        """
+        missing = [f.name for f in fields(cls) if f.name not in data]
+        if missing:
+            raise SettingsError(f"Missing settings: {', '.join(missing)}")
+        try:
+            hourly_rate = float(data["hourly_rate"])
+        except (TypeError, ValueError):
+            raise SettingsError(f"hourly_rate must be a number, got {data['hourly_rate']!r}") from None
+        if hourly_rate <= 0:
+            raise SettingsError("hourly_rate must be positive")
+        if not str(data["control_str"]).strip():
+            raise SettingsError("control_str must not be empty")
+        values = {f.name: str(data[f.name]) for f in fields(cls)}
+        values["hourly_rate"] = hourly_rate
+        return cls(**values)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
 
-    else:
-        required_settings = ["full_name", "email", "address", "town", "postcode",
-                             "control_str", "hourly_rate", "account_no", "sort_code"]
-        
-        user_settings = {key: input(f"Please enter {' '.join(key.split('_'))}: ") for key in required_settings}
+# path -> (mtime, settings), least recently used first; an entry is replaced whenever its file changes
+_cached: OrderedDict[str, tuple[int, UserSettings]] = OrderedDict()
+_lock = threading.Lock()
 
-        with open(USER_SETTINGS_FILE, 'w') as outfile:
-            json.dump(user_settings, outfile)
+def load_settings(path: str = None) -> UserSettings:
+    """Returns the user settings (default: the current tenant's USER_SETTINGS_FILE), re-reading and
+    validating the file only when its mtime changes.
 
-    return user_settings
\ No newline at end of file
+    :raises SettingsError: if the file is missing or invalid; run `flask --app server init-settings` to create it.
+    """
+    path = path or tenants.resolve(USER_SETTINGS_FILE)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise SettingsError(f"'{path}' not found; run `flask --app server init-settings` to create it") from None
+    with _lock:
+        cached = _cached.get(path)
+        if cached is not None and cached[0] == mtime:
+            _cached.move_to_end(path)
+            return cached[1]
+        with open(path, 'r') as file:
+            try:
+                settings = UserSettings.from_dict(json.load(file))
+            except json.JSONDecodeError as error:
+                raise SettingsError(f"'{path}' is not valid JSON: {error}") from None
+        _cached[path] = (mtime, settings)
+        _cached.move_to_end(path)
+        while len(_cached) > MAX_CACHED_SETTINGS:
+            _cached.popitem(last=False)
+    return settings
+
+def prompt_user_settings(path: str = None) -> UserSettings:
+    """Prompts for every setting on the terminal, validates the answers and writes them to `path`
+    (default: the current tenant's USER_SETTINGS_FILE). Existing values are offered as defaults.
+
+    :return: the new settings.
+    """
+    path = path or tenants.resolve(USER_SETTINGS_FILE)
+    current = {}
+    if os.path.isfile(path):
+        with open(path, 'r') as file:
+            current = json.load(file)
+    answers = {}
+    for field in fields(UserSettings):
+        label = ' '.join(field.name.split('_'))
+        default = current.get(field.name)
+        answer = input(f"Please enter {label}" + (f" [{default}]" if default is not None else "") + ": ")
+        answers[field.name] = answer or default or ''
+    settings = UserSettings.from_dict(answers)
+    with open(path, 'w') as outfile:
+        json.dump(settings.as_dict(), outfile)
+    return settings
@@ -0,0 +1,122 @@
+import contextlib
+import contextvars
+import functools
+import os
+import re
+from dataclasses import dataclass
+
+# Directory holding one subdirectory per tenant (tutor), each with its own user_settings.json, token.json,
+# credentials.json, lessons.db and invoices/. Unset, the app serves a single tutor from the working directory.
+# Requests choose their tenant by a header (see server.TENANT_HEADER) that only a trusted proxy may set.
+TENANTS_DIR = os.environ.get('TENANTS_DIR') or None
+# Tenant used outside requests (CLI commands, scripts) when none is selected explicitly
+DEFAULT_TENANT = os.environ.get('TENANT') or None
+# Tenant ids double as directory names, so they are restricted to a safe character set
+TENANT_ID_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9_-]{0,63}')
+
+class TenantError(LookupError):
+    """Raised for a malformed or unknown tenant id."""
+
+@dataclass(frozen=True, slots=True)
+class Tenant:
+    """One tutor served by this process: their settings, Google credentials, lesson database and
+    invoices all live under `directory`."""
+    id: str
+    directory: str
+
+    def path(self, relative: str) -> str:
+        return os.path.join(self.directory, relative)
+
+_current: contextvars.ContextVar[Tenant | None] = contextvars.ContextVar('tenant', default=None)
+_END = object()
+
+def multi_tenant() -> bool:
+    """True when TENANTS_DIR is configured, i.e. every request must name its tenant."""
+    return TENANTS_DIR is not None
+
+def _directory(tenant_id: str) -> str:
+    if TENANTS_DIR is None:
+        raise TenantError("TENANTS_DIR is not set")
+    if not TENANT_ID_PATTERN.fullmatch(tenant_id or ''):
+        raise TenantError(f"Invalid tenant id {tenant_id!r}")
+    return os.path.abspath(os.path.join(TENANTS_DIR, tenant_id))
+
+def get_tenant(tenant_id: str) -> Tenant:
+    """Returns the tenant with directory TENANTS_DIR/`tenant_id`.
+
+    :raises TenantError: if the id is malformed or the tenant does not exist.
+    """
+    directory = _directory(tenant_id)
+    if not os.path.isdir(directory):
+        raise TenantError(f"Unknown tenant '{tenant_id}'")
+    return Tenant(tenant_id, directory)
+
+def create_tenant(tenant_id: str) -> Tenant:
+    """Creates the directory for a new tenant (or returns the existing one)."""
+    directory = _directory(tenant_id)
+    os.makedirs(directory, exist_ok=True)
+    return Tenant(tenant_id, directory)
+
+def list_tenants() -> list[Tenant]:
+    """Every tenant under TENANTS_DIR, ordered by id; empty when single-tenant."""
+    if TENANTS_DIR is None or not os.path.isdir(TENANTS_DIR):
+        return []
+    return [Tenant(entry.name, os.path.abspath(entry.path))
+            for entry in sorted(os.scandir(TENANTS_DIR), key=lambda entry: entry.name)
+            if entry.is_dir() and TENANT_ID_PATTERN.fullmatch(entry.name)]
+
+@functools.cache
+def _default_tenant() -> Tenant | None:
+    return get_tenant(DEFAULT_TENANT) if DEFAULT_TENANT and TENANTS_DIR else None
+
+def current() -> Tenant | None:
+    """The tenant the current request, job or `use()` block runs for; None when single-tenant."""
+    tenant = _current.get()
+    return tenant if tenant is not None else _default_tenant()
+
+def current_id() -> str | None:
+    tenant = current()
+    return tenant.id if tenant is not None else None
+
+def activate(tenant: Tenant | None) -> contextvars.Token:
+    """Makes `tenant` current until `deactivate()` is called with the returned token."""
+    return _current.set(tenant)
+
+def deactivate(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+@contextlib.contextmanager
+def use(tenant: Tenant | None):
+    """Runs the block for `tenant`: its settings, credentials, database and invoice paths."""
+    token = activate(tenant)
+    try:
+        yield tenant
+    finally:
+        deactivate(token)
+
+def bind(iterable):
+    """Wraps a lazily produced iterable, such as a streamed response body that is only consumed after
+    the request has finished, so each item is produced as the tenant current now."""
+    return _produce_as(current(), iter(iterable))
+
+def _produce_as(tenant: Tenant | None, iterator):
+    try:
+        while True:
+            with use(tenant):
+                item = next(iterator, _END)
+            if item is _END:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            with use(tenant):
+                close()
+
+def resolve(path: str) -> str:
+    """Returns the current tenant's copy of a relative data file or directory such as 'lessons.db'.
+    Absolute paths, and every path when single-tenant, are returned unchanged."""
+    tenant = current()
+    if tenant is None or os.path.isabs(path):
+        return path
+    return tenant.path(path)
@@ -0,0 +1,58 @@
+"""Every test runs in its own working directory holding user_settings.json, an empty lessons.db and
+links to the templates and static files, as the app expects when started from app/."""
+import json
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+# Importing server must never start the periodic refresh
+os.environ["SYNC_REFRESH_MINUTES"] = "0"
+
+SETTINGS = {
+    "full_name": "test tutor", "email": "tutor@example.com", "address": "1 test street",
+    "town": "testville", "postcode": "te1 1st", "control_str": "Tutoring with",
+    "hourly_rate": "30", "account_no": "12345678", "sort_code": "00-00-00",
+}
+
+def reset_state() -> None:
+    """Drops the process-wide caches that are keyed by relative paths, which every test reuses."""
+    import db
+    import settings
+    from fragment_cache import cache as fragment_cache
+    with db._pools_lock:
+        for pool in db._pools.values():
+            pool.close()
+        db._pools.clear()
+    settings._cached.clear()
+    fragment_cache.clear()
+    if "analytics" in sys.modules:
+        sys.modules["analytics"].cache.clear()
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.symlink(os.path.join(APP_DIR, "templates"), "templates")
+    os.symlink(os.path.join(APP_DIR, "static"), "static")
+    os.makedirs("invoices/html")
+    os.makedirs("invoices/pdf")
+    with open("user_settings.json", "w") as file:
+        json.dump(SETTINGS, file)
+    reset_state()
+    yield tmp_path
+    reset_state()
+
+@pytest.fixture
+def q():
+    """The quickstart module with a migrated database in the working directory."""
+    import quickstart
+    quickstart.init_db()
+    return quickstart
+
+@pytest.fixture
+def server(q):
+    import server
+    yield server
+    server.scheduler.stop()
@@ -0,0 +1,106 @@
+"""An in-memory stand-in for the Google Calendar API client, with helpers for building events."""
+import datetime
+import threading
+import time
+
+def make_event(event_id: str, student: str, start: datetime.datetime, hours: float = 1.0,
+               control_str: str = "Tutoring with") -> dict:
+    """One timed event as `events().list()` returns it."""
+    end = start + datetime.timedelta(hours=hours)
+    return {
+        "id": event_id,
+        "status": "confirmed",
+        "summary": f"{control_str} {student}",
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": end.isoformat()},
+    }
+
+def http_error(status: int) -> Exception:
+    """A googleapiclient HttpError carrying `status`."""
+    import httplib2
+    from googleapiclient.errors import HttpError
+    return HttpError(httplib2.Response({"status": status}), b"{}")
+
+class _Request:
+    def __init__(self, calendar: "FakeCalendar", params: dict):
+        self.calendar = calendar
+        self.params = params
+
+    def execute(self) -> dict:
+        return self.calendar.respond(self.params)
+
+class FakeCalendar:
+    """Serves `events().list()` from `self.items`, like the Calendar API with `singleEvents=True`:
+
+    - a full list honours timeMin/timeMax and omits cancelled events;
+    - a `syncToken` list returns every event changed since that token, cancelled ones included,
+      or raises 410 Gone for a token in `expired`;
+    - results are paged `page_size` at a time through nextPageToken, and the last page carries nextSyncToken.
+
+    Exceptions queued in `errors` are raised by the next executes, and every execute sleeps `latency` seconds.
+    """
+    def __init__(self, page_size: int = 250, latency: float = 0.0):
+        self.page_size = page_size
+        self.latency = latency
+        self.items: dict[str, dict] = {}
+        self.changed_at: dict[str, int] = {}
+        self.version = 0
+        self.expired: set[str] = set()
+        self.errors: list[Exception] = []
+        self.requests: list[dict] = []
+        self.threads: set[int] = set()
+        self._lock = threading.Lock()
+
+    def put(self, *events: dict) -> None:
+        """Adds or changes events."""
+        for event in events:
+            self.version += 1
+            self.items[event["id"]] = event
+            self.changed_at[event["id"]] = self.version
+
+    def cancel(self, event_id: str) -> None:
+        """Cancels an event: full lists drop it and incremental lists report it as cancelled."""
+        self.version += 1
+        self.items[event_id] = {"id": event_id, "status": "cancelled"}
+        self.changed_at[event_id] = self.version
+
+    def purge(self, event_id: str) -> None:
+        """Removes an event without a trace, as happens once Google forgets old cancellations."""
+        self.items.pop(event_id)
+        self.changed_at.pop(event_id)
+
+    def events(self):
+        return self
+
+    def list(self, **params) -> _Request:
+        return _Request(self, dict(params))
+
+    def respond(self, params: dict) -> dict:
+        with self._lock:
+            self.requests.append(params)
+            self.threads.add(threading.get_ident())
+            error = self.errors.pop(0) if self.errors else None
+        if self.latency:
+            time.sleep(self.latency)
+        if error is not None:
+            raise error
+        sync_token = params.get("syncToken")
+        if sync_token is not None:
+            if sync_token in self.expired:
+                raise http_error(410)
+            since = int(sync_token.removeprefix("sync"))
+            items = [event for event_id, event in self.items.items() if self.changed_at[event_id] > since]
+        else:
+            items = [event for event in self.items.values() if event.get("status") != "cancelled"]
+            if "timeMin" in params:
+                items = [event for event in items
+                         if params["timeMin"][:10] <= event["start"]["dateTime"][:10] < params["timeMax"][:10]]
+        items.sort(key=lambda event: (event.get("start", {}).get("dateTime", ""), event["id"]))
+        offset = int(params.get("pageToken") or 0)
+        size = min(self.page_size, params.get("maxResults") or self.page_size)
+        response = {"items": items[offset:offset + size]}
+        if offset + size < len(items):
+            response["nextPageToken"] = str(offset + size)
+        else:
+            response["nextSyncToken"] = f"sync{self.version}"
+        return response
@@ -0,0 +1,132 @@
+import datetime
+import json
+
+import pytest
+
+import db
+from api import encode_cursor
+from tests.fakes import make_event
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+def store(q, count: int, students: int = 3) -> None:
+    start = datetime.datetime(2024, 1, 1, 9)
+    events = [make_event(f"e{i:05}", f"Student{i % students}", start + datetime.timedelta(hours=i * 7))
+              for i in range(count)]
+    with db.connection() as conn:
+        q.store_events(conn.cursor(), events)
+
+@pytest.mark.parametrize("path, values", [
+    ("/api/lessons", [1, 2]),
+    ("/api/lessons", ["2024-01-01", 5]),
+    ("/api/lessons", ["2024-01-01"]),
+    ("/api/lessons", {"date": "2024-01-01"}),
+    ("/api/students", ["3"]),
+    ("/api/students", [1.5]),
+    ("/api/students", [True]),
+    ("/api/students", [1, 2]),
+])
+def test_cursor_of_the_wrong_shape_is_a_bad_request(q, client, path, values):
+    response = client.get(f"{path}?cursor={encode_cursor(values)}")
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid cursor"}
+
+def test_undecodable_cursor_is_a_bad_request(q, client):
+    assert client.get("/api/lessons?cursor=not-base64!").status_code == 400
+
+def test_failing_query_is_an_error_response_not_a_cut_off_body(q, client):
+    store(q, 3)
+    with db.connection() as conn:
+        conn.execute("ALTER TABLE students RENAME COLUMN exam_board TO board")
+
+    response = client.get("/api/students")
+
+    assert response.status_code == 500
+    # The connection went back to the pool, so later requests still work
+    with db.connection() as conn:
+        conn.execute("ALTER TABLE students RENAME COLUMN board TO exam_board")
+    assert json.loads(client.get("/api/students").get_data())["next_cursor"] is None
+
+def lessons_walk(client, path: str) -> list[dict]:
+    """Every item of every page, following next_cursor."""
+    items, cursor = [], None
+    separator = "&" if "?" in path else "?"
+    while True:
+        page = client.get(path + (f"{separator}cursor={cursor}" if cursor else "")).get_json()
+        items += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+def test_cursor_round_trip_visits_every_lesson_once_in_order(q, client):
+    store(q, 57)
+
+    items = lessons_walk(client, "/api/lessons?limit=10")
+
+    assert len(items) == 57
+    keys = [(item["date"], item["event_id"]) for item in items]
+    assert keys == sorted(set(keys))
+    first = client.get("/api/lessons?limit=10").get_json()
+    assert first["next_cursor"] == encode_cursor([items[9]["date"], items[9]["event_id"]])
+
+def test_lesson_filters_page_through_only_matching_lessons(q, client):
+    store(q, 200)
+    with db.connection() as conn:
+        student_id = conn.execute("SELECT id FROM students WHERE name = 'Student1'").fetchone()[0]
+        expected = [row[0] for row in conn.execute(
+            "SELECT event_id FROM lessons WHERE date >= '2024-01-10' AND date < '2024-02-01' AND student_id = ?"
+            " ORDER BY date, event_id", (student_id,))]
+
+    items = lessons_walk(client, f"/api/lessons?from=2024-01-10&to=2024-02-01&student_id={student_id}&limit=4")
+
+    assert expected and [item["event_id"] for item in items] == expected
+    assert all(item["earned"] == item["duration"] * item["hourly_rate"] for item in items)
+
+def test_student_filters_and_cursor(q, client):
+    store(q, 30, students=7)
+    with db.connection() as conn:
+        conn.execute("UPDATE students SET year = 'Year 11', level = 'GCSE' WHERE id % 2 = 1")
+        conn.execute("UPDATE students SET active = 0 WHERE id IN (1, 5)")
+
+    items = lessons_walk(client, "/api/students?year=Year%2011&level=GCSE&active=1&limit=1")
+
+    assert [item["id"] for item in items] == [3, 7]
+    assert all(item["active"] is True for item in items)
+    for value in ("yes", "2", "-1"):
+        response = client.get(f"/api/students?active={value}")
+        assert response.status_code == 400
+        assert "active" in response.get_json()["error"]
+
+def test_paging_200k_lessons_keeps_memory_bounded_by_the_page(q, client):
+    import tracemalloc
+    from api import MAX_PAGE_SIZE
+    from benchmarks.bench_api import walk
+    total = 200_000
+    with db.connection() as conn:
+        conn.execute("INSERT INTO students (id, name) VALUES (1, 'Student0')")
+        conn.execute('''
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < ?)
+            INSERT INTO lessons (event_id, date, weekday, student, duration, hourly_rate, start_time, end_time,
+                                 student_id)
+            SELECT printf('e%07d', i), date('2000-01-03', '+' || (i / 8) || ' days'), (i / 8) % 7, 'Student0',
+                   1.0, 30.0, '2000-01-03T09:00:00', '2000-01-03T10:00:00', 1
+            FROM n
+        ''', (total,))
+
+    assert walk(client, f"/api/lessons?limit={MAX_PAGE_SIZE}", compressed=True)[:2] == (total // MAX_PAGE_SIZE, total)
+
+    # Tracing slows every allocation down, so the peak is taken over one full page from mid-history
+    cursor = encode_cursor(["2030-01-01", ""])
+    tracemalloc.start()
+    try:
+        response = client.get(f"/api/lessons?limit={MAX_PAGE_SIZE}&cursor={cursor}")
+        page = json.loads(response.get_data())
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert len(page["items"]) == MAX_PAGE_SIZE and page["next_cursor"]
+    # The whole history is ~60 MB of JSON; a page stays within a few MB
+    assert peak < 8 * 2**20
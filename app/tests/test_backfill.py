@@ -0,0 +1,95 @@
+import datetime
+import threading
+
+import pytest
+
+import db
+from tests.fakes import FakeCalendar, http_error, make_event
+
+class FlakyRequest:
+    """A request whose execute() raises each of `errors` in turn, then succeeds."""
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def execute(self) -> dict:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"items": []}
+
+@pytest.fixture
+def sleeps(q, monkeypatch) -> list[float]:
+    """Records retry backoffs instead of sleeping through them."""
+    slept = []
+    monkeypatch.setattr(q.time, "sleep", slept.append)
+    return slept
+
+def test_list_events_follows_next_page_token(q):
+    calendar = FakeCalendar(page_size=2)
+    start = datetime.datetime(2024, 5, 1, 9)
+    calendar.put(*(make_event(f"e{i}", "Alice", start + datetime.timedelta(days=i)) for i in range(5)))
+
+    pages = list(q.list_events(calendar, calendarId="primary"))
+
+    assert [len(page["items"]) for page in pages] == [2, 2, 1]
+    assert [request.get("pageToken") for request in calendar.requests] == [None, "2", "4"]
+    assert all(request["maxResults"] == q.PAGE_SIZE for request in calendar.requests)
+    assert "nextSyncToken" in pages[-1]
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_execute_with_retry_retries_rate_limits_and_server_errors(q, sleeps, status):
+    request = FlakyRequest(http_error(status), http_error(status))
+
+    assert q.execute_with_retry(request, retries=3, backoff=1.0) == {"items": []}
+
+    assert request.calls == 3
+    # Exponential backoff with up to one `backoff` of jitter
+    assert 1.0 <= sleeps[0] < 2.0 and 2.0 <= sleeps[1] < 3.0
+
+@pytest.mark.parametrize("status", [400, 403, 404])
+def test_execute_with_retry_gives_up_on_client_errors(q, sleeps, status):
+    request = FlakyRequest(http_error(status))
+
+    with pytest.raises(q._http_error()):
+        q.execute_with_retry(request, retries=3)
+
+    assert request.calls == 1
+    assert sleeps == []
+
+def test_execute_with_retry_gives_up_after_the_last_retry(q, sleeps):
+    request = FlakyRequest(*(http_error(503) for _ in range(4)))
+
+    with pytest.raises(q._http_error()):
+        q.execute_with_retry(request, retries=2)
+
+    assert request.calls == 3
+    assert len(sleeps) == 2
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_backfill_writes_through_the_calling_thread(q, monkeypatch, workers):
+    calendar = FakeCalendar(page_size=3)
+    start = datetime.datetime(2024, 1, 1, 9)
+    calendar.put(*(make_event(f"e{i:03}", f"Student{i % 5}", start + datetime.timedelta(days=i))
+                   for i in range(120)))
+    writers = []
+    store_events = q.store_events
+
+    def recording_store_events(c, events):
+        writers.append(threading.get_ident())
+        return store_events(c, events)
+    monkeypatch.setattr(q, "store_events", recording_store_events)
+    progress = []
+
+    windows = q.month_windows(1, 2024, 4, 2024)
+    stored = q.backfill(windows, workers=workers, service_factory=lambda: calendar, batch_size=25,
+                        progress=lambda done, total: progress.append((done, total)))
+
+    assert stored == 120
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM lessons").fetchone()[0] == 120
+    # Every batch was written by the caller, never by a fetching worker
+    assert len(writers) > 1
+    assert set(writers) == {threading.get_ident()}
+    assert progress == [(done, len(windows)) for done in range(1, len(windows) + 1)]
+    assert q.check_monthly_summary() == []
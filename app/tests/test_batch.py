@@ -0,0 +1,30 @@
+import datetime
+import json
+import os
+import zipfile
+
+import db
+from tests.fakes import make_event
+
+def at(month: int, day: int) -> datetime.datetime:
+    return datetime.datetime(2024, month, day, 10, tzinfo=datetime.timezone.utc)
+
+def test_per_student_invoices_never_overwrite_each_other(q):
+    import batch
+    # Both names sanitise to "Ann_Lee"
+    with db.connection() as conn:
+        q.store_events(conn.cursor(), [make_event("a", "Ann.Lee", at(5, 6)), make_event("b", "Ann-Lee", at(5, 7)),
+                                       make_event("c", "Ann.Lee", at(6, 3), hours=2.0)])
+        ids = dict(conn.execute("SELECT name, id FROM students"))
+
+    path = batch.create_pdfs((2024, 5), (2024, 6), workers=1, renderer="simple")
+
+    with zipfile.ZipFile(path) as archive:
+        names = set(archive.namelist())
+        manifest = json.loads(archive.read("manifest.json"))
+    expected = {f"202405-{ids['Ann.Lee']}-Ann_Lee.pdf", f"202405-{ids['Ann-Lee']}-Ann_Lee.pdf",
+                f"202406-{ids['Ann.Lee']}-Ann_Lee.pdf"}
+    assert names == expected | {"manifest.json"}
+    assert {entry["file"] for entry in manifest["invoices"]} == expected
+    assert all(entry["sha256"] for entry in manifest["invoices"])
+    assert os.path.dirname(path) == batch.BATCH_OUTPUT_DIR
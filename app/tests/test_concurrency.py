@@ -0,0 +1,70 @@
+import datetime
+import sqlite3
+import threading
+import time
+
+import db
+from tests.fakes import make_event
+
+def events(count: int, students: int = 20) -> list[dict]:
+    start = datetime.datetime(2020, 1, 6, 9)
+    return [make_event(f"e{i:06}", f"Student{i % students}", start + datetime.timedelta(hours=i * 2))
+            for i in range(count)]
+
+def test_readers_and_two_writers_never_see_a_locked_database(q, server):
+    lessons = events(4000)
+    with db.connection() as conn:
+        q.store_events(conn.cursor(), lessons[:200])
+        student_ids = [row[0] for row in conn.execute("SELECT id FROM students")]
+    client = server.app.test_client()
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "saves": 0}
+    errors: list[Exception] = []
+    lock = threading.Lock()
+
+    def reader() -> None:
+        while not stop.is_set():
+            try:
+                q.monthly_earnings()
+                q.fetch_lessons(1, 2020)
+            except sqlite3.OperationalError as error:
+                errors.append(error)
+            with lock:
+                counts["reads"] += 1
+
+    def sync_writer() -> None:
+        # Upserts batches of lessons, as a sync job does
+        offset = 0
+        while not stop.is_set():
+            batch = lessons[offset:offset + 200]
+            offset = (offset + 200) % len(lessons)
+            try:
+                with db.connection() as conn:
+                    q.store_events(conn.cursor(), batch)
+            except sqlite3.OperationalError as error:
+                errors.append(error)
+            counts["writes"] += len(batch)
+
+    def students_writer() -> None:
+        # Saves the students editor, alternating every student's year so each save really writes
+        while not stop.is_set():
+            form = {"student_ids": [str(sid) for sid in student_ids]}
+            for sid in student_ids:
+                form.update({f"year-{sid}": f"Year {10 + counts['saves'] % 2}", f"active-{sid}": "1"})
+            response = client.post("/students", data=form)
+            if response.status_code != 302:
+                errors.append(RuntimeError(f"POST /students returned {response.status}"))
+            counts["saves"] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    threads += [threading.Thread(target=sync_writer), threading.Thread(target=students_writer)]
+    for thread in threads:
+        thread.start()
+    time.sleep(1.5)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert counts["reads"] > 0 and counts["writes"] > 0 and counts["saves"] > 0
+    assert q.check_monthly_summary() == []
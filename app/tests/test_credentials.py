@@ -0,0 +1,81 @@
+import json
+import threading
+
+import pytest
+
+def write_token(path: str, expiry: str) -> None:
+    with open(path, "w") as file:
+        json.dump({"token": "old", "refresh_token": "refresh", "client_id": "id", "client_secret": "secret",
+                   "expiry": expiry}, file)
+
+@pytest.fixture
+def no_browser(monkeypatch) -> list:
+    """Records every browser sign-in instead of opening one."""
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    started = []
+
+    def from_client_secrets_file(*args, **kwargs):
+        started.append(threading.current_thread())
+        raise AssertionError("the browser sign-in ran")
+    monkeypatch.setattr(InstalledAppFlow, "from_client_secrets_file", from_client_secrets_file)
+    return started
+
+@pytest.fixture(autouse=True)
+def forget_credentials(q):
+    q._credentials.clear()
+    yield
+    q._credentials.clear()
+
+def test_sync_job_without_a_token_fails_instead_of_signing_in(q, no_browser):
+    from jobs import SyncScheduler
+    scheduler = SyncScheduler()
+    scheduler.start()
+    try:
+        job = scheduler.submit(("incremental",), q.sync_incremental)
+        assert job.wait(10)
+    finally:
+        scheduler.stop()
+
+    assert job.state == "failed"
+    assert job.error.startswith("AuthorisationRequired: ") and "flask authorise" in job.error
+    assert no_browser == []
+
+def test_main_thread_may_sign_in(q, no_browser):
+    with pytest.raises(AssertionError, match="browser sign-in"):
+        q.get_google_credentials()
+    assert no_browser == [threading.main_thread()]
+
+def test_refresh_holds_no_lock(q, monkeypatch):
+    from google.oauth2.credentials import Credentials
+    write_token(q.TOKEN_FILE, "2000-01-01T00:00:00Z")
+    refreshing, finish = threading.Event(), threading.Event()
+
+    def slow_refresh(creds, request):
+        refreshing.set()
+        assert finish.wait(10)
+        creds.token = "new"
+        creds.expiry = None
+    monkeypatch.setattr(Credentials, "refresh", slow_refresh)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(q.get_google_credentials()))
+    thread.start()
+    try:
+        assert refreshing.wait(10)
+        # While the token endpoint is slow, neither the shared lock nor this token file's lock is held
+        assert q._credentials_lock.acquire(blocking=False)
+        q._credentials_lock.release()
+        token_lock = q._token_lock(q.TOKEN_FILE)
+        assert token_lock.acquire(blocking=False)
+        token_lock.release()
+    finally:
+        finish.set()
+        thread.join()
+
+    assert result[0].token == "new"
+    with open(q.TOKEN_FILE) as file:
+        assert json.load(file)["token"] == "new"
+    assert q.get_google_credentials() is result[0]
+
+def test_each_token_file_has_its_own_lock(q):
+    assert q._token_lock("a/token.json") is q._token_lock("a/token.json")
+    assert q._token_lock("a/token.json") is not q._token_lock("b/token.json")
@@ -0,0 +1,110 @@
+import datetime
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import db
+from tests.fakes import make_event
+
+def at(day: int, hour: int = 10) -> datetime.datetime:
+    return datetime.datetime(2024, 5, day, hour, tzinfo=datetime.timezone.utc)
+
+def store(q, *events: dict) -> None:
+    with db.connection() as conn:
+        q.store_events(conn.cursor(), list(events))
+
+@pytest.fixture
+def built(q, monkeypatch) -> list:
+    """Records the (weeks, weekly_totals, context) of every invoice built."""
+    invoices = []
+    build_invoice = q.build_invoice
+
+    def recording_build_invoice(weeks, weekly_totals, context):
+        invoices.append((weeks, weekly_totals, context))
+        return build_invoice(weeks, weekly_totals, context)
+    monkeypatch.setattr(q, "build_invoice", recording_build_invoice)
+    return invoices
+
+def test_total_due_matches_the_listed_lessons(q, built):
+    store(q, make_event("a", "Alice", at(6)), make_event("b", "Bob", at(14), hours=2.0),
+          make_event("c", "Cara", at(21)))
+    # A legacy lesson without a student still counts in monthly_summary (under student 0)
+    with db.connection() as conn:
+        conn.execute("UPDATE lessons SET student_id = NULL WHERE event_id = 'c'")
+
+    q.create_pdf(5, 2024, renderer="simple", use_cache=False)
+
+    weeks, weekly_totals, context = built[-1]
+    assert sum(len(week) for week in weeks) == 2
+    assert context["monthly_total"] == "90.00"
+    # The student-0 bucket keeps the lesson for analytics, but invoices never bill it
+    with db.connection() as conn:
+        assert dict(conn.execute("SELECT student_id, earned FROM monthly_summary WHERE month = '2024-05'")) \
+            .get(0) == 30.0
+
+def test_cache_hit_is_served_from_the_invoice_path(q):
+    from invoice_cache import cache as invoice_cache
+    store(q, make_event("a", "Alice", at(6)))
+    rendered = q.create_pdf(5, 2024, renderer="simple")
+    with open(rendered, "rb") as file:
+        pdf = file.read()
+    hits = invoice_cache.counters["hits"]
+
+    path = q.create_pdf(5, 2024, renderer="simple")
+    # A sync touching May drops the cache entry before the response is sent
+    assert invoice_cache.invalidate(["2024-05"]) == 1
+
+    assert invoice_cache.counters["hits"] == hits + 1
+    assert path == rendered == "invoices/pdf/202405.pdf"
+    with open(path, "rb") as file:
+        assert file.read() == pdf
+
+def test_concurrent_invoices_keep_their_own_month_and_context(q):
+    # 50 months, each with its own pupil and lesson count
+    months = [(2020 + i // 12, i % 12 + 1) for i in range(50)]
+    store(q, *(make_event(f"{year}{month:02}-{day}", f"Pupil{i:02}",
+                          datetime.datetime(year, month, day, 10, tzinfo=datetime.timezone.utc))
+               for i, (year, month) in enumerate(months) for day in (3, 10, 17, 24)[:i % 4 + 1]))
+
+    def html(i: int) -> str:
+        year, month = months[i]
+        weeks, weekly_totals = q.group_lessons(month, year)
+        return q.create_html(weeks, weekly_totals, q.invoice_context(month, year, sum(weekly_totals)))
+
+    def pdf(i: int) -> bytes:
+        year, month = months[i]
+        with open(q.create_pdf(month, year, renderer="simple"), "rb") as file:
+            return file.read()
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        pages = list(pool.map(html, range(50)))
+        pdfs = list(pool.map(pdf, range(50)))
+
+    for i, (year, month) in enumerate(months):
+        total = f"{(i % 4 + 1) * 30:.2f}"
+        assert f"Invoice No: <strong>{year}{month:02}</strong>" in pages[i]
+        assert f"&pound{total}<" in pages[i]
+        assert set(re.findall(r"Pupil\d\d", pages[i])) == {f"Pupil{i:02}"}
+        assert f"(Invoice No: {year}{month:02})".encode() in pdfs[i]
+        assert f"{total})".encode() in pdfs[i]
+        assert set(re.findall(rb"Pupil\d\d", pdfs[i])) == {f"Pupil{i:02}".encode()}
+
+def test_cached_invoice_is_never_served_with_an_old_date(q, monkeypatch):
+    from invoice_cache import cache as invoice_cache
+    store(q, make_event("a", "Alice", at(6)))
+    monkeypatch.setattr(q, "invoice_date", lambda: "31 May 2024")
+    q.create_pdf(5, 2024, renderer="simple")
+    misses = invoice_cache.counters["misses"]
+
+    monkeypatch.setattr(q, "invoice_date", lambda: "01 Jun 2024")
+    path = q.create_pdf(5, 2024, renderer="simple")
+
+    assert invoice_cache.counters["misses"] == misses + 1
+    with open(path, "rb") as file:
+        pdf = file.read()
+    assert b"(Invoice Date: 01 Jun 2024)" in pdf and b"31 May 2024" not in pdf
+    # The same day's request is a hit again
+    hits = invoice_cache.counters["hits"]
+    q.create_pdf(5, 2024, renderer="simple")
+    assert invoice_cache.counters["hits"] == hits + 1
@@ -0,0 +1,188 @@
+import datetime
+import sqlite3
+
+import pytest
+
+import migrations
+from migrations import MIGRATIONS, MONTHLY_SUMMARY_QUERY, WEEKDAY_SUMMARY_QUERY, migrate
+
+TODAY = datetime.date.today()
+RECENT = TODAY - datetime.timedelta(days=10)
+OLD = TODAY - datetime.timedelta(days=800)
+
+# (event_id, date, student, student_id, duration, hourly_rate); student 99 no longer exists
+LESSONS = [
+    ("e1", RECENT, "Alice", 1, 1.0, 30.0),
+    ("e2", RECENT + datetime.timedelta(days=1), "Alice", 1, 1.5, 30.0),
+    ("e3", OLD, "Bob", 2, 2.0, 35.0),
+    ("e4", OLD, "Ghost", 99, 1.0, 30.0),
+]
+STUDENTS = [(1, "Alice"), (2, "Bob")]
+
+LESSON_COLUMNS = ["event_id", "date", "weekday", "student", "duration", "hourly_rate", "start_time",
+                  "end_time", "student_id", "subject_id"]
+STUDENT_COLUMNS = ["id", "name", "level", "year", "exam_board", "target_grade", "subject", "active",
+                   "last_lesson_date", "auto_inactive"]
+
+def times(date: datetime.date, hours: float) -> tuple[str, str]:
+    start = datetime.datetime.combine(date, datetime.time(10))
+    return start.isoformat(), (start + datetime.timedelta(hours=hours)).isoformat()
+
+def columns(conn: sqlite3.Connection, table: str) -> list[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def names(conn: sqlite3.Connection, kind: str) -> set[str]:
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = ?", (kind,))}
+
+def insert_lessons(conn: sqlite3.Connection, with_student_id: bool = True, with_weekday: bool = True,
+                   dangling: bool = True) -> None:
+    for event_id, date, student, student_id, duration, rate in LESSONS:
+        if not dangling and student_id not in dict(STUDENTS):
+            student_id = None
+        row = {"event_id": event_id, "date": date.isoformat(), "student": student, "duration": duration,
+               "hourly_rate": rate}
+        row["start_time"], row["end_time"] = times(date, duration)
+        if with_student_id:
+            row["student_id"] = student_id
+        if with_weekday:
+            row["weekday"] = date.weekday()
+        conn.execute(f"INSERT INTO lessons ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                     list(row.values()))
+
+# Layouts written before the database was versioned (user_version 0)
+
+def layout_without_student_id_or_weekday(conn: sqlite3.Connection) -> None:
+    conn.execute('''CREATE TABLE lessons (event_id TEXT PRIMARY KEY, date TEXT NOT NULL, student TEXT NOT NULL,
+                    duration REAL NOT NULL, hourly_rate REAL NOT NULL, start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL)''')
+    insert_lessons(conn, with_student_id=False, with_weekday=False)
+
+def layout_without_active(conn: sqlite3.Connection) -> None:
+    conn.execute('''CREATE TABLE lessons (event_id TEXT PRIMARY KEY, date TEXT NOT NULL, student TEXT NOT NULL,
+                    duration REAL NOT NULL, hourly_rate REAL NOT NULL, start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL, student_id INTEGER, weekday INTEGER)''')
+    conn.execute('''CREATE TABLE students (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL,
+                    level TEXT, year TEXT, exam_board TEXT, target_grade TEXT, subject TEXT)''')
+    conn.executemany("INSERT INTO students (id, name) VALUES (?, ?)", STUDENTS)
+    insert_lessons(conn)
+
+def layout_without_subject_id(conn: sqlite3.Connection) -> None:
+    conn.execute('''CREATE TABLE lessons (event_id TEXT PRIMARY KEY, date TEXT NOT NULL, weekday INTEGER NOT NULL,
+                    student TEXT NOT NULL, duration REAL NOT NULL, hourly_rate REAL NOT NULL,
+                    start_time TEXT NOT NULL, end_time TEXT NOT NULL, student_id INTEGER)''')
+    conn.execute('''CREATE TABLE students (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL,
+                    level TEXT, year TEXT, exam_board TEXT, target_grade TEXT, subject TEXT,
+                    active INTEGER NOT NULL DEFAULT 1)''')
+    conn.executemany("INSERT INTO students (id, name) VALUES (?, ?)", STUDENTS)
+    insert_lessons(conn)
+
+def build(path: str, layout) -> None:
+    conn = sqlite3.connect(path)
+    with conn:
+        layout(conn)
+    conn.close()
+
+def build_at_version(path: str, version: int) -> None:
+    """A database created by the first `version` migrations, holding the sample lessons."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    for applied, migration in enumerate(MIGRATIONS[:version], start=1):
+        migration(conn.cursor())
+        conn.execute(f"PRAGMA user_version = {applied}")
+    conn.executemany("INSERT INTO students (id, name) VALUES (?, ?)", STUDENTS)
+    # Once deletes cascade, the foreign key rules out lessons of a deleted student
+    insert_lessons(conn, dangling=version < MIGRATIONS.index(migrations._cascade_deletes) + 1)
+    if version >= MIGRATIONS.index(migrations._hourly_rates) + 1:
+        conn.execute("INSERT INTO hourly_rates (student_id, subject, hourly_rate) VALUES (1, NULL, 40)")
+    conn.close()
+
+def assert_final_schema(path: str) -> sqlite3.Connection:
+    """Checks the fully migrated schema and the backfilled data; returns an open connection."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert columns(conn, "lessons") == LESSON_COLUMNS
+    assert columns(conn, "students") == STUDENT_COLUMNS
+    assert {"lessons", "students", "subjects", "student_subjects", "sync_state", "monthly_summary",
+            "hourly_rates", "generation", "weekday_summary"} <= names(conn, "table")
+    assert {"idx_lessons_date_event", "idx_lessons_student_date_event", "idx_students_filters",
+            "idx_hourly_rates_key", "idx_students_active_last_lesson", "idx_lessons_subject_date"} \
+        <= names(conn, "index")
+    assert not {"idx_lessons_date", "idx_lessons_student_date"} & names(conn, "index")
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+
+    # Weekdays are filled in, and dangling student references are cleared
+    for event_id, date, weekday, student_id in conn.execute(
+            "SELECT event_id, date, weekday, student_id FROM lessons"):
+        assert weekday == datetime.date.fromisoformat(date).weekday()
+        assert student_id is None or student_id in dict(STUDENTS)
+    # The summaries match a recount of the lessons
+    assert sorted(conn.execute("SELECT * FROM monthly_summary")) == sorted(conn.execute(MONTHLY_SUMMARY_QUERY))
+    assert sorted(conn.execute("SELECT * FROM weekday_summary")) == sorted(conn.execute(WEEKDAY_SUMMARY_QUERY))
+    assert conn.execute("SELECT SUM(lesson_count) FROM monthly_summary").fetchone()[0] == len(LESSONS)
+    return conn
+
+def assert_triggers_work(conn: sqlite3.Connection) -> None:
+    generation = conn.execute("SELECT value FROM generation").fetchone()[0]
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO students (id, name) VALUES (?, ?)", STUDENTS)
+        start, end = times(TODAY, 1.0)
+        conn.execute('''INSERT INTO lessons (event_id, date, weekday, student, duration, hourly_rate, start_time,
+                        end_time, student_id) VALUES ('new', ?, ?, 'Bob', 1.0, 30.0, ?, ?, 2)''',
+                     (TODAY.isoformat(), TODAY.weekday(), start, end))
+        # Deleting a student cascades to their lessons, and the summaries follow
+        conn.execute("DELETE FROM students WHERE id = 1")
+    assert conn.execute("SELECT value FROM generation").fetchone()[0] > generation
+    assert conn.execute("SELECT last_lesson_date FROM students WHERE id = 2").fetchone()[0] == TODAY.isoformat()
+    assert conn.execute("SELECT COUNT(*) FROM lessons WHERE student_id = 1").fetchone()[0] == 0
+    assert sorted(conn.execute("SELECT * FROM monthly_summary")) == sorted(conn.execute(MONTHLY_SUMMARY_QUERY))
+    assert sorted(conn.execute("SELECT * FROM weekday_summary")) == sorted(conn.execute(WEEKDAY_SUMMARY_QUERY))
+
+@pytest.mark.parametrize("layout", [layout_without_student_id_or_weekday, layout_without_active,
+                                    layout_without_subject_id])
+def test_migrates_pre_versioning_layouts(tmp_path, layout):
+    path = str(tmp_path / "legacy.db")
+    build(path, layout)
+
+    assert migrate(path) == len(MIGRATIONS)
+
+    conn = assert_final_schema(path)
+    if layout is layout_without_student_id_or_weekday:
+        # Lessons from before students existed count under student 0
+        assert conn.execute("SELECT COUNT(*) FROM lessons WHERE student_id IS NULL").fetchone()[0] == len(LESSONS)
+    else:
+        assert dict(conn.execute("SELECT id, last_lesson_date FROM students")) == {
+            1: (RECENT + datetime.timedelta(days=1)).isoformat(), 2: OLD.isoformat()}
+    if layout is layout_without_active:
+        # The first migration marks students without a lesson in the past year as past
+        assert dict(conn.execute("SELECT id, active FROM students")) == {1: 1, 2: 0}
+    assert_triggers_work(conn)
+    conn.close()
+
+@pytest.mark.parametrize("version", range(1, len(MIGRATIONS)))
+def test_migrates_each_schema_version(tmp_path, version):
+    path = str(tmp_path / f"v{version}.db")
+    build_at_version(path, version)
+
+    assert migrate(path) == len(MIGRATIONS)
+
+    conn = assert_final_schema(path)
+    if version >= MIGRATIONS.index(migrations._hourly_rates) + 1:
+        assert conn.execute("SELECT student_id, subject, hourly_rate FROM hourly_rates").fetchall() == [(1, None, 40.0)]
+    assert_triggers_work(conn)
+    conn.close()
+
+def test_migrating_twice_changes_nothing(tmp_path):
+    path = str(tmp_path / "lessons.db")
+    build(path, layout_without_subject_id)
+    migrate(path)
+    conn = sqlite3.connect(path)
+    before = conn.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall()
+    generation = conn.execute("SELECT value FROM generation").fetchone()[0]
+    conn.close()
+
+    assert migrate(path) == len(MIGRATIONS)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall() == before
+    assert conn.execute("SELECT value FROM generation").fetchone()[0] == generation
+    conn.close()
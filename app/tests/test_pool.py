@@ -0,0 +1,106 @@
+import datetime
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import db
+from tests.fakes import make_event
+
+@pytest.fixture
+def client(server, workdir, monkeypatch):
+    monkeypatch.setattr(server.app, "root_path", str(workdir))
+    return server.app.test_client()
+
+@pytest.fixture
+def lessons(q):
+    start = datetime.datetime(2024, 5, 1, 9)
+    with db.connection() as conn:
+        q.store_events(conn.cursor(), [make_event(f"e{i}", f"Student{i % 4}", start + datetime.timedelta(hours=i))
+                                       for i in range(50)])
+
+def test_unread_downloads_leave_the_pool_free(client, lessons, monkeypatch):
+    monkeypatch.setattr(db.get_pool(), "timeout", 2.0)
+    paths = ["/api/lessons/export.csv", "/api/lessons/export.jsonl", "/api/lessons?limit=5"] * db.POOL_SIZE
+    downloads = [None] * len(paths)
+
+    def start_download(i: int) -> None:
+        downloads[i] = client.get(paths[i], buffered=False)
+    # More open downloads than pooled connections, each started on its own thread as a server would, none read
+    threads = [threading.Thread(target=start_download, args=(i,)) for i in range(len(paths))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        assert all(download.status_code == 200 for download in downloads)
+        assert client.get("/").status_code == 200
+        assert client.get("/students").status_code == 200
+    finally:
+        for download in downloads:
+            download.close()
+
+def test_a_busy_pool_times_out_with_a_503(client, lessons, monkeypatch):
+    pool = db.get_pool()
+    monkeypatch.setattr(pool, "timeout", 0.1)
+    held, release = threading.Barrier(pool.size + 1), threading.Event()
+
+    def hold():
+        with db.connection():
+            held.wait()
+            release.wait()
+    threads = [threading.Thread(target=hold) for _ in range(pool.size)]
+    for thread in threads:
+        thread.start()
+    held.wait()
+    try:
+        with pytest.raises(db.PoolTimeout):
+            with db.connection():
+                pass
+        response = client.get("/")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"]
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+    assert client.get("/").status_code == 200
+
+def test_stream_connections_only_read(lessons):
+    with db.stream_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM lessons").fetchone()[0] == 50
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM lessons")
+
+def test_migrating_one_database_never_blocks_opening_another(q, tmp_path, monkeypatch):
+    migrate, migrations = db.migrate, []
+    started, finish = threading.Event(), threading.Event()
+
+    def slow_migrate(db_file: str) -> int:
+        migrations.append(db_file)
+        if db_file.endswith("slow.db"):
+            started.set()
+            assert finish.wait(10)
+        return migrate(db_file)
+    monkeypatch.setattr(db, "migrate", slow_migrate)
+    slow, fast = str(tmp_path / "slow.db"), str(tmp_path / "fast.db")
+    # Two requests for the slow database, while it is migrating
+    threads = [threading.Thread(target=db.get_pool, args=(slow,)) for _ in range(2)]
+    threads[0].start()
+    assert started.wait(10)
+    threads[1].start()
+    try:
+        started_at = time.monotonic()
+        pool = db.get_pool(fast)
+        assert time.monotonic() - started_at < 5
+        with pool.connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM lessons").fetchone()[0] == 0
+    finally:
+        finish.set()
+        for thread in threads:
+            thread.join()
+
+    # The second request for the slow database waited for the first migration instead of repeating it
+    assert migrations.count(slow) == 1
+    assert db.get_pool(slow) is db.get_pool(slow)
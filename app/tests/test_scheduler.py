@@ -0,0 +1,89 @@
+import datetime
+import time
+
+import pytest
+
+from tests.fakes import FakeCalendar, make_event
+
+@pytest.fixture
+def calendar(q, monkeypatch) -> FakeCalendar:
+    """A slow calendar served to every sync in place of the Google API."""
+    calendar = FakeCalendar(page_size=5, latency=0.05)
+    start = datetime.datetime(2024, 5, 6, 10)
+    calendar.put(*(make_event(f"e{i}", f"Student{i % 3}", start + datetime.timedelta(days=i)) for i in range(12)))
+    monkeypatch.setattr(q, "get_google_credentials", lambda: None)
+    monkeypatch.setattr(q, "get_calendar_service", lambda creds=None: calendar)
+    monkeypatch.setattr(q, "DEFAULT_RENDERER", "simple")
+    return calendar
+
+@pytest.fixture
+def client(server, workdir, monkeypatch):
+    # send_file resolves the relative invoice paths against the app's root
+    monkeypatch.setattr(server.app, "root_path", str(workdir))
+    return server.app.test_client()
+
+def jobs(client) -> list[dict]:
+    return client.get("/sync/status").get_json()["jobs"]
+
+def wait_until_idle(server, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = server.scheduler.status()
+        if not status["running"] and not status["queued"]:
+            return
+        time.sleep(0.01)
+    raise AssertionError("the scheduler did not finish its jobs")
+
+def test_repeated_sync_requests_share_one_job(server, client, calendar):
+    for _ in range(3):
+        assert client.get("/sync-all").status_code == 302
+
+    wait_until_idle(server)
+
+    kinds = [job["kind"] for job in jobs(client)]
+    assert sorted(kinds) == ["active", "incremental"]
+    # One full pull of 12 events at 5 per page, all from the scheduler's thread
+    assert len(calendar.requests) == 3
+    assert calendar.threads == {server.scheduler._thread.ident}
+    incremental = next(job for job in jobs(client) if job["kind"] == "incremental")
+    assert incremental["state"] == "done" and incremental["result"] == [12, 0]
+
+def test_sync_status_reports_history_progress(server, client, calendar):
+    assert client.get("/sync-history").status_code == 302
+
+    seen = set()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        history = next(job for job in jobs(client) if job["kind"] == "history")
+        seen.add((history["state"], history["progress"]))
+        if history["state"] == "done":
+            break
+        time.sleep(0.01)
+
+    assert history["state"] == "done" and history["progress"] == 1.0
+    assert history["result"] == 12
+    # The job was seen running part of the way through its month windows
+    assert any(state == "running" and 0 < progress < 1 for state, progress in seen)
+
+def test_invoice_routes_read_the_database_without_syncing(server, client, calendar, q):
+    client.get("/sync-all")
+    wait_until_idle(server)
+    calendar.requests.clear()
+    submitted = len(jobs(client))
+
+    response = client.get("/create-invoice/2024/5")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/pdf"
+    assert calendar.requests == []
+    assert len(jobs(client)) == submitted
+
+def test_invoice_sync_parameter_waits_for_its_month(server, client, calendar):
+    calendar.put(make_event("late", "Student0", datetime.datetime(2024, 5, 30, 10)))
+
+    response = client.get("/create-invoice/2024/5?sync=1")
+
+    assert response.status_code == 200
+    month = next(job for job in jobs(client) if job["kind"] == "month")
+    assert month["args"] == [2024, 5] and month["state"] == "done"
+    assert all(request["timeMin"].startswith("2024-05-01") for request in calendar.requests)
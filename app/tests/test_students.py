@@ -0,0 +1,90 @@
+import datetime
+
+import pytest
+
+import db
+from tests.fakes import make_event
+
+@pytest.fixture
+def client(server, workdir, monkeypatch):
+    monkeypatch.setattr(server.app, "root_path", str(workdir))
+    with db.connection() as conn:
+        conn.executemany("INSERT INTO students (name, active) VALUES (?, ?)", [("Alice", 1), ("Bob", 0)])
+    return server.app.test_client()
+
+@pytest.mark.parametrize("query, shown", [
+    ("", {"Alice"}),
+    ("?active=1", {"Alice"}),
+    ("?active=0", {"Bob"}),
+    ("?active=", {"Alice", "Bob"}),
+])
+def test_active_filter(client, query, shown):
+    page = client.get(f"/students{query}").get_data(as_text=True)
+
+    assert {name for name in ("Alice", "Bob") if name in page} == shown
+
+@pytest.mark.parametrize("value", ["abc", "2", "-1", "1.0"])
+def test_invalid_active_filter_is_a_bad_request(client, value):
+    assert client.get(f"/students?active={value}").status_code == 400
+    # The bulk action shares the filters, and must not touch every student instead
+    assert client.post(f"/students?active={value}", data={"bulk": "1", "bulk-year": "Year 11"}).status_code == 400
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM students WHERE year IS NOT NULL").fetchone()[0] == 0
+
+def add_lesson(q, event_id: str, student: str, date: datetime.date) -> None:
+    start = datetime.datetime.combine(date, datetime.time(10))
+    with db.connection() as conn:
+        q.store_events(conn.cursor(), [make_event(event_id, student, start)])
+
+def active() -> dict[str, int]:
+    with db.connection() as conn:
+        return dict(conn.execute("SELECT name, active FROM students"))
+
+def test_recompute_active_brings_back_only_students_it_retired(q):
+    today = datetime.date(2024, 6, 1)
+    add_lesson(q, "a", "Alice", datetime.date(2022, 1, 10))
+    add_lesson(q, "b", "Bob", datetime.date(2022, 1, 11))
+    assert q.recompute_active(today)["deactivated"] == 2
+    # Bob is marked past by hand, as the students page does
+    with db.connection() as conn:
+        conn.execute("UPDATE students SET active = 1 WHERE name = 'Bob'")
+        conn.execute("UPDATE students SET active = 0 WHERE name = 'Bob'")
+
+    add_lesson(q, "a2", "Alice", datetime.date(2024, 5, 20))
+    add_lesson(q, "b2", "Bob", datetime.date(2024, 5, 21))
+    report = q.recompute_active(today)
+
+    assert (report["reactivated"], report["deactivated"]) == (1, 0)
+    assert active() == {"Alice": 1, "Bob": 0}
+
+def test_students_page_past_flag_survives_the_recompute(q, client):
+    add_lesson(q, "c", "Cara", datetime.date.today())
+    with db.connection() as conn:
+        (student_id,) = conn.execute("SELECT id FROM students WHERE name = 'Cara'").fetchone()
+
+    form = {"student_ids": [str(student_id)], f"active-{student_id}": "0"}
+    assert client.post("/students", data=form).status_code == 302
+    report = q.recompute_active()
+
+    assert report["reactivated"] == 0
+    assert active()["Cara"] == 0
+
+@pytest.mark.parametrize("field, value", [("active", "abc"), ("active", "2"), ("year", "Year 99"),
+                                          ("level", "<b>GCSE</b>"), ("exam_board", "Nobody")])
+def test_bulk_action_rejects_values_the_page_does_not_offer(client, field, value):
+    # A valid change alongside the invalid one is not applied either
+    response = client.post("/students?active=", data={"bulk": "1", "bulk-year": "Year 11", f"bulk-{field}": value})
+
+    assert response.status_code == 302
+    with db.connection() as conn:
+        assert conn.execute("SELECT name, active, year, level, exam_board FROM students ORDER BY id").fetchall() == [
+            ("Alice", 1, None, None, None), ("Bob", 0, None, None, None)]
+    with client.session_transaction() as session:
+        assert "Nothing updated" in session["_flashes"][0][1]
+
+def test_bulk_action_writes_offered_values(client):
+    response = client.post("/students?active=", data={"bulk": "1", "bulk-active": "0", "bulk-level": "A Level"})
+
+    assert response.status_code == 302
+    with db.connection() as conn:
+        assert conn.execute("SELECT active, level FROM students").fetchall() == [(0, "A Level"), (0, "A Level")]
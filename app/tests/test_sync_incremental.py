@@ -0,0 +1,83 @@
+import datetime
+
+import pytest
+
+import db
+from tests.fakes import FakeCalendar, http_error, make_event
+
+def at(day: int, hour: int = 10) -> datetime.datetime:
+    return datetime.datetime(2024, 5, day, hour, tzinfo=datetime.timezone.utc)
+
+def lessons() -> dict[str, tuple]:
+    with db.connection() as conn:
+        return {event_id: (date, student, duration) for event_id, date, student, duration in conn.execute(
+            "SELECT event_id, date, student, duration FROM lessons")}
+
+def stored_token() -> str | None:
+    with db.connection() as conn:
+        row = conn.execute("SELECT sync_token FROM sync_state WHERE calendar_id = 'primary'").fetchone()
+    return row[0] if row else None
+
+@pytest.fixture
+def calendar():
+    calendar = FakeCalendar(page_size=2)
+    calendar.put(make_event("a", "Alice", at(6)), make_event("b", "Bob", at(7)), make_event("c", "Cara", at(8)))
+    return calendar
+
+def test_first_sync_is_a_full_pull(q, calendar):
+    assert q.sync_incremental(calendar) == (3, 0)
+
+    assert lessons() == {"a": ("2024-05-06", "Alice", 1.0), "b": ("2024-05-07", "Bob", 1.0),
+                         "c": ("2024-05-08", "Cara", 1.0)}
+    assert all("syncToken" not in request for request in calendar.requests)
+    # Three events at two per page
+    assert len(calendar.requests) == 2
+    assert stored_token() == "sync3"
+
+def test_incremental_sync_applies_only_the_changes(q, calendar):
+    q.sync_incremental(calendar)
+    calendar.put(make_event("b", "Bob", at(9), hours=2.0), make_event("d", "Dan", at(10)))
+    calendar.requests.clear()
+
+    assert q.sync_incremental(calendar) == (2, 0)
+
+    assert calendar.requests[0]["syncToken"] == "sync3"
+    assert lessons()["b"] == ("2024-05-09", "Bob", 2.0)
+    assert lessons()["d"] == ("2024-05-10", "Dan", 1.0)
+    assert stored_token() == "sync5"
+    assert q.check_monthly_summary() == []
+
+def test_cancelled_event_deletes_its_lesson(q, calendar):
+    q.sync_incremental(calendar)
+    calendar.cancel("a")
+
+    assert q.sync_incremental(calendar) == (0, 1)
+
+    assert set(lessons()) == {"b", "c"}
+    with db.connection() as conn:
+        assert conn.execute("SELECT SUM(lesson_count), SUM(hours), SUM(earned) FROM monthly_summary "
+                            "WHERE month = '2024-05'").fetchone() == (2, 2.0, 60.0)
+    assert q.check_monthly_summary() == []
+
+def test_expired_token_falls_back_to_a_full_pull(q, calendar):
+    q.sync_incremental(calendar)
+    # Google has forgotten "c" entirely, so only a full pull can notice it is gone
+    calendar.purge("c")
+    calendar.put(make_event("d", "Dan", at(10)))
+    calendar.expired.add("sync3")
+    calendar.requests.clear()
+
+    assert q.sync_incremental(calendar) == (3, 1)
+
+    assert calendar.requests[0]["syncToken"] == "sync3"
+    assert all("syncToken" not in request for request in calendar.requests[1:])
+    assert set(lessons()) == {"a", "b", "d"}
+    assert stored_token() == f"sync{calendar.version}"
+
+def test_other_errors_are_not_retried_as_a_full_pull(q, calendar):
+    q.sync_incremental(calendar)
+    calendar.errors.append(http_error(403))
+
+    with pytest.raises(q._http_error()):
+        q.sync_incremental(calendar)
+    assert stored_token() == "sync3"
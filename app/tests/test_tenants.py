@@ -0,0 +1,25 @@
+import pytest
+
+import tenants
+
+@pytest.fixture
+def client(server, workdir, monkeypatch):
+    monkeypatch.setattr(server.app, "root_path", str(workdir))
+    (workdir / "tenants").mkdir()
+    monkeypatch.setattr(tenants, "TENANTS_DIR", str(workdir / "tenants"))
+    return server.app.test_client()
+
+@pytest.mark.parametrize("path", ["/metrics", "/static/css/tutordash.css"])
+def test_tenant_agnostic_endpoints_need_no_tenant(client, path):
+    response = client.get(path)
+
+    assert response.status_code == 200
+    response.close()
+
+@pytest.mark.parametrize("path", ["/", "/sync/status", "/api/lessons"])
+def test_tutor_endpoints_require_a_tenant(client, path):
+    assert client.get(path).status_code == 400
+    assert client.get(path, headers={"X-Tenant": "nobody"}).status_code == 404
+
+def test_unknown_url_is_a_404_without_a_tenant(client):
+    assert client.get("/no-such-page").status_code == 404